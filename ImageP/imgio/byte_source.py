@@ -0,0 +1,34 @@
+import mmap
+import os
+
+
+class FileByteSource:
+    """Read-only, memory-mapped access to a file through `read_at(offset, size)`.
+
+    `read_at` returns a memoryview into the mapping, so reading a page only touches
+    the pages of the file that are actually used and nothing is copied. Other byte
+    sources, like CompressedReader and HttpByteSource, implement the same `read_at`.
+    """
+
+    def __init__(self, file_path):
+        self.file_path = file_path
+        self.size = os.path.getsize(file_path)
+        self._file = open(file_path, 'rb')
+        # 空文件不能被映射
+        self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ) if self.size else None
+
+    def read_at(self, offset, size):
+        """Return up to `size` bytes starting at `offset`, fewer at the end of the file."""
+        if self._map is None or offset >= self.size:
+            return memoryview(b'')
+        return memoryview(self._map)[offset:min(offset + size, self.size)]
+
+    def close(self):
+        if self._map is not None:
+            try:
+                self._map.close()
+            except BufferError:
+                # 还有切片引用着映射（例如缓存中的切片），交给垃圾回收处理
+                pass
+            self._map = None
+        self._file.close()
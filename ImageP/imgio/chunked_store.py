@@ -0,0 +1,154 @@
+import hashlib
+import json
+import os
+import shutil
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+
+from ImageP.imgio.index_cache import cache_dir, source_key
+from ImageP.imgio.virtual_stack import VirtualStack
+from ImageP.utils.slice_cache import SliceCache
+
+CHUNK_SHAPE = (16, 256, 256)  # (z, y, x)，彩色图像的通道总在同一个块中
+COMPRESSION_LEVEL = 1  # zlib 最快的一级，体数据压缩率变化不大，读取时解压速度才是关键
+HEADER_FILE = 'header.json'
+
+
+def chunked_store_path(file_path, params):
+    """Return the folder of the chunked store of a file opened with `params`.
+
+    The key combines the path, size and modification time of the source file with the
+    import parameters, so a changed file or other parameters never find a stale store.
+    """
+    params_key = json.dumps(params, sort_keys=True)
+    key = hashlib.sha1(f"{source_key(file_path)}|{params_key}".encode('utf-8')).hexdigest()
+    return os.path.join(cache_dir('chunked'), key)
+
+
+def has_chunked_store(store_path):
+    # header.json 最后写入，有它才说明转换已经完成
+    return os.path.exists(os.path.join(store_path, HEADER_FILE))
+
+
+def chunk_file(store_path, z, y, x):
+    return os.path.join(store_path, f"{z}.{y}.{x}")
+
+
+def write_chunked_store(stack, store_path, chunk_shape=CHUNK_SHAPE, workers=None):
+    """Convert a stack into a store of zlib compressed (z, y, x) chunks and a JSON header.
+
+    The stack is read one slab of chunk_shape[0] slices at a time and the chunks of a
+    slab are compressed in parallel (zlib releases the GIL), so memory stays at one slab.
+    """
+    dtype = np.dtype(stack.dtype).newbyteorder('=')
+    chunk_z, chunk_y, chunk_x = chunk_shape
+    layers, height, width = stack.shape[:3]
+
+    temp_path = store_path + '.converting'
+    shutil.rmtree(temp_path, ignore_errors=True)
+    os.makedirs(temp_path)
+
+    def write_chunk(slab, z, y, x):
+        chunk = np.ascontiguousarray(slab[:, y * chunk_y:(y + 1) * chunk_y, x * chunk_x:(x + 1) * chunk_x])
+        with open(chunk_file(temp_path, z, y, x), 'wb') as f:
+            f.write(zlib.compress(chunk, COMPRESSION_LEVEL))
+
+    with ThreadPoolExecutor(max_workers=workers or min(8, os.cpu_count() or 1)) as executor:
+        for z in range(-(-layers // chunk_z)):
+            slab = np.stack([np.asarray(stack[layer], dtype=dtype)
+                             for layer in range(z * chunk_z, min((z + 1) * chunk_z, layers))])
+            futures = [executor.submit(write_chunk, slab, z, y, x)
+                       for y in range(-(-height // chunk_y)) for x in range(-(-width // chunk_x))]
+            for future in futures:
+                future.result()
+
+    header = {'shape': list(stack.shape), 'dtype': dtype.str, 'chunks': list(chunk_shape), 'compression': 'zlib'}
+    with open(os.path.join(temp_path, HEADER_FILE), 'w', encoding='utf-8') as f:
+        json.dump(header, f)
+    shutil.rmtree(store_path, ignore_errors=True)
+    os.replace(temp_path, store_path)
+
+
+class ChunkedStack(VirtualStack):
+    """Virtual stack over a chunked store; only the chunks a read touches are decompressed.
+
+    Decompressed chunks are kept in their own LRU cache, so reading the next slices of
+    the same chunks, or an orthogonal view (`stack[:, y, :]`), decompresses each chunk once.
+    """
+
+    cheap_reads = False
+
+    def __init__(self, store_path, cache=None, chunk_cache=None):
+        with open(os.path.join(store_path, HEADER_FILE), 'r', encoding='utf-8') as f:
+            header = json.load(f)
+        super().__init__(header['shape'], header['dtype'], cache)
+        self.store_path = store_path
+        self.chunk_shape = tuple(header['chunks'])
+        self.chunk_cache = chunk_cache if chunk_cache is not None else SliceCache(256 * 1024 * 1024)
+
+    def read_chunk(self, z, y, x):
+        key = (z, y, x)
+        chunk = self.chunk_cache.get(key)
+        if chunk is None:
+            shape = tuple(min(size, total - index * size)
+                          for index, size, total in zip(key, self.chunk_shape, self.shape))
+            with open(chunk_file(self.store_path, z, y, x), 'rb') as f:
+                data = zlib.decompress(f.read())
+            chunk = np.frombuffer(data, self.dtype).reshape(shape + self.shape[3:])
+            self.chunk_cache.put(key, chunk)
+        return chunk
+
+    def read_region(self, z_range, y_range, x_range):
+        """Read the (z, y, x) box given by three (start, stop) ranges from the chunks it overlaps."""
+        (z0, z1), (y0, y1), (x0, x1) = z_range, y_range, x_range
+        chunk_z, chunk_y, chunk_x = self.chunk_shape
+        region = np.empty((z1 - z0, y1 - y0, x1 - x0) + self.shape[3:], self.dtype)
+        for z in range(z0 // chunk_z, -(-z1 // chunk_z)):
+            for y in range(y0 // chunk_y, -(-y1 // chunk_y)):
+                for x in range(x0 // chunk_x, -(-x1 // chunk_x)):
+                    chunk = self.read_chunk(z, y, x)
+                    # 块与所需区域的交集，分别用块内坐标和区域内坐标表示
+                    zs = slice(max(z0, z * chunk_z), min(z1, (z + 1) * chunk_z))
+                    ys = slice(max(y0, y * chunk_y), min(y1, (y + 1) * chunk_y))
+                    xs = slice(max(x0, x * chunk_x), min(x1, (x + 1) * chunk_x))
+                    region[zs.start - z0:zs.stop - z0, ys.start - y0:ys.stop - y0, xs.start - x0:xs.stop - x0] = \
+                        chunk[zs.start - z * chunk_z:zs.stop - z * chunk_z, ys.start - y * chunk_y:ys.stop - y * chunk_y,
+                              xs.start - x * chunk_x:xs.stop - x * chunk_x]
+        return region
+
+    def read_slice(self, index):
+        return self.read_region((index, index + 1), (0, self.shape[1]), (0, self.shape[2]))[0]
+
+    def __getitem__(self, key):
+        if not isinstance(key, tuple):
+            key = (key,)
+        if self.modified or isinstance(key[0], (int, np.integer)) or len(key) > 3 \
+                or not all(isinstance(k, (slice, int, np.integer)) for k in key):
+            return super().__getitem__(key)
+
+        # 正交视图等跨越多层的读取只解压用到的块，不逐层读取整层
+        ranges, squeeze = [], []
+        for axis, k in enumerate(key + (slice(None),) * (3 - len(key))):
+            if isinstance(k, slice):
+                start, stop, step = k.indices(self.shape[axis])
+                if step != 1:
+                    return super().__getitem__(key)
+                ranges.append((start, max(start, stop)))
+                squeeze.append(slice(None))
+            else:
+                index = int(k) + (self.shape[axis] if k < 0 else 0)
+                ranges.append((index, index + 1))
+                squeeze.append(0)
+        return self.read_region(*ranges)[tuple(squeeze)]
+
+
+def convert_after_fill(stack, fill, store_path):
+    """Pass the progress of `fill` through, then write the loaded stack into a chunked store."""
+    for progress in fill or ():
+        yield progress
+    try:
+        print(f"Writing chunked cache {store_path}")
+        write_chunked_store(stack, store_path)
+    except OSError as e:
+        print(f"Could not write chunked cache {store_path}: {e}")
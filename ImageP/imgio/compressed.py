@@ -0,0 +1,271 @@
+import bisect
+import os
+import threading
+import zlib
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+from ImageP.imgio.index_cache import load_index, save_index
+
+GZIP_MAGIC = b'\x1f\x8b'
+ZSTD_MAGIC = b'\x28\xb5\x2f\xfd'
+
+CHUNK_SIZE = 64 * 1024  # 每次解压的压缩数据量，限制单次解压输出的大小
+CHECKPOINT_SPACING = 16 * 1024 * 1024  # gzip 流内部检查点之间的解压后字节数
+BLOCK_SIZE = 16 * 1024 * 1024  # 重新压缩时每个独立单元的解压后大小
+
+
+def compression_kind(file_path):
+    """Return 'gzip' or 'zstd' from the magic bytes of the file, or None if it is not compressed."""
+    with open(file_path, 'rb') as f:
+        magic = f.read(4)
+    if magic.startswith(GZIP_MAGIC):
+        return 'gzip'
+    if magic == ZSTD_MAGIC:
+        return 'zstd'
+    return None
+
+
+class _Cursor:
+    """A decompression stream positioned at compressed offset `c_pos` / uncompressed offset `u_pos`."""
+
+    __slots__ = ('c_pos', 'u_pos', 'decompressor')
+
+    def __init__(self, c_pos, u_pos, decompressor=None):
+        self.c_pos = c_pos
+        self.u_pos = u_pos
+        self.decompressor = decompressor  # None: a new unit starts at c_pos
+
+
+class CompressedReader:
+    """Random access to the uncompressed bytes of a .gz or .zst file.
+
+    The file is made of units that decompress independently (gzip members, zstd
+    frames). Their offsets are found by decompressing the file once as a stream,
+    and saved in the index cache, so later sessions can start reading at any unit.
+    Inside a gzip unit the decompressor state is checkpointed every
+    CHECKPOINT_SPACING bytes for the session, and a sequential read always
+    continues from where the last one stopped.
+
+    zlib cannot save a decompressor to disk, so a file compressed as one long
+    stream has to be decompressed from its start again in every session
+    (`slow_seeks`); `recompress` rewrites it as blocks that can be read directly.
+    """
+
+    def __init__(self, file_path):
+        self.file_path = file_path
+        self.kind = compression_kind(file_path)
+        if self.kind is None:
+            raise ValueError(f"{file_path} is not gzip or zstd compressed")
+        if self.kind == 'zstd' and zstandard is None:
+            raise ImportError("Reading .zst files requires the 'zstandard' package (pip install zstandard)")
+
+        self.compressed_size = os.path.getsize(file_path)
+        self.units = [(0, 0)]  # 每个独立单元的 (解压后偏移, 压缩偏移)
+        self.size = None  # 解压后的总大小，扫描到文件末尾后才知道
+        self.scanned = 0  # 已经解压过的范围
+        self._checkpoints = []  # gzip 流内部的检查点 (解压后偏移, 压缩偏移, 解压器)，只在本次会话有效
+        self._cursor = None  # 上一次读取结束的位置，顺序读取时从这里继续
+        self._index_dirty = False
+        self._lock = threading.RLock()
+
+        index = load_index(file_path, 'compressed')
+        if index is not None and index.get('kind') == self.kind:
+            self.units = [tuple(unit) for unit in index['units']]
+            self.size = index['size']
+            self.scanned = index['scanned']
+
+    @property
+    def complete(self):
+        """True once the whole file has been scanned and the index covers it."""
+        return self.size is not None
+
+    @property
+    def slow_seeks(self):
+        """True once scanned when some unit is so long that reading into it decompresses much more than a block."""
+        if not self.complete:
+            return False
+        starts = [u_pos for u_pos, _ in self.units] + [self.size]
+        return max(end - start for start, end in zip(starts, starts[1:])) > 2 * BLOCK_SIZE
+
+    def read_at(self, offset, size):
+        """Return `size` uncompressed bytes starting at `offset`, fewer at the end of the data."""
+        end = offset + size
+        if self.size is not None:
+            end = min(end, self.size)
+        if offset >= end:
+            return b''
+
+        parts = []
+        with self._lock, open(self.file_path, 'rb') as f:
+            cursor = self._start_cursor(offset)
+            while cursor.u_pos < end:
+                start = cursor.u_pos
+                data = self._step(f, cursor)
+                if data is None:
+                    break
+                if cursor.u_pos > offset:
+                    parts.append(data[max(offset - start, 0):end - start])
+            self._cursor = cursor
+        return b''.join(parts)
+
+    def scan(self):
+        """Decompress the rest of the file to complete the index, yielding the uncompressed position as it goes."""
+        with self._lock:
+            cursor = self._start_cursor(self.scanned)
+        with open(self.file_path, 'rb') as f:
+            while True:
+                with self._lock:
+                    data = self._step(f, cursor)
+                if data is None:
+                    break
+                yield cursor.u_pos
+        self.save_index()
+
+    def save_index(self):
+        """Save the units found so far, so the next session does not have to find them again."""
+        with self._lock:
+            if not self._index_dirty:
+                return
+            index = {'kind': self.kind, 'units': self.units, 'size': self.size, 'scanned': self.scanned}
+            self._index_dirty = False
+        save_index(self.file_path, 'compressed', index)
+
+    def recompress(self, progress=None):
+        """Rewrite the file as independent gzip members / zstd frames of BLOCK_SIZE uncompressed bytes.
+
+        The result is still a valid .gz / .zst file with the same content, and every
+        block is a unit of the saved index, so later sessions read any offset directly.
+        The file is written next to the original and replaces it when done.
+        `progress(done, total)` is called after each block; returning False cancels.
+        """
+        if not self.complete:
+            raise ValueError(f"{self.file_path} has not been scanned yet")
+        temp_path = self.file_path + '.recompressing'
+        units = []
+        try:
+            with open(temp_path, 'wb') as f:
+                for u_pos in range(0, self.size, BLOCK_SIZE):
+                    units.append((u_pos, f.tell()))
+                    f.write(self._compress_block(self.read_at(u_pos, BLOCK_SIZE)))
+                    if progress is not None and progress(min(u_pos + BLOCK_SIZE, self.size), self.size) is False:
+                        raise InterruptedError("Recompressing cancelled")
+                units.append((self.size, f.tell()))  # 与扫描时一样，数据末尾也记为一个单元
+            with self._lock:
+                os.replace(temp_path, self.file_path)
+                self.units = units
+                self.compressed_size = os.path.getsize(self.file_path)
+                self._checkpoints = []
+                self._cursor = None
+                self._index_dirty = True
+        except BaseException:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+        self.save_index()
+
+    def close(self):
+        """Save the index found so far and drop the decompressor checkpoints of this session."""
+        self.save_index()
+        with self._lock:
+            self._checkpoints = []
+            self._cursor = None
+
+    def _new_decompressor(self):
+        if self.kind == 'gzip':
+            return zlib.decompressobj(wbits=16 + zlib.MAX_WBITS)
+        return zstandard.ZstdDecompressor().decompressobj()
+
+    def _compress_block(self, data):
+        if self.kind == 'gzip':
+            compressor = zlib.compressobj(6, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+            return compressor.compress(data) + compressor.flush()
+        return zstandard.ZstdCompressor().compress(data)
+
+    def _start_cursor(self, offset):
+        """Return the cursor closest before `offset`: the last read position, a checkpoint or a unit start."""
+        u_pos, c_pos = self.units[bisect.bisect_right(self.units, (offset, float('inf'))) - 1]
+        best = _Cursor(c_pos, u_pos)
+
+        position = bisect.bisect_right(self._checkpoints, (offset, float('inf'))) - 1
+        if position >= 0 and self._checkpoints[position][0] > best.u_pos:
+            u_pos, c_pos, decompressor = self._checkpoints[position]
+            best = _Cursor(c_pos, u_pos, decompressor.copy())
+
+        # 顺序读取时直接沿用上一次的解压器
+        cursor = self._cursor
+        if cursor is not None and best.u_pos <= cursor.u_pos <= offset:
+            self._cursor = None
+            best = cursor
+        return best
+
+    def _step(self, f, cursor):
+        """Decompress the next chunk at the cursor and return its output, or None at the end of the data."""
+        if cursor.decompressor is None:
+            f.seek(cursor.c_pos)
+            magic = f.read(4)
+            if not (magic.startswith(GZIP_MAGIC) if self.kind == 'gzip' else magic == ZSTD_MAGIC):
+                # 文件结束（或者只剩填充字节）
+                self._reached_end(cursor.u_pos)
+                return None
+            cursor.decompressor = self._new_decompressor()
+
+        f.seek(cursor.c_pos)
+        chunk = f.read(CHUNK_SIZE)
+        if not chunk:
+            print(f"Warning: {self.file_path} is truncated, the data ends at {cursor.u_pos} bytes")
+            self._reached_end(cursor.u_pos)
+            return None
+
+        data = cursor.decompressor.decompress(chunk)
+        checkpoint_due = cursor.u_pos // CHECKPOINT_SPACING != (cursor.u_pos + len(data)) // CHECKPOINT_SPACING
+        cursor.u_pos += len(data)
+
+        if cursor.decompressor.eof:
+            # 单元结束，剩下的数据属于下一个单元
+            cursor.c_pos += len(chunk) - len(cursor.decompressor.unused_data)
+            cursor.decompressor = None
+            if cursor.u_pos > self.units[-1][0]:
+                self.units.append((cursor.u_pos, cursor.c_pos))
+                self._index_dirty = True
+        else:
+            cursor.c_pos += len(chunk)
+            if checkpoint_due and self.kind == 'gzip':
+                self._add_checkpoint(cursor)
+
+        if cursor.u_pos > self.scanned:
+            self.scanned = cursor.u_pos
+            self._index_dirty = True
+        return data
+
+    def _add_checkpoint(self, cursor):
+        position = bisect.bisect_right(self._checkpoints, (cursor.u_pos, cursor.c_pos))
+        if position > 0 and cursor.u_pos - self._checkpoints[position - 1][0] < CHECKPOINT_SPACING // 2:
+            return
+        self._checkpoints.insert(position, (cursor.u_pos, cursor.c_pos, cursor.decompressor.copy()))
+
+    def _reached_end(self, u_pos):
+        if self.size is None:
+            self.size = u_pos
+            self._index_dirty = True
+            self.save_index()
+
+
+def index_fill(stack, reader):
+    """Read a stack over a CompressedReader once from front to back, yielding (slice, 1) after each slice.
+
+    This builds the seek index of the file (saved for later sessions) and puts the
+    slices in the stack's cache on the way; used as the fill of StackLoaderThread.
+    """
+    try:
+        for layer in range(stack.shape[0]):
+            stack.get_slice(layer)
+            yield layer, 1
+        # 最后一层之后可能还有数据，扫描完才能得到完整的索引
+        for _ in reader.scan():
+            pass
+    finally:
+        reader.save_index()
@@ -0,0 +1,130 @@
+import os
+import threading
+import numpy as np
+from concurrent.futures import ThreadPoolExecutor
+
+from ImageP.imgio.virtual_stack import VirtualStack, is_memory_mapped
+from ImageP.utils.file_utils import list_folder_files
+
+PREFETCH_BUDGET = 512 * 1024 * 1024  # 超过这个大小的相邻文件不预先读入内存，只预热页缓存
+
+
+def file_extension(file_path):
+    """Return the extension of a file, including a compression suffix ('.raw.gz')."""
+    stem, extension = os.path.splitext(file_path)
+    if extension.lower() in ('.gz', '.zst'):
+        extension = os.path.splitext(stem)[1] + extension
+    return extension
+
+
+def warm_file(file_path):
+    """Ask the OS to read a file into the page cache in the background, for memory-mapped stacks."""
+    if not hasattr(os, 'posix_fadvise'):
+        return
+    fd = os.open(file_path, os.O_RDONLY)
+    try:
+        os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_WILLNEED)
+    finally:
+        os.close(fd)
+
+
+def close_prefetched(future):
+    """Close the stack of a prefetch that is no longer needed, once it is done."""
+    if future.cancelled() or future.exception() is not None:
+        return
+    stack = future.result()
+    if isinstance(stack, VirtualStack):
+        stack.close()
+
+
+class FolderNavigator:
+    """Step through the files of a folder for File > Open Next, opening the neighbours ahead of time.
+
+    The files are the ones with the extension of the first file, in natural order, and
+    `open_file(path)` opens one of them with the parameters of the first, returning
+    (stack, fill) like raw_reader.open_raw_progressive. The next and previous file are
+    opened and filled in on worker threads, so stepping to them only shows them.
+    A neighbour whose file is larger than `memory_budget` is not opened ahead of time,
+    only read into the page cache, and its future gives None.
+    """
+
+    def __init__(self, file_path, open_file, memory_budget=PREFETCH_BUDGET):
+        self.folder = os.path.dirname(os.path.abspath(file_path))
+        self.files = list_folder_files(self.folder, [file_extension(file_path)])
+        self.open_file = open_file
+        self.memory_budget = memory_budget
+        self.index = self.position(file_path)
+        self.prefetched = {}  # 路径 -> Future，结果是已经读取完成的栈（只预热了页缓存时为 None）
+        self.cancelled = threading.Event()
+        self._executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix='open-next')
+
+    def position(self, file_path):
+        file_path = os.path.abspath(file_path)
+        return self.files.index(file_path) if file_path in self.files else 0
+
+    @property
+    def current_path(self):
+        return self.files[self.index] if self.files else None
+
+    def neighbours(self):
+        if len(self.files) < 2:
+            return []
+        return list(dict.fromkeys(self.files[(self.index + step) % len(self.files)] for step in (1, -1)))
+
+    def prefetch_neighbours(self):
+        """Open the next and previous file in the background and forget any other prefetched file."""
+        neighbours = self.neighbours()
+        for path in list(self.prefetched):
+            if path not in neighbours:
+                self.drop(self.prefetched.pop(path))
+        for path in neighbours:
+            if path not in self.prefetched:
+                self.prefetched[path] = self._executor.submit(self.prefetch, path)
+
+    def drop(self, future):
+        if not future.cancel():
+            future.add_done_callback(close_prefetched)
+
+    def step(self, delta=1):
+        """Move to the next (delta=1) or previous (delta=-1) file; returns (path, future of its stack)."""
+        self.index = (self.index + delta) % len(self.files)
+        path = self.files[self.index]
+        future = self.prefetched.pop(path, None)
+        if future is None or future.cancelled():
+            future = self._executor.submit(self.load, path)
+        return path, future
+
+    def prefetch(self, file_path):
+        """Load a neighbour ahead of time, or only warm up its file when it is larger than the budget."""
+        size = os.path.getsize(file_path)
+        if size > self.memory_budget:
+            # 两个相邻文件都完整读入内存会使内存峰值翻倍；打开时再边读边显示
+            warm_file(file_path)
+            print(f"Warmed up {os.path.basename(file_path)} ({size / 2 ** 20:.0f} MB)")
+            return None
+        stack, fill = self.open_file(file_path)
+        return self.finish_loading(file_path, stack, fill)
+
+    def load(self, file_path):
+        stack, fill = self.open_file(file_path)
+        return self.finish_loading(file_path, stack, fill)
+
+    def finish_loading(self, file_path, stack, fill):
+        for _ in fill or ():
+            if self.cancelled.is_set():
+                return None
+
+        if is_memory_mapped(stack):
+            warm_file(file_path)
+        # NaN 和无穷大在显示时逐层替换，这里不再清理整个栈
+        # 第一层放进切片缓存（虚拟栈）或页缓存（内存映射），显示时不再读磁盘
+        np.asarray(stack[0])
+        print(f"Prefetched {os.path.basename(file_path)}")
+        return stack
+
+    def shutdown(self):
+        self.cancelled.set()
+        for future in self.prefetched.values():
+            self.drop(future)
+        self.prefetched.clear()
+        self._executor.shutdown(wait=False)
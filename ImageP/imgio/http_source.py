@@ -0,0 +1,160 @@
+import hashlib
+import os
+import re
+import threading
+import urllib.request
+
+from ImageP.imgio.index_cache import cache_dir
+
+BLOCK_SIZE = 1024 * 1024
+TIMEOUT = 30
+
+
+class HttpByteSource:
+    """Byte source over a file on a web server, fetched with HTTP Range requests.
+
+    Only the blocks of `block_size` bytes that `read_at` needs are downloaded, and
+    every block is kept on disk under the index cache, so slices that were viewed
+    once (in this or a later session) are never downloaded again. The cache is keyed
+    on the URL, size and ETag / Last-Modified (`key`), a changed file gets a new cache.
+    The last block read stays in memory, so small reads in a row (e.g. parsing TIFF
+    IFDs) do not read the block file again each time.
+    """
+
+    def __init__(self, url, block_size=BLOCK_SIZE):
+        self.url = url
+        self.block_size = block_size
+
+        request = urllib.request.Request(url, method='HEAD')
+        with urllib.request.urlopen(request, timeout=TIMEOUT) as response:
+            headers = response.headers
+        if headers.get('Content-Length') is None:
+            raise ValueError(f"The server does not report the size of {url}")
+        self.size = int(headers['Content-Length'])
+
+        version = headers.get('ETag') or headers.get('Last-Modified') or ''
+        self.key = hashlib.sha1(f"{url}|{self.size}|{version}".encode('utf-8')).hexdigest()
+        self.block_dir = os.path.join(cache_dir('http'), self.key)
+        os.makedirs(self.block_dir, exist_ok=True)
+        self.block_count = (self.size + block_size - 1) // block_size
+        self.supports_range = None  # 第一次请求后才知道服务器是否支持 Range
+        self._lock = threading.Lock()
+        self._last_block = None  # 最近读取的 (块号, 数据)
+
+    def block_path(self, block):
+        return os.path.join(self.block_dir, f"{block}.blk")
+
+    def read_at(self, offset, size):
+        """Return up to `size` bytes starting at `offset`, fewer at the end of the file."""
+        end = min(offset + size, self.size)
+        if offset >= end:
+            return memoryview(b'')
+
+        first, last = offset // self.block_size, (end - 1) // self.block_size
+        last_block = self._last_block
+        if first == last and last_block is not None and last_block[0] == first:
+            blocks = {first: last_block[1]}
+        else:
+            blocks = self.read_cached(range(first, last + 1))
+            missing = [block for block in range(first, last + 1) if block not in blocks]
+            if missing:
+                # 多个线程可能同时下载同一块，块文件是原子替换的，结果相同
+                blocks.update(self.fetch_blocks(missing))
+            self._last_block = (last, blocks[last])
+
+        data = blocks[first] if first == last else b''.join(blocks[block] for block in range(first, last + 1))
+        start = offset - first * self.block_size
+        return memoryview(data)[start:start + end - offset]
+
+    def read_cached(self, blocks):
+        cached = {}
+        for block in blocks:
+            try:
+                with open(self.block_path(block), 'rb') as f:
+                    cached[block] = f.read()
+            except OSError:
+                pass
+        return cached
+
+    def fetch_blocks(self, blocks):
+        """Download blocks, one request per run of consecutive blocks, and store them in the cache.
+
+        A server that ignores Range sends the whole file; it is streamed into the cache
+        block by block, and the other runs are then taken from it without more requests.
+        """
+        runs = []
+        run_start = blocks[0]
+        for previous, block in zip(blocks, blocks[1:] + [None]):
+            if block != previous + 1:
+                runs.append((run_start, previous))
+                run_start = block
+
+        fetched = {}
+        for first, last in runs:
+            if all(block in fetched for block in range(first, last + 1)):
+                continue
+            fetched.update(self.fetch_range(first, last, set(blocks)))
+        return fetched
+
+    def fetch_range(self, first, last, wanted):
+        """Fetch blocks `first`..`last`; returns those and any other `wanted` blocks that came with them."""
+        if self.supports_range:
+            return self.request_range(first, last, wanted)
+        # 还不知道服务器是否支持 Range，或者要下载整个文件时，一次只发一个请求
+        with self._lock:
+            cached = self.read_cached(range(first, last + 1))
+            if len(cached) == last - first + 1:
+                return cached
+            if self.supports_range is False:
+                request = urllib.request.Request(self.url)
+                with urllib.request.urlopen(request, timeout=TIMEOUT) as response:
+                    return self.save_stream(response, wanted)
+            return self.request_range(first, last, wanted)
+
+    def request_range(self, first, last, wanted):
+        start = first * self.block_size
+        end = min((last + 1) * self.block_size, self.size) - 1
+        request = urllib.request.Request(self.url, headers={'Range': f"bytes={start}-{end}"})
+        with urllib.request.urlopen(request, timeout=TIMEOUT) as response:
+            if response.status != 206:
+                # 服务器不支持 Range 时返回整个文件，逐块写入缓存，以后不再请求
+                print(f"{self.url} does not support range requests, downloading the whole file")
+                self.supports_range = False
+                return self.save_stream(response, wanted)
+            content_range = response.headers.get('Content-Range', '')
+            match = re.match(r'bytes (\d+)-', content_range)
+            if match and int(match.group(1)) != start:
+                raise ValueError(f"Unexpected Content-Range '{content_range}' from {self.url}")
+            data = response.read()
+
+        self.supports_range = True
+        fetched = {block: data[(block - first) * self.block_size:(block - first + 1) * self.block_size]
+                   for block in range(first, last + 1)}
+        for block, block_data in fetched.items():
+            self.save_block(block, block_data)
+        return fetched
+
+    def save_stream(self, response, wanted):
+        """Save a response holding the whole file block by block; only the `wanted` blocks are kept in memory."""
+        fetched = {}
+        for block in range(self.block_count):
+            expected = min(self.block_size, self.size - block * self.block_size)
+            data = response.read(expected)
+            if len(data) != expected:
+                raise ValueError(f"{self.url} ended after {block * self.block_size} of {self.size} bytes")
+            self.save_block(block, data)
+            if block in wanted:
+                fetched[block] = data
+        return fetched
+
+    def save_block(self, block, data):
+        try:
+            temp_path = self.block_path(block) + f".{threading.get_ident()}.tmp"
+            with open(temp_path, 'wb') as f:
+                f.write(data)
+            os.replace(temp_path, self.block_path(block))
+        except OSError as e:
+            print(f"Could not cache block {block} of {self.url}: {e}")
+
+    def close(self):
+        pass
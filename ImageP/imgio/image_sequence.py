@@ -0,0 +1,108 @@
+import os
+import cv2
+import numpy as np
+
+from ImageP.utils.file_utils import list_folder_files
+
+SEQUENCE_EXTENSIONS = ('.png', '.tif', '.tiff', '.jpg', '.jpeg', '.bmp', '.pgm', '.ppm')
+
+# JPEG 可以在解码时直接缩小为 1/2、1/4、1/8，比先解码再缩放快得多
+REDUCED_GRAYSCALE_FLAGS = {2: cv2.IMREAD_REDUCED_GRAYSCALE_2, 4: cv2.IMREAD_REDUCED_GRAYSCALE_4,
+                           8: cv2.IMREAD_REDUCED_GRAYSCALE_8}
+REDUCED_COLOR_FLAGS = {2: cv2.IMREAD_REDUCED_COLOR_2, 4: cv2.IMREAD_REDUCED_COLOR_4, 8: cv2.IMREAD_REDUCED_COLOR_8}
+
+
+def select_sequence_files(folder, start=1, step=1, count=None, name_filter=''):
+    """Return the images of a folder in natural order, filtered like ImageJ's Image Sequence dialog.
+
+    `start` is the 1-based position of the first image, every `step`-th image is
+    taken, up to `count` images. Only names containing `name_filter` are kept.
+    """
+    files = [path for path in list_folder_files(folder, SEQUENCE_EXTENSIONS) if name_filter in os.path.basename(path)]
+    files = files[max(start, 1) - 1::max(step, 1)]
+    return files if count is None else files[:count]
+
+
+def read_sequence_image(file_path, scale=1.0, color=None):
+    """Decode one image of a sequence, scaled by `scale`; color images are returned as RGB.
+
+    `color` forces grayscale (False) or color (True) decoding when it is known from the
+    first image, which lets JPEGs use the reduced decoding of OpenCV.
+    """
+    # imdecode 而不是 imread，这样路径中可以有中文
+    data = np.fromfile(file_path, dtype=np.uint8)
+
+    factor = reduced_decoding_factor(file_path, scale)
+    if color is not None and factor is not None:
+        image = cv2.imdecode(data, (REDUCED_COLOR_FLAGS if color else REDUCED_GRAYSCALE_FLAGS)[factor])
+        scale = 1.0
+    else:
+        image = cv2.imdecode(data, cv2.IMREAD_UNCHANGED)
+
+    if image is None:
+        raise ValueError(f"Cannot decode {file_path}")
+
+    if image.ndim == 3:
+        # 丢掉 alpha 通道，BGR 转为 RGB
+        image = cv2.cvtColor(image[..., :3], cv2.COLOR_BGR2RGB)
+    return resize_image(image, scale)
+
+
+def reduced_decoding_factor(file_path, scale):
+    """Return the factor (2, 4 or 8) a JPEG is shrunk by while decoding it at `scale`, or None."""
+    factor = round(1 / scale) if scale < 1 else 1
+    if factor in REDUCED_GRAYSCALE_FLAGS and abs(scale * factor - 1) < 1e-6 \
+            and file_path.lower().endswith(('.jpg', '.jpeg')):
+        return factor
+    return None
+
+
+def resize_image(image, scale):
+    if scale == 1.0:
+        return image
+    height, width = image.shape[:2]
+    size = (max(1, round(width * scale)), max(1, round(height * scale)))
+    return cv2.resize(image, size, interpolation=cv2.INTER_AREA)
+
+
+def first_sequence_image(file_path, scale=1.0):
+    """Decode the first image of a sequence, which gives the shape and dtype of every image.
+
+    The loader reuses it instead of decoding the file again. A JPEG that the other
+    images are decoded reduced from is decoded once more the same way, so all slices match.
+    """
+    if not scale > 0:
+        raise ValueError(f"The scale must be greater than 0, not {scale}")
+    image = read_sequence_image(file_path)
+    if reduced_decoding_factor(file_path, scale) is not None:
+        return read_sequence_image(file_path, scale, color=image.ndim == 3)
+    return resize_image(image, scale)
+
+
+def read_sequence_into(file_path, out, scale=1.0):
+    """Decode one image of a sequence into `out`, its (1, y, x[, c]) preallocated part of the stack."""
+    image = read_sequence_image(file_path, scale, color=out.ndim == 4)
+    if image.shape != out.shape[1:]:
+        # 和第一张图像尺寸不同的图像跳过（保持为0），与 ImageJ 相同
+        print(f"Skipping {file_path}: size {image.shape} differs from {out.shape[1:]}")
+        return
+    out[0] = image
+
+
+def read_stack_list(list_path):
+    """Return the image paths listed in a text file, one per line, as for Import > Stack From List.
+
+    Relative paths are relative to the folder of the list. Empty lines and lines
+    starting with '#' are skipped; a path may appear more than once.
+    """
+    folder = os.path.dirname(os.path.abspath(list_path))
+    files = []
+    with open(list_path, 'r', encoding='utf-8-sig') as f:
+        for line in f:
+            path = line.strip().strip('"')
+            if not path or path.startswith('#'):
+                continue
+            files.append(os.path.normpath(os.path.join(folder, os.path.expanduser(path))))
+    if not files:
+        raise ValueError(f"{list_path} does not list any files")
+    return files
@@ -0,0 +1,48 @@
+import hashlib
+import json
+import os
+
+# 打开文件时生成的索引（压缩文件的检查点、TIFF页表等）保存在这里，下次打开时直接复用
+CACHE_ROOT = os.path.join(os.path.expanduser('~'), '.imagep', 'cache')
+
+
+def cache_dir(kind):
+    """Return (and create) the cache directory for one kind of index."""
+    path = os.path.join(CACHE_ROOT, kind)
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+def source_key(file_path):
+    """Key identifying a file by path, size and modification time, so stale indexes are never used."""
+    stat = os.stat(file_path)
+    source = f"{os.path.abspath(file_path)}|{stat.st_size}|{stat.st_mtime_ns}"
+    return hashlib.sha1(source.encode('utf-8')).hexdigest()
+
+
+def index_path(file_path, kind, key=None):
+    return os.path.join(cache_dir(kind), (key or source_key(file_path)) + '.json')
+
+
+def load_index(file_path, kind, key=None):
+    """Return the saved index of a file, or None if there is none for its current version.
+
+    `key` replaces source_key for sources that are not local files (e.g. HttpByteSource.key).
+    """
+    try:
+        with open(index_path(file_path, kind, key), 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def save_index(file_path, kind, index, key=None):
+    """Save the index of a file; failures are only reported since the index can always be rebuilt."""
+    try:
+        path = index_path(file_path, kind, key)
+        temp_path = path + '.tmp'
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            json.dump(index, f)
+        os.replace(temp_path, path)
+    except OSError as e:
+        print(f"Could not save index for {file_path}: {e}")
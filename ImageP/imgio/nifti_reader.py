@@ -0,0 +1,156 @@
+import os
+import numpy as np
+
+from ImageP.imgio.byte_source import FileByteSource
+from ImageP.imgio.compressed import CompressedReader, compression_kind, index_fill
+from ImageP.imgio.virtual_stack import VirtualStack
+
+# NIfTI datatype 代码对应的 numpy 类型（不含字节序）
+NIFTI_DTYPES = {2: 'u1', 4: 'i2', 8: 'i4', 16: 'f4', 64: 'f8', 128: 'u1', 256: 'i1', 512: 'u2', 768: 'u4',
+                1024: 'i8', 1280: 'u8', 2304: 'u1'}
+RGB_DTYPES = {128: 3, 2304: 4}  # RGB24 / RGBA32, samples interleaved per voxel
+
+# Header fields as (offset, type, count) for NIfTI-1 / Analyze 7.5 and NIfTI-2
+NIFTI1_FIELDS = {'dim': (40, 'i2', 8), 'datatype': (70, 'i2', 1), 'pixdim': (76, 'f4', 8),
+                 'vox_offset': (108, 'f4', 1), 'scl_slope': (112, 'f4', 1), 'scl_inter': (116, 'f4', 1)}
+NIFTI2_FIELDS = {'datatype': (12, 'i2', 1), 'dim': (16, 'i8', 8), 'pixdim': (104, 'f8', 8),
+                 'vox_offset': (168, 'i8', 1), 'scl_slope': (176, 'f8', 1), 'scl_inter': (184, 'f8', 1)}
+
+
+def open_source(file_path):
+    """Return a byte source for a file: memory-mapped, or decompressing for .gz / .zst."""
+    if compression_kind(file_path):
+        return CompressedReader(file_path)
+    return FileByteSource(file_path)
+
+
+def read_nifti_header(source):
+    """Parse a NIfTI-1, NIfTI-2 or Analyze 7.5 header into a dict."""
+    header = bytes(source.read_at(0, 540))
+    for byte_order in ('<', '>'):
+        sizeof_hdr = int(np.frombuffer(header, byte_order + 'i4', count=1)[0])
+        if sizeof_hdr in (348, 540):
+            break
+    else:
+        raise ValueError("Not a NIfTI or Analyze header")
+
+    if sizeof_hdr == 540:
+        fields, magic = NIFTI2_FIELDS, header[4:7]
+    else:
+        fields, magic = NIFTI1_FIELDS, header[344:347]
+
+    info = {'byte_order': byte_order, 'magic': magic.decode('latin-1')}
+    for name, (offset, dtype, count) in fields.items():
+        values = np.frombuffer(header, byte_order + dtype, count=count, offset=offset).tolist()
+        info[name] = values if count > 1 else values[0]
+
+    if info['magic'] not in ('n+1', 'ni1', 'n+2', 'ni2'):
+        # Analyze 7.5: 没有缩放，数据总在单独的 .img 文件中
+        info['magic'] = 'analyze'
+        info['scl_slope'], info['scl_inter'] = 0.0, 0.0
+    return info
+
+
+def image_file_path(file_path, info):
+    """Return the file holding the voxels: the .nii itself, or the .img next to a .hdr."""
+    if info['magic'] in ('n+1', 'n+2'):
+        return file_path
+    base = file_path[:-3] if file_path.endswith('.gz') else file_path
+    base = os.path.splitext(base)[0]
+    for candidate in (base + '.img', base + '.img.gz', base + '.IMG'):
+        if os.path.exists(candidate):
+            return candidate
+    raise FileNotFoundError(f"Image data {base}.img not found")
+
+
+def header_file_path(file_path):
+    """Return the header of a .hdr/.img pair when the .img was selected."""
+    base = file_path[:-3] if file_path.endswith('.gz') else file_path
+    stem, extension = os.path.splitext(base)
+    if extension.lower() != '.img':
+        return file_path
+    for candidate in (stem + '.hdr', stem + '.HDR'):
+        if os.path.exists(candidate):
+            return candidate
+    raise FileNotFoundError(f"Header {stem}.hdr not found")
+
+
+class NiftiStack(VirtualStack):
+    """Virtual stack over the voxels of a NIfTI file, scaled by scl_slope / scl_inter one slice at a time."""
+
+    def __init__(self, source, raw_shape, dtype, offset=0, slope=1.0, inter=0.0, cache=None):
+        self.source = source
+        self.raw_shape = tuple(raw_shape)
+        self.raw_dtype = np.dtype(dtype)
+        self.offset = offset
+        self.slope = slope
+        self.inter = inter
+        self.scaled = (slope, inter) != (1.0, 0.0)
+        # RGBA 只显示 RGB
+        shape = self.raw_shape[:3] + ((3,) if len(self.raw_shape) > 3 else ())
+        super().__init__(shape, np.float32 if self.scaled else self.raw_dtype, cache)
+        self.slice_nbytes = int(np.prod(self.raw_shape[1:])) * self.raw_dtype.itemsize
+        self.cheap_reads = isinstance(source, FileByteSource)
+
+    def read_slice(self, index):
+        data = self.source.read_at(self.offset + index * self.slice_nbytes, self.slice_nbytes)
+        count = len(data) // self.raw_dtype.itemsize
+        image = np.zeros(self.slice_nbytes // self.raw_dtype.itemsize, self.raw_dtype)
+        image[:count] = np.frombuffer(data, self.raw_dtype, count=count)
+        # NIfTI 的 y 轴朝上，显示时上下翻转（与 ImageJ 相同）
+        image = image.reshape(self.raw_shape[1:])[::-1]
+        if image.ndim == 3:
+            image = image[..., :3]
+        if self.scaled:
+            image = image.astype(np.float32)
+            image *= self.slope
+            image += self.inter
+        return image
+
+    def close(self):
+        self.source.close()
+
+
+def open_nifti(file_path, cache=None):
+    """Open a NIfTI-1/2 or Analyze 7.5 image as a (z, y, x) stack; 4D volumes are stacked along z.
+
+    Returns (stack, fill) like raw_reader.open_raw_progressive. Uncompressed, unscaled
+    files are a flipped view of a memory mapping of the voxel block. Scaled files and
+    .nii.gz are virtual stacks that read, decompress and scale a slice when it is used.
+    """
+    header_path = header_file_path(file_path)
+    header_source = open_source(header_path)
+    info = read_nifti_header(header_source)
+
+    datatype = info['datatype']
+    if datatype not in NIFTI_DTYPES:
+        raise ValueError(f"Unsupported NIfTI datatype: {datatype}")
+    dtype = np.dtype(NIFTI_DTYPES[datatype]).newbyteorder(info['byte_order'])
+
+    # NIfTI 按 x 最快、然后 y、z、t 的顺序存储，即 C 顺序的 (t, z, y, x)；所有体积依次作为图层
+    dims = [max(int(n), 1) for n in info['dim'][1:max(1, min(info['dim'][0], 7)) + 1]] + [1, 1]
+    layers = int(np.prod(dims[2:]))
+    shape = (layers, dims[1], dims[0]) + ((RGB_DTYPES[datatype],) if datatype in RGB_DTYPES else ())
+
+    data_path = image_file_path(header_path, info)
+    if data_path == header_path:
+        source = header_source
+    else:
+        header_source.close()
+        source = open_source(data_path)
+    offset = int(info['vox_offset']) if info['magic'] in ('n+1', 'n+2') else 0
+
+    slope, inter = info['scl_slope'], info['scl_inter']
+    if slope == 0 or not np.isfinite(slope):
+        # scl_slope 为 0 表示不缩放
+        slope, inter = 1.0, 0.0
+
+    if isinstance(source, FileByteSource) and (slope, inter) == (1.0, 0.0):
+        source.close()  # 这里直接映射数据，不再通过 source 读取
+        voxels = np.memmap(data_path, dtype=dtype, mode='c', offset=offset, shape=shape)
+        return voxels[:, ::-1, :, :3] if voxels.ndim > 3 else voxels[:, ::-1], None
+
+    stack = NiftiStack(source, shape, dtype, offset, slope, inter, cache)
+    if isinstance(source, CompressedReader) and not source.complete:
+        return stack, index_fill(stack, source)
+    return stack, None
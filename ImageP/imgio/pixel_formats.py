@@ -0,0 +1,121 @@
+import numpy as np
+
+# Image types of the Import > Raw dialog and how their pixels are stored on disk:
+# (storage dtype, bytes per pixel, channels of the decoded image)
+PIXEL_FORMATS = {
+    "8-bit": ('u1', 1, 1),
+    "16-bit Signed": ('i2', 2, 1),
+    "16-bit Unsigned": ('u2', 2, 1),
+    "32-bit Signed": ('i4', 4, 1),
+    "32-bit Unsigned": ('u4', 4, 1),
+    "32-bit Real": ('f4', 4, 1),
+    "64-bit Real": ('f8', 8, 1),
+    "24-bit RGB": ('u1', 3, 3),  # R, G, B 交错存储
+    "24-bit RGB Planar": ('u1', 3, 3),  # 先存所有R，再存所有G，最后存所有B
+    "24-bit BGR": ('u1', 3, 3),
+    "24-bit Integer": ('u1', 3, 1),  # 每个像素3字节的无符号整数
+    "32-bit ARGB": ('u1', 4, 3),
+    "32-bit ABGR": ('u1', 4, 3),
+    "1-bit Bitmap": ('u1', None, 1),  # 每行按字节对齐的位图
+}
+
+# Types that cannot be expressed as a view of the raw bytes and are decoded slice by slice
+COMPUTED_FORMATS = ("24-bit Integer", "1-bit Bitmap")
+
+
+def get_pixel_format(image_type):
+    if image_type not in PIXEL_FORMATS:
+        raise ValueError(f"Unsupported image type: {image_type}")
+    return PIXEL_FORMATS[image_type]
+
+
+def storage_dtype(image_type, little_endian=False):
+    """Return the on-disk dtype of one sample, with its byte order."""
+    dtype = np.dtype(get_pixel_format(image_type)[0])
+    return dtype.newbyteorder('<' if little_endian else '>')
+
+
+def decoded_dtype(image_type, little_endian=False):
+    """Return the dtype of the decoded image, plain types keep their on-disk byte order."""
+    if image_type == "24-bit Integer":
+        return np.dtype(np.uint32)
+    return storage_dtype(image_type, little_endian)
+
+
+def decoded_shape(image_type, height, width):
+    """Return the shape of one decoded slice, (height, width) or (height, width, 3) for color."""
+    channels = get_pixel_format(image_type)[2]
+    return (height, width) if channels == 1 else (height, width, channels)
+
+
+def slice_nbytes(image_type, width, height):
+    """Return the number of bytes one slice occupies on disk."""
+    bytes_per_pixel = get_pixel_format(image_type)[1]
+    if bytes_per_pixel is None:
+        return height * ((width + 7) // 8)
+    return height * width * bytes_per_pixel
+
+
+def decode_stack_view(raw, image_type, width, height, little_endian=False):
+    """Decode a (z, slice_nbytes) uint8 array as a view without copying.
+
+    Returns None for types that need computation (see COMPUTED_FORMATS), which
+    are decoded per slice with `decode_slice` instead.
+    """
+    if image_type in COMPUTED_FORMATS:
+        return None
+
+    layers = raw.shape[0]
+    channels = get_pixel_format(image_type)[2]
+
+    if channels == 1:
+        return raw.view(storage_dtype(image_type, little_endian)).reshape(layers, height, width)
+
+    if image_type == "24-bit RGB Planar":
+        return np.moveaxis(raw.reshape(layers, 3, height, width), 1, -1)
+
+    if image_type in ("24-bit RGB", "24-bit BGR"):
+        pixels = raw.reshape(layers, height, width, 3)
+        return pixels if image_type == "24-bit RGB" else pixels[..., ::-1]
+
+    # 32位颜色：小端字节序时字节顺序是反的（ARGB 存为 B,G,R,A）
+    pixels = raw.reshape(layers, height, width, 4)
+    if image_type == "32-bit ARGB":
+        return pixels[..., 2::-1] if little_endian else pixels[..., 1:4]
+    return pixels[..., 0:3] if little_endian else pixels[..., 3:0:-1]
+
+
+def decode_slice(buffer, image_type, width, height, little_endian=False):
+    """Decode the raw bytes of one slice (1-D uint8 array) into an image."""
+    buffer = np.asarray(buffer, dtype=np.uint8)
+
+    if image_type == "24-bit Integer":
+        # 补一个零字节，得到4字节整数后直接按字节序解释
+        padded = np.zeros((height, width, 4), dtype=np.uint8)
+        if little_endian:
+            padded[..., :3] = buffer.reshape(height, width, 3)
+            return padded.view('<u4')[..., 0].astype(np.uint32)
+        padded[..., 1:] = buffer.reshape(height, width, 3)
+        return padded.view('>u4')[..., 0].astype(np.uint32)
+
+    if image_type == "1-bit Bitmap":
+        bits = np.unpackbits(buffer.reshape(height, (width + 7) // 8), axis=1, count=width)
+        np.multiply(bits, 255, out=bits)
+        return bits
+
+    return decode_stack_view(buffer.reshape(1, -1), image_type, width, height, little_endian)[0]
+
+
+def to_native_byte_order(image):
+    """Return the image in native byte order, copying only when it is byte-swapped."""
+    if image.dtype.isnative:
+        return image
+    return image.astype(image.dtype.newbyteorder('='))
+
+
+def native_copy(stack, chunk_slices=16):
+    """Copy a stack into native byte order chunk by chunk, so only one chunk is converted at a time."""
+    native = np.empty(stack.shape, dtype=stack.dtype.newbyteorder('='))
+    for start in range(0, stack.shape[0], chunk_slices):
+        native[start:start + chunk_slices] = stack[start:start + chunk_slices]
+    return native
@@ -0,0 +1,72 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+
+class SlicePrefetcher:
+    """Load the slices ahead of the current position on worker threads.
+
+    `load_slice(index)` must be thread-safe and store its result in `cache` (a SliceCache),
+    which is shared with the display code. The scrub direction is predicted from the last
+    positions, or given explicitly by the play timer.
+    """
+
+    def __init__(self, load_slice, cache, num_slices, depth=8, workers=2):
+        self.load_slice = load_slice
+        self.cache = cache
+        self.num_slices = num_slices
+        self.depth = depth
+        self.direction = 1
+        self.wrap = False  # 播放时到达末尾后会回到第一层
+        self.last_index = None
+        self._pending = {}
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='slice-prefetch')
+
+    def update(self, index, direction=None):
+        """Record the new position and queue the next `depth` slices in the scrub direction."""
+        if direction is None and self.last_index is not None and index != self.last_index:
+            direction = 1 if index > self.last_index else -1
+        if direction:
+            self.direction = direction
+        self.last_index = index
+
+        wanted = self.upcoming(index)
+        with self._lock:
+            # 取消已经不在预取范围内、还没开始的任务
+            for layer, future in list(self._pending.items()):
+                if layer not in wanted and future.cancel():
+                    del self._pending[layer]
+
+            for layer in wanted:
+                if layer in self._pending or layer in self.cache:
+                    continue
+                self._pending[layer] = self._executor.submit(self._load, layer)
+
+    def upcoming(self, index):
+        """Return the indices that should be in the cache next, nearest first."""
+        indices = []
+        for step in range(1, self.depth + 1):
+            layer = index + step * self.direction
+            if self.wrap:
+                layer %= self.num_slices
+            elif not 0 <= layer < self.num_slices:
+                break
+            if layer != index and layer not in indices:
+                indices.append(layer)
+        return indices
+
+    def _load(self, index):
+        try:
+            self.load_slice(index)
+        except Exception as e:
+            print(f"Error while prefetching slice {index}: {e}")
+        finally:
+            with self._lock:
+                self._pending.pop(index, None)
+
+    def shutdown(self):
+        with self._lock:
+            for future in self._pending.values():
+                future.cancel()
+            self._pending.clear()
+        self._executor.shutdown(wait=False)
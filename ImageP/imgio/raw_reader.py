@@ -0,0 +1,111 @@
+import os
+import numpy as np
+
+from ImageP.imgio.pixel_formats import decode_stack_view, decode_slice, decoded_dtype, decoded_shape, slice_nbytes
+from ImageP.imgio.virtual_stack import DecodedRawStack, RawVirtualStack
+from ImageP.imgio.compressed import CompressedReader, compression_kind, index_fill
+
+
+def raw_slice_count(file_path, slice_nbytes, offset=0, gap=0):
+    """Return how many complete slices the file holds after `offset`."""
+    available = os.path.getsize(file_path) - offset
+    if slice_nbytes <= 0 or available < slice_nbytes:
+        return 0
+    return (available - slice_nbytes) // (slice_nbytes + gap) + 1
+
+
+def open_raw_bytes(file_path, layers, slice_nbytes, offset=0, gap=0, mode='c'):
+    """Map `layers` raw slices as a (z, slice_nbytes) uint8 view without reading them.
+
+    Slices start at `offset` and are separated by `gap` bytes. The default
+    copy-on-write mode lets callers modify slices in memory while the file
+    itself stays untouched.
+    """
+    slice_stride = slice_nbytes + gap
+
+    # Only map the bytes that are actually covered by slices, the gap after the last slice may be missing
+    span = (layers - 1) * slice_stride + slice_nbytes
+    raw = np.memmap(file_path, dtype=np.uint8, mode=mode, offset=offset, shape=(span,))
+
+    return np.ndarray((layers, slice_nbytes), dtype=np.uint8, buffer=raw, strides=(slice_stride, 1))
+
+
+def open_raw_memmap(file_path, shape, image_type, little_endian=False, offset=0, gap=0, mode='c'):
+    """Map a raw (z, y, x) stack straight from disk without reading it.
+
+    Types whose pixels are a plain view of the bytes (integers, floats, interleaved
+    and planar color) give a strided array; packed 24-bit integers and bitmaps give
+    a stack that decodes each slice from the mapping when it is accessed.
+    """
+    layers, height, width = shape
+    raw = open_raw_bytes(file_path, layers, slice_nbytes(image_type, width, height), offset, gap, mode)
+
+    stack = decode_stack_view(raw, image_type, width, height, little_endian)
+    if stack is None:
+        stack = DecodedRawStack(raw, image_type, width, height, little_endian)
+    return stack
+
+
+def open_raw_progressive(file_path, shape, image_type, little_endian=False, offset=0, gap=0, chunk_slices=16):
+    """Open a raw stack so that it can be displayed before it is completely read.
+
+    Returns (stack, fill). When the file holds every requested slice the stack is
+    memory-mapped and fill is None. Otherwise the stack is a zero padded array in
+    memory, and fill is an iterator that reads the available slices into it chunk
+    by chunk, yielding (first slice, number of slices) after each chunk.
+    """
+    layers, height, width = shape
+    nbytes = slice_nbytes(image_type, width, height)
+    available = raw_slice_count(file_path, nbytes, offset, gap)
+
+    if available >= layers:
+        return open_raw_memmap(file_path, shape, image_type, little_endian, offset, gap), None
+
+    # 数据不足以填满所有图层，缺少的图层用0填充（这种情况下只能读入内存）
+    print(f"Warning: File only holds {available} of {layers} images. Padding with zeros.")
+    stack = np.zeros((layers,) + decoded_shape(image_type, height, width),
+                     dtype=decoded_dtype(image_type, little_endian).newbyteorder('='))
+
+    def fill():
+        if available == 0:
+            return
+        source = open_raw_memmap(file_path, (available, height, width), image_type, little_endian, offset, gap, mode='r')
+        for start in range(0, available, chunk_slices):
+            stop = min(start + chunk_slices, available)
+            stack[start:stop] = source[start:stop]
+            yield start, stop - start
+
+    return stack, fill()
+
+
+def open_compressed_raw(file_path, shape, image_type, little_endian=False, offset=0, gap=0, cache=None):
+    """Open a .raw.gz / .raw.zst stack as a virtual stack that decompresses slices on demand.
+
+    Returns (stack, fill) like open_raw_progressive. The first time a file is opened,
+    fill decompresses it once from front to back: this finds the seek index (saved for
+    later sessions) and puts the slices in the stack's cache on the way. Once the index
+    is complete fill is None.
+    """
+    reader = CompressedReader(file_path)
+    stack = RawVirtualStack(file_path, shape, image_type, little_endian, offset, gap, cache, reader)
+    return stack, None if reader.complete else index_fill(stack, reader)
+
+
+def load_raw_stack(file_path, shape, image_type, little_endian=False, offset=0, gap=0):
+    """Open a raw stack, memory-mapped whenever the file holds every requested slice."""
+    stack, fill = open_raw_progressive(file_path, shape, image_type, little_endian, offset, gap)
+    for _ in fill or ():
+        pass
+    return stack
+
+
+def read_raw_into(file_path, out, image_type, little_endian=False, offset=0, gap=0):
+    """Decode a raw file straight into `out`, the (z, y, x[, c]) part of a preallocated stack."""
+    layers, height, width = out.shape[:3]
+    if compression_kind(file_path):
+        stack, _ = open_compressed_raw(file_path, (layers, height, width), image_type, little_endian, offset, gap)
+        for layer in range(layers):
+            out[layer] = stack[layer]
+        return
+    stack = load_raw_stack(file_path, (layers, height, width), image_type, little_endian, offset, gap)
+    out[...] = stack[:]
@@ -0,0 +1,75 @@
+import threading
+import numpy as np
+
+from ImageP.imgio.virtual_stack import VirtualStack
+
+
+def find_memmap(image):
+    """Return the np.memmap that maps the file an array is a view of, or None."""
+    # memmap 的切片也是 memmap，要找到最底层直接映射文件的那一个
+    mapping = None
+    while isinstance(image, np.ndarray):
+        if isinstance(image, np.memmap):
+            mapping = image
+        image = image.base
+    return mapping
+
+
+def remap(image, mode):
+    """Return the same view as `image` on a new mapping of its file, opened with `mode`.
+
+    Used on copy-on-write views: the new mapping shows the file as it is on disk,
+    without any of the changes made through the old one.
+    """
+    mapping = find_memmap(image)
+    fresh = np.memmap(mapping.filename, dtype=np.uint8, mode=mode, offset=mapping.offset, shape=(mapping.nbytes,))
+    # 视图在原映射中的起始位置（可能有负的步长，例如上下翻转的 NIfTI）
+    start = image.__array_interface__['data'][0] - mapping.__array_interface__['data'][0]
+    return np.ndarray(image.shape, image.dtype, buffer=fresh, offset=start, strides=image.strides)
+
+
+class StackSnapshot:
+    """Copy-on-write snapshot of a stack as it was loaded, used by File > Revert.
+
+    Nothing is copied when the snapshot is taken. Processing calls `preserve(layer)`
+    before it writes a slice, and only then is the original of that slice kept. Virtual
+    stacks keep their changes apart from the data on disk anyway, and copy-on-write
+    mappings never write to the file, so for those the file itself is the snapshot.
+    """
+
+    def __init__(self, stack):
+        self.stack = stack
+        self.originals = {}  # 第一次修改之前的切片
+        self.copy_on_write = isinstance(stack, np.ndarray) and find_memmap(stack) is not None \
+            and find_memmap(stack).mode == 'c'
+        self._lock = threading.Lock()
+
+    def preserve(self, layer, stack=None):
+        """Keep the original of `layer` before it is modified for the first time."""
+        if stack is not None and stack is not self.stack:
+            # 图像已经被替换（例如转换字节序后的副本），原来的栈不会再被修改
+            return
+        if isinstance(self.stack, VirtualStack) or self.copy_on_write or self.stack.ndim < 3:
+            return
+        with self._lock:
+            if layer not in self.originals:
+                self.originals[layer] = np.array(self.stack[layer])
+
+    def revert(self):
+        """Return the stack as it was loaded, restoring only the slices that were modified."""
+        if isinstance(self.stack, VirtualStack):
+            for layer in list(self.stack.modified):
+                del self.stack.modified[layer]
+                self.stack.cache.discard(layer)
+            return self.stack
+
+        if self.copy_on_write:
+            # 重新映射文件，被修改的私有页随旧的映射一起释放
+            self.stack = remap(self.stack, 'c')
+            return self.stack
+
+        with self._lock:
+            for layer, original in self.originals.items():
+                self.stack[layer] = original
+            self.originals.clear()
+        return self.stack
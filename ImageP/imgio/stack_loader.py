@@ -0,0 +1,117 @@
+import os
+import threading
+import numpy as np
+from concurrent.futures import ThreadPoolExecutor
+from PyQt5.QtCore import QObject, QThread, pyqtSignal
+
+from ImageP.imgio.pixel_formats import to_native_byte_order
+from ImageP.imgproc.sanitize import clean_non_finite
+
+
+class ParallelStackLoader(QObject):
+    """Fill a preallocated stack from many sources on a thread pool.
+
+    `load_item(item, out)` decodes one item (usually a file) straight into `out`,
+    the `slices_per_item` slices of the stack that belong to it. An item that occurs
+    more than once is loaded once and copied to its other places in the stack.
+    Signals are emitted from the worker threads and delivered queued to the GUI thread.
+    """
+
+    slices_loaded = pyqtSignal(int, int)  # first slice, number of slices
+    progress = pyqtSignal(int, int)  # loaded items, total distinct items
+    finished = pyqtSignal()
+
+    def __init__(self, stack, items, load_item, slices_per_item=1, workers=None):
+        super().__init__()
+        self.stack = stack
+        self.items = list(items)
+        self.load_item = load_item
+        self.slices_per_item = slices_per_item
+        self.workers = workers or min(8, os.cpu_count() or 1)
+        self.loaded = 0
+        # 相同的项只读取一次：项 -> 它在栈中的所有位置
+        self.positions = {}
+        for index, item in enumerate(self.items):
+            self.positions.setdefault(item, []).append(index)
+        self.cancelled = False
+        self._lock = threading.Lock()
+        self._executor = None
+
+    def start(self):
+        self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='stack-loader')
+        for item, indices in self.positions.items():
+            self._executor.submit(self._load, item, indices)
+        self._executor.shutdown(wait=False)
+
+    def is_running(self):
+        return not self.cancelled and self.loaded < len(self.positions)
+
+    def cancel(self):
+        self.cancelled = True
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+
+    def _load(self, item, indices):
+        if self.cancelled:
+            return
+
+        count = self.slices_per_item
+        start = indices[0] * count
+        try:
+            self.load_item(item, self.stack[start:start + count])
+            for index in indices[1:]:
+                self.stack[index * count:(index + 1) * count] = self.stack[start:start + count]
+        except Exception as e:
+            # 读取失败的文件保持为0，不影响其他文件
+            print(f"Error while loading {item}: {e}")
+
+        with self._lock:
+            self.loaded += 1
+            loaded = self.loaded
+
+        if self.cancelled:
+            return
+        for index in indices:
+            self.slices_loaded.emit(index * count, count)
+        self.progress.emit(loaded, len(self.positions))
+        if loaded == len(self.positions):
+            self.finished.emit()
+
+
+class StackLoaderThread(QThread):
+    """Open a stack off the GUI thread, then fill in the rest of it in the background.
+
+    `open_stack()` returns (stack, fill) like raw_reader.open_raw_progressive. The
+    first slice is decoded here, so the window can show it as soon as `stack_opened`
+    arrives. Loading stops early when `requestInterruption()` is called.
+    """
+
+    stack_opened = pyqtSignal(object, object)  # stack, first slice ready for display
+    slices_loaded = pyqtSignal(int, int)  # first slice, number of slices
+    progress = pyqtSignal(int, int)  # loaded slices, total slices
+    load_failed = pyqtSignal(str)
+
+    def __init__(self, open_stack):
+        super().__init__()
+        self.open_stack = open_stack
+
+    def run(self):
+        try:
+            stack, fill = self.open_stack()
+
+            first_layer = to_native_byte_order(np.array(stack[0]))
+            clean_non_finite(first_layer, copy=False)
+            self.stack_opened.emit(stack, first_layer)
+
+            if fill is None:
+                return
+
+            for first, count in fill:
+                if self.isInterruptionRequested():
+                    print("Loading cancelled")
+                    return
+                # 其余各层在显示时才检查和替换 NaN 和无穷大
+                self.slices_loaded.emit(first, count)
+                self.progress.emit(first + count, stack.shape[0])
+        except Exception as e:
+            self.load_failed.emit(str(e))
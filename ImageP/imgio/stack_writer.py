@@ -0,0 +1,258 @@
+import os
+import queue
+import struct
+import threading
+import numpy as np
+from PyQt5.QtCore import QThread, pyqtSignal
+
+BLOCK_SIZE = 64 * 1024 * 1024
+FLUSH_QUEUE_BLOCKS = 2  # 等待写入磁盘的块数上限，内存占用最多约为 (2 + 1) * BLOCK_SIZE
+
+# TIFF SampleFormat: 1 = unsigned, 2 = signed, 3 = float
+SAMPLE_FORMATS = {'u': 1, 'i': 2, 'f': 3}
+TIFF_DTYPES = ('u1', 'i1', 'u2', 'i2', 'u4', 'i4', 'f4', 'f8')
+
+
+class BufferedBlockWriter:
+    """File writer that collects small writes into large blocks.
+
+    With `background` set, full blocks are written by a flush thread while the caller
+    prepares the next one; at most FLUSH_QUEUE_BLOCKS blocks wait, so memory stays
+    constant however much is written. Errors of the flush thread are raised on the
+    next write or on close.
+    """
+
+    def __init__(self, file_path, block_size=BLOCK_SIZE, background=True):
+        self.file = open(file_path, 'wb')
+        self.block_size = block_size
+        self.buffer = bytearray()
+        self.position = 0
+        self.error = None
+        self.queue = None
+        self.thread = None
+        if background:
+            self.queue = queue.Queue(maxsize=FLUSH_QUEUE_BLOCKS)
+            self.thread = threading.Thread(target=self._flush_loop, name='stack-writer', daemon=True)
+            self.thread.start()
+
+    def write(self, data):
+        if self.error is not None:
+            raise self.error
+        data = memoryview(data).cast('B')
+        self.position += data.nbytes
+        if data.nbytes >= self.block_size:
+            # 大块数据不经过缓冲区，直接交给写入线程
+            self._submit(self.buffer)
+            self.buffer = bytearray()
+            self._submit(data)
+            return
+        self.buffer += data
+        if len(self.buffer) >= self.block_size:
+            self._submit(self.buffer)
+            self.buffer = bytearray()
+
+    def _submit(self, block):
+        if not block:
+            return
+        if self.queue is None:
+            self.file.write(block)
+        else:
+            self.queue.put(block)
+
+    def _flush_loop(self):
+        while True:
+            block = self.queue.get()
+            if block is None:
+                return
+            if self.error is None:
+                try:
+                    self.file.write(block)
+                except OSError as e:
+                    self.error = e
+
+    def close(self):
+        try:
+            self._submit(self.buffer)
+            self.buffer = bytearray()
+        finally:
+            if self.thread is not None:
+                self.queue.put(None)
+                self.thread.join()
+            self.file.close()
+        if self.error is not None:
+            raise self.error
+
+
+def saved_dtype(dtype, byte_order='<'):
+    """Return the dtype a stack is written with: its own type, bool as uint8, int64 as float64."""
+    dtype = np.dtype(dtype)
+    if dtype == np.bool_:
+        return np.dtype(byte_order + 'u1')
+    if dtype.str[1:] not in TIFF_DTYPES:
+        return np.dtype(byte_order + 'f8')
+    return dtype.newbyteorder(byte_order)
+
+
+def iter_saved_slices(stack, dtype):
+    """Yield the slices of any stack (array, memory mapping or virtual stack) one at a time in `dtype`."""
+    for index in range(stack.shape[0]):
+        yield index, np.ascontiguousarray(np.asarray(stack[index]), dtype=dtype)
+
+
+def write_raw(stack, file_path, little_endian=True, progress=None, background=True):
+    """Write a stack slice by slice as raw data, without header."""
+    dtype = saved_dtype(stack.dtype, '<' if little_endian else '>')
+    writer = BufferedBlockWriter(file_path, background=background)
+    try:
+        for index, image in iter_saved_slices(stack, dtype):
+            writer.write(image)
+            if progress is not None and progress(index + 1, stack.shape[0]) is False:
+                break
+    finally:
+        writer.close()
+
+
+def tiff_ifd(entries, bigtiff, ifd_offset, next_ifd):
+    """Build one IFD from (tag, type, values) entries; values that do not fit inline follow the IFD."""
+    type_formats = {3: 'H', 4: 'I', 16: 'Q'}
+    count_format, offset_format, inline = ('Q', 'Q', 8) if bigtiff else ('I', 'I', 4)
+    ifd_size = (8 if bigtiff else 2) + len(entries) * (20 if bigtiff else 12) + (8 if bigtiff else 4)
+
+    ifd = struct.pack('<Q' if bigtiff else '<H', len(entries))
+    extra = b''
+    for tag, value_type, values in sorted(entries):
+        data = struct.pack(f'<{len(values)}{type_formats[value_type]}', *values)
+        if len(data) > inline:
+            field = struct.pack('<' + offset_format, ifd_offset + ifd_size + len(extra))
+            extra += data
+        else:
+            field = data.ljust(inline, b'\0')
+        ifd += struct.pack(f'<HH{count_format}', tag, value_type, len(values)) + field
+    ifd += struct.pack('<' + offset_format, next_ifd)
+    return ifd + extra
+
+
+def tiff_page(image, bigtiff, page_offset, next_page):
+    """Return the IFD of one page placed at `page_offset`, its strip follows right after it."""
+    height, width = image.shape[:2]
+    samples = image.shape[2] if image.ndim == 3 else 1
+    long_type = 16 if bigtiff else 4
+
+    def entries(strip_offset):
+        return [
+            (254, 4, [0]),
+            (256, 4, [width]),
+            (257, 4, [height]),
+            (258, 3, [image.dtype.itemsize * 8] * samples),
+            (259, 3, [1]),
+            (262, 3, [2 if samples == 3 else 1]),
+            (273, long_type, [strip_offset]),
+            (277, 3, [samples]),
+            (278, 4, [height]),
+            (279, long_type, [image.nbytes]),
+            (284, 3, [1]),
+            (339, 3, [SAMPLE_FORMATS[image.dtype.kind]] * samples),
+        ]
+
+    # IFD 的长度与偏移量的值无关，先用 0 计算长度，再得到数据的位置
+    ifd_size = len(tiff_ifd(entries(0), bigtiff, page_offset, 0))
+    strip_offset = page_offset + ifd_size + ifd_size % 2
+    ifd = tiff_ifd(entries(strip_offset), bigtiff, page_offset, next_page)
+    return ifd.ljust(strip_offset - page_offset, b'\0')
+
+
+def write_tiff(stack, file_path, bigtiff=None, progress=None, background=True):
+    """Write a stack slice by slice as an uncompressed multi-page TIFF.
+
+    Every page is its IFD followed by one strip, so all offsets are known in advance
+    and the file is written front to back. BigTIFF is used when the file would not
+    fit the 4 GB of a classic TIFF (or when `bigtiff` is set).
+    """
+    dtype = saved_dtype(stack.dtype)
+    if len(stack.shape) == 4 and (stack.shape[3] != 3 or dtype != np.uint8):
+        raise ValueError("Only 8-bit RGB color stacks can be saved as TIFF")
+
+    slice_nbytes = int(np.prod(stack.shape[1:])) * dtype.itemsize
+    if bigtiff is None:
+        bigtiff = stack.shape[0] * (slice_nbytes + 512) + 16 >= 2 ** 32
+
+    header = b'II' + (struct.pack('<HHHQ', 43, 8, 0, 16) if bigtiff else struct.pack('<HI', 42, 8))
+    writer = BufferedBlockWriter(file_path, background=background)
+    try:
+        writer.write(header)
+        for index, image in iter_saved_slices(stack, dtype):
+            page_offset = writer.position
+            # IFD 的长度不依赖其中偏移量的值，写入之前就能算出下一页的位置
+            page_size = len(tiff_page(image, bigtiff, page_offset, 0))
+            last = index == stack.shape[0] - 1
+            next_page = 0 if last else page_offset + page_size + image.nbytes + image.nbytes % 2
+            writer.write(tiff_page(image, bigtiff, page_offset, next_page))
+            writer.write(image)
+            if image.nbytes % 2:
+                writer.write(b'\0')
+            if progress is not None and progress(index + 1, stack.shape[0]) is False:
+                break
+    finally:
+        writer.close()
+
+
+class StackSaverThread(QThread):
+    """Save a stack on a worker thread, writing to a temporary file that replaces the target when done.
+
+    A failed or cancelled save leaves the target as it was. The target must not be the
+    file a memory-mapped or virtual stack is read from: the stack still reads from it
+    while saving, and keeps the old file open after it is replaced (see
+    ImageWithRect.reads_from). Saving stops when `requestInterruption()` is called.
+    """
+
+    progress = pyqtSignal(int, int)  # saved slices, total slices
+    saved = pyqtSignal(str)
+    save_failed = pyqtSignal(str)
+
+    def __init__(self, stack, file_path, write_stack):
+        super().__init__()
+        self.stack = stack
+        self.file_path = file_path
+        self.write_stack = write_stack
+
+    def run(self):
+        temp_path = self.file_path + '.saving'
+        try:
+            self.write_stack(self.stack, temp_path, progress=self.on_progress)
+            if self.isInterruptionRequested():
+                os.remove(temp_path)
+                self.save_failed.emit("Saving cancelled")
+                return
+            os.replace(temp_path, self.file_path)
+            self.saved.emit(self.file_path)
+        except Exception as e:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            self.save_failed.emit(str(e))
+
+    def on_progress(self, saved, total):
+        self.progress.emit(saved, total)
+        return not self.isInterruptionRequested()
+
+
+class RecompressThread(QThread):
+    """Run CompressedReader.recompress on a worker thread; stops when `requestInterruption()` is called."""
+
+    progress = pyqtSignal(int, int)  # recompressed bytes, total bytes
+    saved = pyqtSignal(str)
+    save_failed = pyqtSignal(str)
+
+    def __init__(self, reader):
+        super().__init__()
+        self.reader = reader
+
+    def run(self):
+        try:
+            self.reader.recompress(progress=self.on_progress)
+            self.saved.emit(self.reader.file_path)
+        except Exception as e:
+            self.save_failed.emit(str(e))
+
+    def on_progress(self, done, total):
+        self.progress.emit(done, total)
+        return not self.isInterruptionRequested()
@@ -0,0 +1,203 @@
+import os
+import warnings
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+
+CHUNK_SIZE = 4 * 1024 * 1024
+FLOAT_MARKERS = (b'.', b'e', b'E', b'n', b'N', b'i', b'I')  # 小数点、指数、nan、inf
+SEPARATORS = bytes.maketrans(b',;', b'  ')
+MAX_FIXED_DECIMALS = 9  # 小数位数更多时整数部分可能超出 int64
+
+
+def parse_numbers(data, is_float=True):
+    """Parse whitespace separated numbers from bytes into float64 (or int64 if not `is_float`).
+
+    Conversion is done by NumPy's C text parser (np.fromstring), which releases the
+    GIL, so chunks parsed on a thread pool are converted in parallel.
+    """
+    if not is_float:
+        return parse_numbers_fromstring(data, np.int64)
+    values = parse_fixed_point(data)
+    return values if values is not None else parse_numbers_fromstring(data, np.float64)
+
+
+def parse_numbers_fromstring(data, dtype=np.float64):
+    if data.isspace():
+        # fromstring 对只有空白的数据返回 [-1.]
+        return np.empty(0, dtype)
+    with warnings.catch_warnings():
+        # fromstring 遇到不是数字的内容时只给出警告并提前停止，这里改为报错
+        warnings.simplefilter('error', DeprecationWarning)
+        try:
+            return np.fromstring(data, dtype=dtype, sep=' ')
+        except (DeprecationWarning, ValueError):
+            raise ValueError("The file contains values that are not numbers")
+
+
+def parse_fixed_point(data):
+    """Parse numbers written with the same number of decimals ('%.4f' exports) as integers.
+
+    The integer parser of np.fromstring is several times faster than its float parser,
+    so the decimal points are removed and the integers divided by 10**decimals, which
+    gives the same float64 values. Returns None when the numbers are not all written
+    that way (exponents, nan, other numbers of decimals, numbers without a point).
+    """
+    first_dot = data.find(b'.')
+    if first_dot < 0 or any(marker in data for marker in FLOAT_MARKERS[1:]):
+        return None
+    decimals = 0
+    while first_dot + decimals + 1 < len(data) and data[first_dot + decimals + 1] in b'0123456789':
+        decimals += 1
+    if not 0 < decimals <= MAX_FIXED_DECIMALS:
+        return None
+
+    # 每个小数点后面正好是 decimals 位数字，然后是空白或数据的结尾
+    chars = np.frombuffer(data, np.uint8)
+    dots = np.flatnonzero(chars == 46)
+    if dots[-1] + decimals >= chars.size:
+        return None
+    for offset in range(1, decimals + 1):
+        if ((chars[dots + offset] - np.uint8(48)) > 9).any():
+            return None
+    after = dots + decimals + 1
+    if (chars[after[after < chars.size]] > 32).any():
+        return None
+
+    values = parse_numbers_fromstring(data.translate(None, b'.'), np.int64)
+    if values.size != dots.size:
+        # 有的数没有小数点
+        return None
+    return values / 10.0 ** decimals
+
+
+def is_numeric_line(line):
+    try:
+        parse_numbers(line)
+        return True
+    except ValueError:
+        return False
+
+
+def smallest_integer_dtype(image):
+    """Return the smallest of uint8, uint16, int16 and int32 that holds every value, or None."""
+    if image.size == 0:
+        return np.uint8
+    low, high = image.min(), image.max()
+    for dtype in (np.uint8, np.uint16, np.int16, np.int32):
+        info = np.iinfo(dtype)
+        if info.min <= low and high <= info.max:
+            return dtype
+    return None
+
+
+def widened_dtype(dtype, values, is_float):
+    """Return the type that holds both an image of `dtype` (None if there is none yet) and `values`."""
+    if is_float or dtype == np.float32:
+        return np.dtype(np.float32)
+    needed = smallest_integer_dtype(values)
+    if needed is None:
+        return np.dtype(np.float32)
+    return np.dtype(needed) if dtype is None else np.promote_types(dtype, needed)
+
+
+def count_rows(data, width):
+    """Count the lines of a chunk that are not blank, checking that each one holds `width` values."""
+    chars = np.frombuffer(data, np.uint8)
+    filled = chars > 32
+    # 每个值的第一个字符，按所在的行计数
+    value_starts = np.flatnonzero(filled[1:] & ~filled[:-1]) + 1
+    if filled.size and filled[0]:
+        value_starts = np.concatenate(([0], value_starts))
+    values_per_row = np.bincount(np.searchsorted(np.flatnonzero(chars == 10), value_starts))
+    values_per_row = values_per_row[values_per_row > 0]
+    if (values_per_row != width).any():
+        raise ValueError(f"Rows have different lengths, expected {width} values per row")
+    return values_per_row.size
+
+
+def iter_line_chunks(f, chunk_size):
+    """Yield the rest of a file in chunks of about `chunk_size` bytes that end at a line end."""
+    while True:
+        block = f.read(chunk_size)
+        if not block:
+            return
+        if not block.endswith(b'\n'):
+            # 补全最后一行，数据只复制一次
+            block += f.readline()
+        yield block
+
+
+def parse_chunk(data, width):
+    """Parse one chunk of lines of `width` values; returns (values, is_float, rows)."""
+    if b',' in data or b';' in data:
+        data = data.translate(SEPARATORS)
+    is_float = any(marker in data for marker in FLOAT_MARKERS)
+    return parse_numbers(data, is_float), is_float, count_rows(data, width)
+
+
+def read_text_image(file_path, chunk_size=CHUNK_SIZE, workers=None):
+    """Read a text matrix (tab, space, comma or semicolon separated) into a 2D image.
+
+    The file is read in large chunks cut at line ends; the chunks are parsed on a
+    thread pool and copied in order into an array preallocated from the length of
+    the first row, which only grows if that underestimated the number of rows.
+    Integer data gives the smallest integer type that holds it, anything else
+    float32; the array has that type from the start and is only converted when a
+    later chunk needs a wider one. A first line that is not numeric is skipped as a header.
+    """
+    file_size = os.path.getsize(file_path)
+    workers = workers or min(8, os.cpu_count() or 1)
+
+    with open(file_path, 'rb') as f:
+        # 第一行决定列数，并用来估计行数
+        first_line = f.readline()
+        while first_line and not first_line.strip():
+            first_line = f.readline()
+        if first_line and not is_numeric_line(first_line.translate(SEPARATORS)):
+            print(f"Skipping header line: {first_line[:80]!r}")
+            first_line = f.readline()
+            while first_line and not first_line.strip():
+                first_line = f.readline()
+        width = len(first_line.translate(SEPARATORS).split())
+        if width == 0:
+            raise ValueError("The file contains no numbers")
+
+        image = None
+        rows = 0
+
+        def store(values, is_float, chunk_rows):
+            nonlocal image, rows
+            if values.size != chunk_rows * width:
+                raise ValueError("The file contains values that are not numbers")
+            dtype = widened_dtype(None if image is None else image.dtype, values, is_float)
+            if image is None:
+                image = np.empty((max(file_size // len(first_line), 1) + 1, width), dtype)
+            capacity = image.shape[0]
+            if rows + chunk_rows > capacity:
+                capacity = max(capacity * 2, rows + chunk_rows)
+            if capacity != image.shape[0] or dtype != image.dtype:
+                # 行数估计少了，或者这一块需要更宽的类型
+                grown = np.empty((capacity, width), dtype)
+                grown[:rows] = image[:rows]
+                image = grown
+            image[rows:rows + chunk_rows] = values.reshape(chunk_rows, width)
+            rows += chunk_rows
+
+        store(*parse_chunk(first_line, width))
+
+        # 最多同时解析 2*workers 块，结果按文件中的顺序写入
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='text-parser') as executor:
+            pending = deque()
+            for chunk in iter_line_chunks(f, chunk_size):
+                pending.append(executor.submit(parse_chunk, chunk, width))
+                if len(pending) >= 2 * workers:
+                    store(*pending.popleft().result())
+            while pending:
+                store(*pending.popleft().result())
+
+    image = image[:rows]
+    if image.base is not None and image.base.shape[0] > rows * 5 // 4:
+        # 估计的行数过多时释放多余的内存
+        image = image.copy()
+    return image
@@ -0,0 +1,333 @@
+import re
+import zlib
+import numpy as np
+
+from ImageP.imgio.byte_source import FileByteSource
+from ImageP.imgio.index_cache import load_index, save_index
+from ImageP.imgio.virtual_stack import VirtualStack
+
+# TIFF 字段类型：(numpy 类型, 每个值的字节数)，有理数由两个整数组成
+FIELD_TYPES = {1: ('u1', 1), 2: ('u1', 1), 3: ('u2', 2), 4: ('u4', 4), 5: ('u4', 8), 6: ('i1', 1), 7: ('u1', 1),
+               8: ('i2', 2), 9: ('i4', 4), 10: ('i4', 8), 11: ('f4', 4), 12: ('f8', 8), 13: ('u4', 4),
+               16: ('u8', 8), 17: ('i8', 8), 18: ('u8', 8)}
+
+# Tags needed to locate and decode the pixels of a page
+TAGS = {254: 'subfile_type', 256: 'width', 257: 'height', 258: 'bits', 259: 'compression', 262: 'photometric',
+        270: 'description', 273: 'offsets', 277: 'samples', 278: 'rows_per_strip', 279: 'byte_counts',
+        284: 'planar', 317: 'predictor', 322: 'tile_width', 323: 'tile_length', 324: 'offsets',
+        325: 'byte_counts', 339: 'sample_format'}
+
+LAYOUT_DEFAULTS = {'bits': 1, 'compression': 1, 'photometric': 1, 'samples': 1, 'planar': 1, 'predictor': 1,
+                   'sample_format': 1, 'tile_width': 0, 'tile_length': 0}
+
+COMPRESSION_NONE, COMPRESSION_LZW, COMPRESSION_PACKBITS = 1, 5, 32773
+COMPRESSION_DEFLATE = (8, 32946)
+
+
+def read_ifd(source, offset, byte_order, bigtiff, with_description=False):
+    """Read the IFD at `offset` and return (tags, offset of the next IFD)."""
+    count_type, entry_size, pointer_type = ('u8', 20, 'u8') if bigtiff else ('u2', 12, 'u4')
+    count_size, pointer_size = (8, 8) if bigtiff else (2, 4)
+
+    count = int(np.frombuffer(source.read_at(offset, count_size), byte_order + count_type)[0])
+    entry_dtype = np.dtype([('tag', 'u2'), ('type', 'u2'), ('count', pointer_type),
+                            ('value', f'V{pointer_size}')]).newbyteorder(byte_order)
+    block = source.read_at(offset + count_size, count * entry_size + pointer_size)
+    entries = np.frombuffer(block, entry_dtype, count=count)
+    next_offset = int(np.frombuffer(block, byte_order + pointer_type, count=1, offset=count * entry_size)[0])
+
+    tags = {}
+    # 一次解析整个 IFD 的条目，只解码需要的标签
+    for tag, field_type, value_count, value in entries.tolist():
+        name = TAGS.get(tag)
+        if name is None or field_type not in FIELD_TYPES or (name == 'description' and not with_description):
+            continue
+        dtype, size = FIELD_TYPES[field_type]
+        nbytes = value_count * size
+        data = value if nbytes <= pointer_size else \
+            source.read_at(int(np.frombuffer(value, byte_order + pointer_type)[0]), nbytes)
+        if name == 'description':
+            tags[name] = bytes(data[:nbytes]).split(b'\0', 1)[0].decode('latin-1')
+            continue
+        values = np.frombuffer(data, byte_order + dtype, count=value_count * (size // np.dtype(dtype).itemsize))
+        tags[name] = values.tolist()
+    return tags, next_offset
+
+
+def read_tiff_header(source):
+    """Return (byte order, BigTIFF flag, offset of the first IFD)."""
+    header = bytes(source.read_at(0, 16))
+    if header[:2] == b'II':
+        byte_order = '<'
+    elif header[:2] == b'MM':
+        byte_order = '>'
+    else:
+        raise ValueError("Not a TIFF file")
+
+    version = int(np.frombuffer(header, byte_order + 'u2', count=1, offset=2)[0])
+    if version == 42:
+        return byte_order, False, int(np.frombuffer(header, byte_order + 'u4', count=1, offset=4)[0])
+    if version == 43:
+        return byte_order, True, int(np.frombuffer(header, byte_order + 'u8', count=1, offset=8)[0])
+    raise ValueError(f"Unknown TIFF version {version}")
+
+
+def read_tiff_index(source):
+    """Walk the IFD chain once and return the page offset table of the file.
+
+    The table is JSON serializable: pages share a small list of layouts (size, sample
+    type, compression ...) and each page only keeps its layout number and the offsets
+    and byte counts of its strips or tiles. Reduced-resolution pages (thumbnails) and
+    pages of another size than the first one are left out.
+    """
+    byte_order, bigtiff, offset = read_tiff_header(source)
+
+    layouts = []
+    pages = []
+    visited = set()
+    description = None
+    while offset and offset not in visited:
+        visited.add(offset)
+        tags, offset = read_ifd(source, offset, byte_order, bigtiff, with_description=not pages)
+        if not pages:
+            description = tags.get('description')
+        if tags.get('subfile_type', [0])[0] & 1 or 'offsets' not in tags:
+            continue
+
+        layout = dict(LAYOUT_DEFAULTS)
+        for name in ('width', 'height', 'bits', 'compression', 'photometric', 'samples', 'planar', 'predictor',
+                     'sample_format', 'tile_width', 'tile_length'):
+            if name in tags:
+                layout[name] = tags[name][0]
+        layout['rows_per_strip'] = min(tags.get('rows_per_strip', [layout['height']])[0], layout['height'])
+
+        if layouts and (layout['width'], layout['height']) != (layouts[0]['width'], layouts[0]['height']):
+            print(f"Skipping TIFF page {len(visited)}: size differs from the first page")
+            continue
+        if layout not in layouts:
+            layouts.append(layout)
+        pages.append([layouts.index(layout), tags['offsets'], tags['byte_counts']])
+
+    if not pages:
+        raise ValueError("The TIFF file contains no images")
+
+    pages = expand_imagej_pages(pages, layouts, description)
+    return {'byte_order': byte_order, 'layouts': layouts, 'pages': pages}
+
+
+def expand_imagej_pages(pages, layouts, description):
+    """ImageJ writes stacks larger than 4 GB with only the first IFD; the other images follow contiguously."""
+    description = description or ''
+    match = re.search(r'images=(\d+)', description)
+    if len(pages) != 1 or not description.startswith('ImageJ=') or not match:
+        return pages
+
+    layout_index, offsets, byte_counts = pages[0]
+    contiguous = all(offsets[i] + byte_counts[i] == offsets[i + 1] for i in range(len(offsets) - 1))
+    if layouts[layout_index]['compression'] != COMPRESSION_NONE or not contiguous:
+        return pages
+
+    page_nbytes = sum(byte_counts)
+    return [[layout_index, [offset + i * page_nbytes for offset in offsets], byte_counts]
+            for i in range(int(match.group(1)))]
+
+
+def sample_dtype(layout, byte_order):
+    """Return the dtype of one sample of a page layout, in the byte order of the file."""
+    bits = layout['bits']
+    if bits == 1:
+        return np.dtype(np.uint8)
+    kind = {1: 'u', 2: 'i', 3: 'f'}.get(layout['sample_format'], 'u')
+    if bits not in (8, 16, 32, 64) or (kind == 'f' and bits < 32):
+        raise ValueError(f"Unsupported TIFF sample type: {bits}-bit format {layout['sample_format']}")
+    return np.dtype(f'{byte_order}{kind}{bits // 8}')
+
+
+def page_shape(layout):
+    """Return the shape of a decoded page, (height, width) or (height, width, 3) for color."""
+    if layout['samples'] >= 3:
+        return layout['height'], layout['width'], 3
+    return layout['height'], layout['width']
+
+
+def packbits_decode(data):
+    data = bytes(data)
+    out = bytearray()
+    i = 0
+    while i < len(data):
+        header = data[i]
+        i += 1
+        if header < 128:
+            out += data[i:i + header + 1]
+            i += header + 1
+        elif header > 128:
+            out += data[i:i + 1] * (257 - header)
+            i += 1
+    return bytes(out)
+
+
+def lzw_decode(data):
+    """Decode TIFF flavoured LZW (MSB first codes of 9 to 12 bits, early change)."""
+    data = bytes(data) + b'\0\0\0'
+    nbits = (len(data) - 3) * 8
+    out = bytearray()
+    table = [bytes([i]) for i in range(256)] + [b'', b'']
+    code_len = 9
+    position = 0
+    previous = None
+    while position + code_len <= nbits:
+        i = position >> 3
+        code = (int.from_bytes(data[i:i + 3], 'big') >> (24 - (position & 7) - code_len)) & ((1 << code_len) - 1)
+        position += code_len
+
+        if code == 256:  # clear
+            del table[258:]
+            code_len = 9
+            previous = None
+            continue
+        if code == 257:  # end of information
+            break
+
+        if previous is None:
+            entry = table[code]
+        elif code < len(table):
+            entry = table[code]
+            table.append(previous + entry[:1])
+        else:
+            entry = previous + previous[:1]
+            table.append(entry)
+        out += entry
+        previous = entry
+
+        size = len(table)
+        code_len = 9 if size < 511 else 10 if size < 1023 else 11 if size < 2047 else 12
+    return bytes(out)
+
+
+def decompress_block(data, compression):
+    if compression == COMPRESSION_NONE:
+        return data
+    if compression in COMPRESSION_DEFLATE:
+        return zlib.decompress(bytes(data))
+    if compression == COMPRESSION_PACKBITS:
+        return packbits_decode(data)
+    if compression == COMPRESSION_LZW:
+        return lzw_decode(data)
+    raise ValueError(f"Unsupported TIFF compression: {compression}")
+
+
+def decode_block(data, layout, dtype, rows, columns, samples):
+    """Decode one strip or tile into a (rows, columns, samples) array."""
+    data = decompress_block(data, layout['compression'])
+
+    if layout['bits'] == 1:
+        row_bytes = (columns + 7) // 8
+        packed = np.frombuffer(data, np.uint8, count=rows * row_bytes).reshape(rows, row_bytes)
+        bits = np.unpackbits(packed, axis=1, count=columns)
+        if layout['photometric'] == 0:  # WhiteIsZero
+            bits ^= 1
+        return (bits * 255)[..., np.newaxis]
+
+    count = rows * columns * samples
+    if layout['predictor'] == 3:
+        # 浮点预测：每行的字节先做了差分，并按字节平面（高位在前）重新排列
+        raw = np.frombuffer(data, np.uint8, count=count * dtype.itemsize).reshape(rows, -1)
+        raw = np.cumsum(raw, axis=1, dtype=np.uint8).reshape(rows, dtype.itemsize, columns * samples)
+        block = np.ascontiguousarray(raw.transpose(0, 2, 1)).view(dtype.newbyteorder('>'))
+        return block.reshape(rows, columns, samples)
+
+    block = np.frombuffer(data, dtype, count=count).reshape(rows, columns, samples)
+    if layout['predictor'] == 2:
+        # 水平差分：沿每一行累加（整数溢出回绕正是需要的结果）
+        native = block.dtype.newbyteorder('=')
+        block = np.cumsum(block.astype(native), axis=1, dtype=native)
+    return block
+
+
+def read_tiff_page(source, layout, offsets, byte_counts, byte_order):
+    """Read one page with only the strips or tiles that belong to it."""
+    dtype = sample_dtype(layout, byte_order)
+    height, width = layout['height'], layout['width']
+    samples = layout['samples']
+    planes = samples if layout['planar'] == 2 else 1
+    block_samples = 1 if planes > 1 else samples
+
+    contiguous = all(offsets[i] + byte_counts[i] == offsets[i + 1] for i in range(len(offsets) - 1))
+    if layout['compression'] == COMPRESSION_NONE and planes == 1 and not layout['tile_width'] \
+            and layout['bits'] != 1 and contiguous:
+        # 未压缩、连续存储的页直接映射，不复制数据
+        size = height * width * samples
+        data = source.read_at(offsets[0], size * dtype.itemsize)
+        count = len(data) // dtype.itemsize
+        if count == size:
+            image = np.frombuffer(data, dtype)
+        else:
+            # 文件被截断时缺少的部分保持为0
+            image = np.zeros(size, dtype)
+            image[:count] = np.frombuffer(data, dtype, count=count)
+        return select_channels(image.reshape(height, width, samples))
+
+    out_dtype = np.dtype(np.uint8) if layout['bits'] == 1 else dtype
+    image = np.zeros((height, width, samples), out_dtype)
+    if layout['tile_width']:
+        tile_width, tile_length = layout['tile_width'], layout['tile_length']
+        tiles_across = -(-width // tile_width)
+        tiles_per_plane = tiles_across * -(-height // tile_length)
+        for index, (offset, nbytes) in enumerate(zip(offsets, byte_counts)):
+            plane, tile = divmod(index, tiles_per_plane)
+            y, x = divmod(tile, tiles_across)
+            y, x = y * tile_length, x * tile_width
+            block = decode_block(source.read_at(offset, nbytes), layout, dtype, tile_length, tile_width, block_samples)
+            rows, columns = min(tile_length, height - y), min(tile_width, width - x)
+            image[y:y + rows, x:x + columns, plane:plane + block_samples] = block[:rows, :columns]
+    else:
+        rows_per_strip = layout['rows_per_strip']
+        strips_per_plane = -(-height // rows_per_strip)
+        for index, (offset, nbytes) in enumerate(zip(offsets, byte_counts)):
+            plane, strip = divmod(index, strips_per_plane)
+            y = strip * rows_per_strip
+            rows = min(rows_per_strip, height - y)
+            block = decode_block(source.read_at(offset, nbytes), layout, dtype, rows, width, block_samples)
+            image[y:y + rows, :, plane:plane + block_samples] = block
+    return select_channels(image)
+
+
+def select_channels(image):
+    """Keep gray as (y, x) and color as RGB (y, x, 3), dropping alpha and extra samples."""
+    return image[..., 0] if image.shape[2] < 3 else image[..., :3]
+
+
+class TiffVirtualStack(VirtualStack):
+    """Virtual stack over the pages of a TIFF file, each slice read from just its own strips or tiles."""
+
+    def __init__(self, source, index, cache=None):
+        self.source = source
+        self.byte_order = index['byte_order']
+        self.layouts = index['layouts']
+        self.pages = index['pages']
+        first = self.layouts[self.pages[0][0]]
+        dtype = np.dtype(np.uint8) if first['bits'] == 1 else sample_dtype(first, self.byte_order)
+        super().__init__((len(self.pages),) + page_shape(first), dtype, cache)
+        self.cheap_reads = isinstance(source, FileByteSource) \
+            and all(layout['compression'] == COMPRESSION_NONE for layout in self.layouts)
+
+    def read_slice(self, index):
+        layout_index, offsets, byte_counts = self.pages[index]
+        return read_tiff_page(self.source, self.layouts[layout_index], offsets, byte_counts, self.byte_order)
+
+    def close(self):
+        self.source.close()
+
+
+def open_tiff_stack(file_path, cache=None):
+    """Open a TIFF (classic or BigTIFF) as a virtual stack.
+
+    The IFD chain is parsed only the first time; the page offset table is saved in
+    the index cache and reused as long as the file does not change.
+    """
+    source = FileByteSource(file_path)
+    index = load_index(file_path, 'tiff')
+    if index is None:
+        index = read_tiff_index(source)
+        save_index(file_path, 'tiff', index)
+    return TiffVirtualStack(source, index, cache)
@@ -0,0 +1,201 @@
+import bisect
+import struct
+import threading
+import cv2
+import numpy as np
+
+from ImageP.imgio.index_cache import load_index, save_index
+from ImageP.imgio.virtual_stack import VirtualStack
+
+AVIIF_KEYFRAME = 0x10
+MAX_FORWARD_GRAB = 32  # 不知道关键帧位置时，向前最多逐帧跳过这么多帧，更远时直接定位
+
+
+def iter_chunks(f, start, end):
+    """Yield (fourcc, data offset, size, list type) of the RIFF chunks between `start` and `end`."""
+    position = start
+    while position + 8 <= end:
+        f.seek(position)
+        header = f.read(12)
+        if len(header) < 8:
+            return
+        fourcc, size = header[:4], struct.unpack('<I', header[4:8])[0]
+        list_type = header[8:12] if fourcc in (b'RIFF', b'LIST') else None
+        yield fourcc, position + 8, size, list_type
+        position += 8 + size + (size & 1)
+
+
+def read_avi_keyframes(file_path):
+    """Return (frame count, keyframe indices) of the first video stream of an AVI from its index.
+
+    Uses the OpenDML super index ('indx' / 'ix##', files over 1 GB) when present,
+    otherwise the legacy 'idx1' index. Returns None when the file has neither.
+    """
+    with open(file_path, 'rb') as f:
+        f.seek(0, 2)
+        file_size = f.tell()
+        riffs = [chunk for chunk in iter_chunks(f, 0, file_size) if chunk[0] == b'RIFF']
+        if not riffs or riffs[0][3] != b'AVI ':
+            return None
+
+        _, start, size, _ = riffs[0]
+        stream, super_index, idx1 = None, None, None
+        for fourcc, data, chunk_size, list_type in iter_chunks(f, start + 4, start + size):
+            if list_type == b'hdrl':
+                stream, super_index = find_video_stream(f, data + 4, data + chunk_size)
+            elif fourcc == b'idx1':
+                idx1 = (data, chunk_size)
+        if stream is None:
+            return None
+
+        if super_index is not None:
+            flags = read_odml_index(f, super_index)
+        elif idx1 is not None:
+            f.seek(idx1[0])
+            entries = np.frombuffer(f.read(idx1[1] // 16 * 16), dtype=[('id', 'S4'), ('flags', '<u4'),
+                                                                         ('offset', '<u4'), ('size', '<u4')])
+            prefix = f'{stream:02d}'.encode()
+            video = entries[(entries['id'] == prefix + b'dc') | (entries['id'] == prefix + b'db')]
+            flags = (video['flags'] & AVIIF_KEYFRAME) != 0
+        else:
+            return None
+
+    return len(flags), np.flatnonzero(flags).tolist()
+
+
+def find_video_stream(f, start, end):
+    """Return (stream number, offset of its 'indx' chunk or None) of the first video stream in 'hdrl'."""
+    stream = 0
+    for fourcc, data, size, list_type in iter_chunks(f, start, end):
+        if list_type != b'strl':
+            continue
+        is_video, index = False, None
+        for sub_fourcc, sub_data, sub_size, _ in iter_chunks(f, data + 4, data + size):
+            if sub_fourcc == b'strh':
+                f.seek(sub_data)
+                is_video = f.read(4) == b'vids'
+            elif sub_fourcc == b'indx':
+                index = sub_data
+        if is_video:
+            return stream, index
+        stream += 1
+    return None, None
+
+
+def read_odml_index(f, super_index):
+    """Read the keyframe flags of all frames from an OpenDML super index and its 'ix##' chunks."""
+    f.seek(super_index)
+    entries_in_use = struct.unpack('<HBBI', f.read(8))[3]
+    f.seek(super_index + 24)
+    entries = np.frombuffer(f.read(entries_in_use * 16), dtype=[('offset', '<u8'), ('size', '<u4'),
+                                                                ('duration', '<u4')])
+    flags = []
+    for offset in entries['offset'].tolist():
+        # 每个标准索引块：块头 8 字节 + 索引头 24 字节，之后每帧 (偏移, 大小)，大小的最高位为 1 表示不是关键帧
+        f.seek(offset + 8)
+        count = struct.unpack('<HBBI', f.read(8))[3]
+        f.seek(offset + 8 + 24)
+        sizes = np.frombuffer(f.read(count * 8), dtype='<u4')[1::2]
+        flags.append((sizes & 0x80000000) == 0)
+    return np.concatenate(flags) if flags else np.zeros(0, dtype=bool)
+
+
+def read_video_index(file_path):
+    """Return the saved {frame count, keyframes} of a video, building it on first open.
+
+    AVI files get exact keyframes from their index; for other containers the frame
+    count reported by OpenCV is used and keyframes are unknown (None).
+    """
+    index = load_index(file_path, 'video')
+    if index is not None:
+        return index
+
+    result = None
+    try:
+        result = read_avi_keyframes(file_path)
+    except (OSError, struct.error, ValueError) as e:
+        print(f"Could not read the AVI index of {file_path}: {e}")
+
+    if result is not None:
+        index = {'frames': result[0], 'keyframes': result[1]}
+    else:
+        capture = cv2.VideoCapture(file_path)
+        index = {'frames': int(capture.get(cv2.CAP_PROP_FRAME_COUNT)), 'keyframes': None}
+        capture.release()
+    save_index(file_path, 'video', index)
+    return index
+
+
+class VideoStack(VirtualStack):
+    """Virtual stack over the frames of a video, decoded with cv2.VideoCapture when they are used.
+
+    Frames read in order come straight from the decoder; for a jump the decoder either
+    decodes forward or seeks, whichever decodes fewer frames given the keyframe index.
+    """
+
+    cheap_reads = False
+
+    def __init__(self, file_path, index, first_frame=0, last_frame=None, grayscale=False, cache=None):
+        self.capture = cv2.VideoCapture(file_path)
+        if not self.capture.isOpened():
+            raise ValueError(f"Cannot open video {file_path}")
+
+        self.file_path = file_path
+        self.grayscale = grayscale
+        self.keyframes = index['keyframes']
+        self.first_frame = first_frame
+        frames = index['frames']
+        last_frame = frames - 1 if last_frame is None else min(last_frame, frames - 1)
+        self._lock = threading.Lock()
+        self.position = 0  # 解码器下一次读取的帧
+
+        first = self.decode_frame(first_frame)
+        if first is None:
+            raise ValueError(f"Cannot decode frame {first_frame} of {file_path}")
+        super().__init__((max(last_frame - first_frame + 1, 1),) + first.shape, first.dtype, cache)
+        first.flags.writeable = False
+        self.cache.put(0, first)
+
+    def read_slice(self, index):
+        image = self.decode_frame(self.first_frame + index)
+        if image is None:
+            # 帧数只是估计值时，末尾的帧可能读不到
+            return np.zeros(self.shape[1:], self.dtype)
+        return image
+
+    def decode_frame(self, frame):
+        with self._lock:
+            if frame != self.position:
+                if self.position < frame and self.decode_forward_is_cheaper(frame):
+                    while self.position < frame and self.capture.grab():
+                        self.position += 1
+                    if self.position < frame:
+                        return None
+                else:
+                    self.capture.set(cv2.CAP_PROP_POS_FRAMES, frame)
+                    self.position = frame
+            ok, image = self.capture.read()
+            if not ok:
+                return None
+            self.position += 1
+
+        if image.ndim == 2:
+            return image
+        code = cv2.COLOR_BGR2GRAY if self.grayscale else cv2.COLOR_BGR2RGB
+        return cv2.cvtColor(image, code)
+
+    def decode_forward_is_cheaper(self, frame):
+        if self.keyframes is None:
+            return frame - self.position <= MAX_FORWARD_GRAB
+        # 定位会从 frame 之前最近的关键帧开始解码；这个关键帧不在当前位置之后时，继续向前解码更省
+        keyframe = self.keyframes[max(bisect.bisect_right(self.keyframes, frame) - 1, 0)] if self.keyframes else 0
+        return keyframe <= self.position
+
+    def close(self):
+        with self._lock:
+            self.capture.release()
+
+
+def open_video_stack(file_path, first_frame=0, last_frame=None, grayscale=False, cache=None):
+    """Open a video (AVI, MP4 ...) as a virtual stack of its frames."""
+    return VideoStack(file_path, read_video_index(file_path), first_frame, last_frame, grayscale, cache)
@@ -0,0 +1,171 @@
+import os
+import numpy as np
+
+from ImageP.utils.slice_cache import SliceCache
+from ImageP.imgio.pixel_formats import decode_slice, decoded_dtype, decoded_shape, slice_nbytes
+
+
+class VirtualStack:
+    """Array-like (z, y, x) stack whose slices are read on demand and kept in an LRU cache.
+
+    Subclasses only implement `read_slice`. Indexing works like a NumPy array for
+    the cases the viewer needs (stack[z], stack[z, i, j], stack[:, y, :] ...).
+    Slices written through `stack[z] = ...` are kept in memory and shadow the data on disk.
+    `cheap_reads` is False for stacks whose slices are downloaded, decompressed or decoded
+    from a video; those are not scanned slice by slice in the background.
+    """
+
+    cheap_reads = True
+
+    def __init__(self, shape, dtype, cache=None):
+        self.shape = tuple(shape)
+        self.dtype = np.dtype(dtype)
+        self.cache = cache if cache is not None else SliceCache()
+        self.modified = {}  # 被修改过的图层，优先于磁盘上的数据
+
+    @property
+    def ndim(self):
+        return len(self.shape)
+
+    @property
+    def size(self):
+        return int(np.prod(self.shape))
+
+    @property
+    def nbytes(self):
+        return self.size * self.dtype.itemsize
+
+    def __len__(self):
+        return self.shape[0]
+
+    def read_slice(self, index):
+        """Read one slice from the backing storage."""
+        raise NotImplementedError
+
+    def close(self):
+        """Release the files or decoder the slices are read from; nothing can be read afterwards."""
+        pass
+
+    def get_slice(self, index):
+        """Return slice `index`, from memory if it is modified or cached, otherwise from disk."""
+        index = self._normalize_index(index)
+        if index in self.modified:
+            return self.modified[index]
+
+        image = self.cache.get(index)
+        if image is None:
+            image = self.read_slice(index)
+            image.flags.writeable = False  # 缓存中的切片是共享的，不能被原地修改
+            self.cache.put(index, image)
+        return image
+
+    def __getitem__(self, key):
+        if not isinstance(key, tuple):
+            key = (key,)
+        layer_key, rest = key[0], key[1:]
+
+        if isinstance(layer_key, (int, np.integer)):
+            return self.get_slice(layer_key)[rest]
+
+        layers = np.arange(self.shape[0])[layer_key]
+        return np.stack([self.get_slice(layer)[rest] for layer in layers])
+
+    def __setitem__(self, key, value):
+        if not isinstance(key, tuple):
+            key = (key,)
+        layer_key, rest = key[0], key[1:]
+
+        if not isinstance(layer_key, (int, np.integer)):
+            for layer in np.arange(self.shape[0])[layer_key]:
+                self[(int(layer),) + rest] = value
+            return
+
+        layer_key = self._normalize_index(layer_key)
+        image = np.array(self.get_slice(layer_key))
+        image[rest] = value
+        self.modified[layer_key] = image
+        self.cache.discard(layer_key)
+
+    def __array__(self, dtype=None, copy=None):
+        image = self[:]
+        return image if dtype is None else image.astype(dtype)
+
+    def _normalize_index(self, index):
+        index = int(index)
+        if index < 0:
+            index += self.shape[0]
+        if not 0 <= index < self.shape[0]:
+            raise IndexError(f"Slice index {index} out of range for stack of {self.shape[0]} slices")
+        return index
+
+
+class RawVirtualStack(VirtualStack):
+    """Virtual stack over a raw file laid out as `offset` + slices separated by `gap` bytes.
+
+    The bytes are read from the file itself, or through `reader` (any object with
+    `read_at(offset, size)`, e.g. a CompressedReader or HttpByteSource) when the file
+    is not plain raw data on a local disk.
+    """
+
+    def __init__(self, file_path, shape, image_type, little_endian=False, offset=0, gap=0, cache=None, reader=None):
+        layers, height, width = shape
+        super().__init__((layers,) + decoded_shape(image_type, height, width),
+                         decoded_dtype(image_type, little_endian), cache)
+        self.file_path = file_path
+        self.image_type = image_type
+        self.little_endian = little_endian
+        self.width = width
+        self.height = height
+        self.offset = offset
+        self.gap = gap
+        self.slice_nbytes = slice_nbytes(image_type, width, height)
+        self.reader = reader
+        self.file_size = os.path.getsize(file_path) if reader is None else None
+        self.cheap_reads = reader is None
+
+    def read_slice(self, index):
+        position = self.offset + index * (self.slice_nbytes + self.gap)
+
+        buffer = np.zeros(self.slice_nbytes, dtype=np.uint8)
+        if self.reader is not None:
+            data = np.frombuffer(self.reader.read_at(position, self.slice_nbytes), dtype=np.uint8)
+            buffer[:data.size] = data
+        elif position < self.file_size:
+            # 文件末尾的切片可能不完整，不足的部分保持为0
+            data = np.fromfile(self.file_path, dtype=np.uint8, count=self.slice_nbytes, offset=position)
+            buffer[:data.size] = data
+        return decode_slice(buffer, self.image_type, self.width, self.height, self.little_endian)
+
+    def close(self):
+        if self.reader is not None:
+            self.reader.close()
+
+
+class DecodedRawStack(VirtualStack):
+    """Stack decoding each slice on access from a (z, slice_nbytes) byte array, e.g. a memory mapping."""
+
+    def __init__(self, raw, image_type, width, height, little_endian=False, cache=None):
+        super().__init__((raw.shape[0],) + decoded_shape(image_type, height, width),
+                         decoded_dtype(image_type, little_endian), cache)
+        self.raw = raw
+        self.image_type = image_type
+        self.little_endian = little_endian
+        self.width = width
+        self.height = height
+
+    def read_slice(self, index):
+        return decode_slice(self.raw[index], self.image_type, self.width, self.height, self.little_endian)
+
+
+def is_memory_mapped(image):
+    """Check whether an array (or a view of one) is backed by a file mapping."""
+    while image is not None:
+        if isinstance(image, np.memmap):
+            return True
+        image = getattr(image, 'base', None)
+    return False
+
+
+def is_disk_backed(image):
+    """Check whether the stack reads its data from disk lazily (memory-mapped or virtual)."""
+    return isinstance(image, VirtualStack) or is_memory_mapped(image)
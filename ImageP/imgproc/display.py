@@ -0,0 +1,30 @@
+import numpy as np
+
+
+def display_levels(image):
+    """Return the (min, max) display levels of an image: 0-255 for 8-bit, else its finite range."""
+    if image.dtype == np.uint8:
+        return 0.0, 255.0
+    finite = image[np.isfinite(image)] if image.dtype.kind == 'f' else image
+    if finite.size == 0:
+        return 0.0, 1.0
+    low, high = float(finite.min()), float(finite.max())
+    return (low, high) if high > low else (low, low + 1.0)
+
+
+def render_8bit(image, levels):
+    """Scale an image to 8 bits for display: `levels` map to 0 and 255, values outside are clipped.
+
+    8-bit images shown with levels (0, 255) are returned as they are. NaN is shown as 0.
+    """
+    low, high = levels
+    if image.dtype == np.uint8 and (low, high) == (0, 255):
+        return image
+    scale = 255.0 / (high - low) if high != low else 1.0
+    scaled = np.subtract(image, low, dtype=np.float32)
+    scaled *= scale
+    np.clip(scaled, 0, 255, out=scaled)
+    rendered = np.empty(image.shape, np.uint8)
+    # NaN 转换为整数的结果不确定，先替换为 0
+    np.copyto(rendered, np.nan_to_num(scaled, copy=False), casting='unsafe')
+    return rendered
@@ -0,0 +1,190 @@
+import time
+import numpy as np
+from PyQt5.QtCore import QThread, pyqtSignal
+
+from ImageP.imgio.pixel_formats import to_native_byte_order
+from ImageP.imgio.virtual_stack import VirtualStack
+from ImageP.utils.slice_cache import SliceCache
+
+PLOT_BINS = 256  # 直方图面板显示的柱数
+FLOAT_BINS = 4096  # 浮点图像统计时的柱数，显示时再合并
+UPDATE_INTERVAL = 0.25  # 扫描时刷新直方图面板的最短间隔（秒）
+
+# 扫描完成的整栈直方图，按图像缓存
+histogram_cache = SliceCache(64 * 1024 * 1024)
+
+
+class StackHistogram:
+    """Histogram of a whole stack, accumulated one slice at a time.
+
+    8 and 16-bit integer images are counted exactly with np.bincount over every
+    possible value. Floats and wider integers are counted in FLOAT_BINS fixed-width
+    bins starting from `value_range`; when a slice has values outside the range, the
+    range is doubled (merging neighbouring bins) until it covers them. NaN and Inf
+    are not counted.
+    """
+
+    def __init__(self, dtype, value_range=None):
+        dtype = np.dtype(dtype)
+        if dtype == np.bool_:
+            dtype = np.dtype(np.uint8)
+        self.dtype = dtype
+        self.exact = dtype.kind in 'ui' and dtype.itemsize <= 2
+        if self.exact:
+            # 有符号整数按无符号的位模式计数，values 给出每个计数对应的值
+            bits = np.arange(2 ** (8 * dtype.itemsize)).astype(f'u{dtype.itemsize}')
+            self.values = bits.view(dtype.newbyteorder('=')).astype(np.float64)
+        else:
+            low, high = value_range if value_range is not None else (0.0, 1.0)
+            if not high > low:
+                high = low + 1.0
+            self.low, self.high = float(low), float(high)
+            self.update_values()
+        self.counts = np.zeros(len(self.values), np.int64)
+        self.slices = 0
+
+    def update_values(self):
+        self.scale = FLOAT_BINS / (self.high - self.low)
+        self.values = self.low + (np.arange(FLOAT_BINS) + 0.5) / self.scale
+
+    def grow(self, low, high):
+        """Double the range until it covers [low, high], merging every two bins into one."""
+        while low < self.low or high > self.high:
+            merged = self.counts.reshape(-1, 2).sum(axis=1)
+            width = self.high - self.low
+            if high > self.high:
+                self.counts = np.concatenate([merged, np.zeros_like(merged)])
+                self.high += width
+            else:
+                self.counts = np.concatenate([np.zeros_like(merged), merged])
+                self.low -= width
+        self.update_values()
+
+    @property
+    def nbytes(self):
+        return self.counts.nbytes + self.values.nbytes
+
+    def add(self, image):
+        """Add the pixels of one slice."""
+        image = np.ascontiguousarray(to_native_byte_order(np.asarray(image)))
+        if self.exact:
+            if image.dtype == np.bool_:
+                image = image.view(np.uint8)
+            bits = image.view(f'u{image.dtype.itemsize}').ravel()
+            self.counts += np.bincount(bits, minlength=len(self.counts))
+        else:
+            values = image.ravel()
+            if values.dtype.kind == 'f':
+                values = values[np.isfinite(values)]
+            if values.size:
+                self.grow(float(values.min()), float(values.max()))
+            bins = (values - self.low) * self.scale
+            np.clip(bins, 0, FLOAT_BINS - 1, out=bins)
+            self.counts += np.bincount(bins.astype(np.intp), minlength=FLOAT_BINS)
+        self.slices += 1
+
+    def plot_data(self, bins=PLOT_BINS):
+        """Return (x, counts) for the histogram panel, over the range of the values counted so far."""
+        present = np.flatnonzero(self.counts)
+        if present.size == 0:
+            return np.zeros(1), np.zeros(1)
+        low, high = self.values[present].min(), self.values[present].max()
+        if self.exact and high - low < bins:
+            # 值较少的整数图像每个值一柱
+            bins, high = int(high - low) + 1, high + 1
+        elif high <= low:
+            high = low + 1
+        counts, edges = np.histogram(self.values, bins=bins, range=(low, high), weights=self.counts)
+        return edges[:-1], counts.astype(np.float32)
+
+
+def histogram_of(image, value_range=None):
+    """Histogram of a single image (a 2D image or one slice)."""
+    histogram = StackHistogram(image.dtype, value_range)
+    histogram.add(image)
+    return histogram
+
+
+def scan_order(count):
+    """Return the slice indices from coarse to fine: every 2**k-th slice first, halving the step."""
+    step = 1
+    while step * 2 <= count:
+        step *= 2
+    order, seen = [], np.zeros(count, bool)
+    while step >= 1:
+        for index in range(0, count, step):
+            if not seen[index]:
+                seen[index] = True
+                order.append(index)
+        step //= 2
+    return order
+
+
+def read_slice_uncached(stack, index):
+    # 扫描时绕过虚拟栈的切片缓存，不把浏览时缓存的切片挤出去
+    if isinstance(stack, VirtualStack):
+        if index in stack.modified:
+            return stack.modified[index]
+        cached = stack.cache.get(index)
+        return cached if cached is not None else stack.read_slice(index)
+    return stack[index]
+
+
+def cached_slice(stack, index):
+    # 只用已在内存中的切片，没有时返回 None
+    if index in stack.modified:
+        return stack.modified[index]
+    return stack.cache.get(index)
+
+
+class StackHistogramThread(QThread):
+    """Compute the histogram of a whole stack on a worker thread.
+
+    Slices are scanned from coarse to fine (scan_order), so the histogram is
+    representative early and refines as more slices are added. `updated` carries
+    the plot data at most every UPDATE_INTERVAL seconds and once at the end, when
+    the complete histogram is also stored in histogram_cache under `key`.
+
+    Stacks without `cheap_reads` (remote, compressed, video) are not read at all:
+    only the slices already in memory are counted (`cached_only`), and that partial
+    histogram is not stored in the cache.
+    """
+
+    updated = pyqtSignal(object, object, int, int)  # x, counts, scanned slices, slices to scan
+
+    def __init__(self, stack, key, value_range=None):
+        super().__init__()
+        self.stack = stack
+        self.key = key
+        self.value_range = value_range
+        self.cached_only = isinstance(stack, VirtualStack) and not stack.cheap_reads
+
+    def run(self):
+        histogram = StackHistogram(self.stack.dtype, self.value_range)
+        order = scan_order(self.stack.shape[0])
+        if self.cached_only:
+            order = [index for index in order if index in self.stack.modified or index in self.stack.cache]
+        total = len(order)
+        last_update = time.monotonic()
+        try:
+            for index in order:
+                if self.isInterruptionRequested():
+                    return
+                image = cached_slice(self.stack, index) if self.cached_only \
+                    else read_slice_uncached(self.stack, index)
+                if image is None:  # 扫描期间被挤出了缓存
+                    total -= 1
+                    continue
+                histogram.add(image)
+                if histogram.slices < total and time.monotonic() - last_update >= UPDATE_INTERVAL:
+                    last_update = time.monotonic()
+                    self.updated.emit(*histogram.plot_data(), histogram.slices, total)
+        except Exception as e:
+            print(f"Error while computing the stack histogram: {e}")
+            return
+
+        if histogram.slices == 0:
+            return
+        if not self.cached_only:
+            histogram_cache.put(self.key, histogram)
+        self.updated.emit(*histogram.plot_data(), histogram.slices, total)
@@ -0,0 +1,39 @@
+import numpy as np
+from pyqtgraph.Qt import QtGui
+
+ROTATIONS = (0, 90, 180, 270)  # 顺时针旋转的角度
+
+
+def default_orientation():
+    """The image upright as stored: row 0 at the top, column 0 on the left."""
+    return {'rotate': 0, 'flip_horizontal': False, 'flip_vertical': False}
+
+
+def orientation_matrix(shape, orientation, scale=1):
+    """Return the 3x3 matrix that maps ImageItem coordinates to view coordinates.
+
+    The ImageItem shows a (rows, cols) slice as it is stored (column-major: item x is
+    the row, item y the column), at `scale` data pixels per item pixel for pyramid
+    levels. The image is flipped first, then rotated clockwise, and placed in the
+    view (whose y axis points up) with its top-left corner at (0, height).
+    """
+    height, width = shape[0], shape[1]
+    # 图像项坐标 -> (列, 行) 像素坐标，u 向右，v 向下
+    matrix = np.array([[0, scale, 0], [scale, 0, 0], [0, 0, 1]], np.float64)
+    if orientation.get('flip_horizontal'):
+        matrix = np.array([[-1, 0, width], [0, 1, 0], [0, 0, 1]]) @ matrix
+    if orientation.get('flip_vertical'):
+        matrix = np.array([[1, 0, 0], [0, -1, height], [0, 0, 1]]) @ matrix
+    for _ in range(orientation.get('rotate', 0) // 90 % 4):
+        # 顺时针旋转 90 度后宽高互换
+        matrix = np.array([[0, -1, height], [1, 0, 0], [0, 0, 1]]) @ matrix
+        width, height = height, width
+    # 视图的 y 轴向上，图像的第一行在最上面
+    return np.array([[1, 0, 0], [0, -1, height], [0, 0, 1]]) @ matrix
+
+
+def orientation_transform(shape, orientation, scale=1):
+    """QTransform for ImageItem.setTransform, see orientation_matrix."""
+    m = orientation_matrix(shape, orientation, scale)
+    # QTransform 使用行向量：x' = m11 * x + m21 * y + m31
+    return QtGui.QTransform(m[0, 0], m[1, 0], 0, m[0, 1], m[1, 1], 0, m[0, 2], m[1, 2], 1)
@@ -6,6 +6,7 @@ import numpy as np
 import sys
 
 from ImageP.utils.state_manager import state_manager
+from ImageP.imgio.pixel_formats import to_native_byte_order
 
 class OrthogonalViewWidget(QWidget):
     def __init__(self, image_data):
@@ -179,20 +180,20 @@ class OrthogonalViewWidget(QWidget):
 
         if update_xy:
             # XY平面（俯视图，Z恒定）
-            xy_slice = self.image_data[z_idx, :, :]
+            xy_slice = to_native_byte_order(self.image_data[z_idx, :, :])
             print(f"Updating XY view at z_idx={z_idx}")
             # self.xy_image.setImage(np.rot90(xy_slice, 1))  # 纠正图像显示方向
             self.xy_image.setImage(xy_slice)  # 纠正图像显示方向
 
         if update_xz:
             # XZ平面（垂直剖面，Y恒定）
-            xz_slice = np.flip(self.image_data[:, y_idx, :], axis=1)  # 水平翻转XZ切片
+            xz_slice = np.flip(to_native_byte_order(self.image_data[:, y_idx, :]), axis=1)  # 水平翻转XZ切片
             print(f"Updating XZ view at y_idx={y_idx}")
             self.xz_image.setImage(np.rot90(xz_slice, 1))  # 纠正图像显示方向
 
         if update_yz:
             # YZ平面（垂直剖面，X恒定）
-            yz_slice = self.image_data[:, :, x_idx]
+            yz_slice = to_native_byte_order(self.image_data[:, :, x_idx])
             print(f"Updating YZ view at x_idx={x_idx}")
             self.yz_image.setImage(np.rot90(yz_slice, 0))  # 纠正图像显示方向
 
@@ -391,13 +392,9 @@ if __name__ == '__main__':
     width = params['width']
     height = params['height']
     shape = (layers, height, width)
-    dtype = np.float32
+    dtype = np.dtype('>f4')  # 大端字节序的32位浮点数，由dtype负责字节序，不需要byteswap
 
-    image = np.fromfile(file_path, dtype=dtype)
-
-    image = image.byteswap().newbyteorder()  # Handle little-endian data
-
-    image = image.reshape(shape)
+    image = np.memmap(file_path, dtype=dtype, mode='r', shape=shape)
     # 创建正交视图窗口并显示
     widget = OrthogonalViewWidget(image)
     widget.show()
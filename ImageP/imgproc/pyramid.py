@@ -0,0 +1,56 @@
+import math
+import numpy as np
+
+PYRAMID_THRESHOLD = 2048  # 宽或高超过这个值的图像才建立金字塔
+PYRAMID_MIN_SIZE = 512  # 最小的一级的宽和高不小于这个值
+
+
+def downsample_2x(image):
+    """Halve the first two axes of an image by averaging 2x2 blocks; an odd last row/column is dropped."""
+    height, width = image.shape[0] // 2 * 2, image.shape[1] // 2 * 2
+    image = image[:height, :width]
+    if image.dtype == np.bool_:
+        image = image.view(np.uint8)
+
+    total = image[0::2, 0::2].astype(np.float32)
+    total += image[1::2, 0::2]
+    total += image[0::2, 1::2]
+    total += image[1::2, 1::2]
+    total *= 0.25
+    if image.dtype.kind in 'ui':
+        np.rint(total, out=total)
+    return total.astype(image.dtype)
+
+
+class ImagePyramid:
+    """2x downsampled levels of one image, levels[0] being half the size of the original.
+
+    Level n of the pyramid has 2**n times fewer pixels per axis than the image; level 0
+    is the image itself and is not stored. `nbytes` lets a SliceCache account for it.
+    """
+
+    def __init__(self, image, min_size=PYRAMID_MIN_SIZE):
+        self.levels = []
+        level = image
+        while min(level.shape[0], level.shape[1]) // 2 >= min_size:
+            level = downsample_2x(level)
+            self.levels.append(level)
+        self.nbytes = sum(level.nbytes for level in self.levels)
+
+    def __len__(self):
+        return len(self.levels) + 1
+
+    def level(self, image, index):
+        """Return level `index`, where level 0 is `image`, the image the pyramid was built from."""
+        return image if index == 0 else self.levels[index - 1]
+
+
+def needs_pyramid(image):
+    return max(image.shape[0], image.shape[1]) > PYRAMID_THRESHOLD
+
+
+def level_for_zoom(data_pixels_per_screen_pixel, level_count):
+    """Return the coarsest level that still has at least one data pixel per screen pixel."""
+    if not data_pixels_per_screen_pixel or data_pixels_per_screen_pixel <= 1:
+        return 0
+    return min(int(math.log2(data_pixels_per_screen_pixel)), level_count - 1)
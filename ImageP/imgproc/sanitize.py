@@ -0,0 +1,89 @@
+import numpy as np
+
+from ImageP.imgio.virtual_stack import VirtualStack
+
+UNKNOWN, CLEAN, DIRTY = -1, 0, 1  # 每层是否含有 NaN 或无穷大
+CHUNK_SLICES = 16  # 就地清理时每次检查的层数
+
+
+def has_non_finite(image):
+    """Check whether a float image contains NaN or +-Inf, without allocating a mask."""
+    if image.dtype.kind not in 'fc' or image.size == 0:
+        return False
+    # NaN 会传播到 min/max，无穷大就是 min 或 max 本身
+    return not (np.isfinite(np.min(image)) and np.isfinite(np.max(image)))
+
+
+def clean_non_finite(image, copy=True):
+    """Replace NaN by 0, +Inf by 255 and -Inf by 0, as the display has always done."""
+    return np.nan_to_num(image, copy=copy, nan=0.0, posinf=255, neginf=0.0)
+
+
+class SliceSanitizer:
+    """Replace NaN and Inf slice by slice when a slice is used, instead of cleaning the whole stack.
+
+    `state` records for every slice whether it is UNKNOWN, CLEAN or DIRTY. A slice is
+    checked the first time it is used; clean slices are then passed through without a
+    copy or a check, and only dirty ones are cleaned. Integer stacks never need it.
+    """
+
+    def __init__(self, stack):
+        self.stack = stack
+        self.needed = np.dtype(stack.dtype).kind in 'fc'
+        self.state = np.full(stack.shape[0], UNKNOWN, np.int8)
+
+    def check(self, index, image):
+        if self.state[index] == UNKNOWN:
+            self.state[index] = DIRTY if has_non_finite(image) else CLEAN
+        return self.state[index]
+
+    def clean_slice(self, index, image):
+        """Return slice `index` (given as `image`) free of NaN and Inf, copying it only when it has any."""
+        if not self.needed or self.check(index, image) == CLEAN:
+            return image
+        return clean_non_finite(image)
+
+    def invalidate(self, first=0, count=None):
+        """Forget the state of slices whose data changed (loaded, processed or reverted)."""
+        stop = len(self.state) if count is None else first + count
+        self.state[first:stop] = UNKNOWN
+
+    def mark_clean(self):
+        self.state[:] = CLEAN
+
+    def can_clean_in_place(self):
+        if isinstance(self.stack, VirtualStack):
+            return True
+        return isinstance(self.stack, np.ndarray) and self.stack.flags.writeable
+
+    def clean_in_place(self, before_write=None, chunk_slices=CHUNK_SLICES):
+        """Clean the data of the stack itself, CHUNK_SLICES slices at a time; yields the slices done.
+
+        A chunk without NaN or Inf is marked clean as a whole. In a dirty chunk only the
+        slices that have any are written, after `before_write(index)` (e.g. to keep the
+        original for File > Revert). Virtual stacks keep the cleaned slices in memory.
+        """
+        count = len(self.state)
+        for start in range(0, count, chunk_slices):
+            stop = min(start + chunk_slices, count)
+            if not self.needed:
+                yield stop
+                continue
+
+            if isinstance(self.stack, np.ndarray) and (self.state[start:stop] == UNKNOWN).all():
+                if not has_non_finite(self.stack[start:stop]):
+                    self.state[start:stop] = CLEAN
+                    yield stop
+                    continue
+
+            for index in range(start, stop):
+                if self.check(index, self.stack[index]) == CLEAN:
+                    continue
+                if before_write is not None:
+                    before_write(index)
+                if isinstance(self.stack, VirtualStack):
+                    self.stack[index] = clean_non_finite(self.stack[index])
+                else:
+                    clean_non_finite(self.stack[index], copy=False)
+                self.state[index] = CLEAN
+            yield stop
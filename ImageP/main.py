@@ -5,6 +5,7 @@ from PyQt5 import QtWidgets, QtCore
 from qasync import QEventLoop
 from ui.main_ui_qt5 import Ui_MainWindow
 from utils.menu_populate import populate_menu, populate_icons, load_menu_order, IconManager, handle_menu_click
+from ImageP.utils.state_manager import state_manager
 
 class MainWindow(QtWidgets.QMainWindow):
     icon_clicked = QtCore.pyqtSignal(int)
@@ -14,6 +15,7 @@ class MainWindow(QtWidgets.QMainWindow):
         self.ui = Ui_MainWindow()
         self.ui.setupUi(self)
         self.initUI()
+        state_manager.set_main_window(self)
 
     def initUI(self):
         # Get the path of the current script file
@@ -1,8 +1,111 @@
-from TestOpenCV.testPYQTG import create_and_show_image_with_rect
+import sys
+import json
+import os
+from PyQt5.QtWidgets import (
+    QApplication, QFileDialog, QDialog, QVBoxLayout, QLabel, QLineEdit, QCheckBox, QPushButton, QHBoxLayout
+)
+from PyQt5.QtCore import QTimer
+from ImageP.imgio.video_reader import open_video_stack
+from ImageP.utils.slice_cache import SliceCache
+from TestOpenCV.testPYQTG import create_and_show_stack
+
+CONFIG_FILE = "avi_import_config.json"
+
+def load_config():
+    if os.path.exists(CONFIG_FILE):
+        with open(CONFIG_FILE, 'r') as f:
+            return json.load(f)
+    return {}
+
+def save_config(config):
+    with open(CONFIG_FILE, 'w') as f:
+        json.dump(config, f, indent=4)
+
+def show_avi_dialog():
+    dialog = QDialog()
+    dialog.setWindowTitle("AVI Reader")
+    dialog.setMinimumWidth(600)
+
+    config = load_config()
+
+    layout = QVBoxLayout()
+
+    # First and last frame
+    first_frame_label = QLabel("First frame:")
+    first_frame_input = QLineEdit()
+    first_frame_input.setPlaceholderText("Enter frame, default 1")
+    layout.addWidget(first_frame_label)
+    layout.addWidget(first_frame_input)
+
+    last_frame_label = QLabel("Last frame:")
+    last_frame_input = QLineEdit()
+    last_frame_input.setPlaceholderText("Enter frame, default last frame of the video")
+    layout.addWidget(last_frame_label)
+    layout.addWidget(last_frame_input)
+
+    grayscale_checkbox = QCheckBox("Convert to grayscale")
+    grayscale_checkbox.setChecked(config.get('grayscale', False))
+    layout.addWidget(grayscale_checkbox)
+
+    # Memory budget of the decoded frame cache
+    cache_mb_label = QLabel("Frame cache (MB):")
+    cache_mb_input = QLineEdit()
+    cache_mb_input.setPlaceholderText("Enter cache size, default 512")
+    cache_mb_input.setText(str(config.get('cache_mb', '')))
+    layout.addWidget(cache_mb_label)
+    layout.addWidget(cache_mb_input)
+
+    # OK and Cancel buttons
+    button_layout = QHBoxLayout()
+    button_ok = QPushButton("OK")
+    button_cancel = QPushButton("Cancel")
+    button_ok.setFixedWidth(100)
+    button_cancel.setFixedWidth(100)
+    button_layout.addWidget(button_ok)
+    button_layout.addWidget(button_cancel)
+    layout.addLayout(button_layout)
+
+    dialog.setLayout(layout)
+
+    button_ok.clicked.connect(dialog.accept)
+    button_cancel.clicked.connect(dialog.reject)
+
+    if dialog.exec_() == QDialog.Accepted:
+        params = {
+            'first_frame': int(first_frame_input.text()) if first_frame_input.text().strip() != '' else 1,
+            'last_frame': int(last_frame_input.text()) if last_frame_input.text().strip() != '' else None,
+            'grayscale': grayscale_checkbox.isChecked(),
+            'cache_mb': int(cache_mb_input.text()) if cache_mb_input.text().strip() != '' else 512
+        }
+
+        # 帧范围与具体的视频有关，不保存
+        save_config({'grayscale': params['grayscale'], 'cache_mb': params['cache_mb']})
+
+        return params
+    else:
+        return None
 
 def handle_click():
-    create_and_show_image_with_rect()
+    app = QApplication.instance()
+    if app is None:
+        app = QApplication(sys.argv)
+
+    options = QFileDialog.Options()
+    file_path, _ = QFileDialog.getOpenFileName(None, "Select a video file", "",
+                                               "Video Files (*.avi *.mp4 *.mov *.mkv);;All Files (*)", options=options)
+
+    if file_path:
+        print(f"Selected file: {file_path}")
+
+        params = show_avi_dialog()
+        if params:
+            # 帧在滑动到时才解码，只有缓存中的帧占用内存
+            first_frame = max(params['first_frame'], 1) - 1
+            last_frame = params['last_frame'] - 1 if params['last_frame'] else None
+            cache = SliceCache(params['cache_mb'] * 1024 * 1024)
+            QTimer.singleShot(0, lambda: create_and_show_stack(
+                file_path,
+                lambda: (open_video_stack(file_path, first_frame, last_frame, params['grayscale'], cache), None)))
 
-# def main():
-#    create_and_show_image_with_rect()
-# main()
\ No newline at end of file
+if __name__ == "__main__":
+    handle_click()
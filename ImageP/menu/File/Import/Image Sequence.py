@@ -0,0 +1,131 @@
+import sys
+import json
+import os
+from PyQt5.QtWidgets import (
+    QApplication, QFileDialog, QDialog, QVBoxLayout, QLabel, QLineEdit, QPushButton, QHBoxLayout, QMessageBox
+)
+from PyQt5.QtCore import QTimer
+from ImageP.imgio.image_sequence import select_sequence_files
+from TestOpenCV.testPYQTG import create_and_show_image_sequence
+
+CONFIG_FILE = "image_sequence_config.json"
+
+def load_config():
+    if os.path.exists(CONFIG_FILE):
+        with open(CONFIG_FILE, 'r') as f:
+            return json.load(f)
+    return {}
+
+def save_config(config):
+    with open(CONFIG_FILE, 'w') as f:
+        json.dump(config, f, indent=4)
+
+def show_sequence_dialog(folder):
+    dialog = QDialog()
+    dialog.setWindowTitle("Import > Image Sequence...")
+    dialog.setMinimumWidth(600)
+
+    # 加载上次保存的配置（图像数量每次根据文件夹重新计算）
+    config = load_config()
+    total = len(select_sequence_files(folder))
+
+    layout = QVBoxLayout()
+    layout.addWidget(QLabel(f"Folder: {folder}"))
+    layout.addWidget(QLabel(f"{total} images found"))
+
+    # Number of images
+    count_label = QLabel("Number of images:")
+    count_input = QLineEdit()
+    count_input.setPlaceholderText(f"Enter number, default {total}")
+    layout.addWidget(count_label)
+    layout.addWidget(count_input)
+
+    # Starting image
+    start_label = QLabel("Starting image:")
+    start_input = QLineEdit()
+    start_input.setPlaceholderText("Enter number, default 1")
+    start_input.setText(str(config.get('start', '')))
+    layout.addWidget(start_label)
+    layout.addWidget(start_input)
+
+    # Increment
+    step_label = QLabel("Increment:")
+    step_input = QLineEdit()
+    step_input.setPlaceholderText("Enter increment, default 1")
+    step_input.setText(str(config.get('step', '')))
+    layout.addWidget(step_label)
+    layout.addWidget(step_input)
+
+    # Scale, applied while decoding
+    scale_label = QLabel("Scale images (%):")
+    scale_input = QLineEdit()
+    scale_input.setPlaceholderText("Enter scale, default 100")
+    scale_input.setText(str(config.get('scale', '')))
+    layout.addWidget(scale_label)
+    layout.addWidget(scale_input)
+
+    # File name filter
+    filter_label = QLabel("File name contains:")
+    filter_input = QLineEdit()
+    filter_input.setText(config.get('name_filter', ''))
+    layout.addWidget(filter_label)
+    layout.addWidget(filter_input)
+
+    # OK and Cancel buttons
+    button_layout = QHBoxLayout()
+    button_ok = QPushButton("OK")
+    button_cancel = QPushButton("Cancel")
+    button_ok.setFixedWidth(100)
+    button_cancel.setFixedWidth(100)
+    button_layout.addWidget(button_ok)
+    button_layout.addWidget(button_cancel)
+    layout.addLayout(button_layout)
+
+    dialog.setLayout(layout)
+
+    button_ok.clicked.connect(dialog.accept)
+    button_cancel.clicked.connect(dialog.reject)
+
+    if dialog.exec_() == QDialog.Accepted:
+        params = {
+            'count': int(count_input.text()) if count_input.text().strip() != '' else None,
+            'start': int(start_input.text()) if start_input.text().strip() != '' else 1,
+            'step': int(step_input.text()) if step_input.text().strip() != '' else 1,
+            'scale': float(scale_input.text()) if scale_input.text().strip() != '' else 100,
+            'name_filter': filter_input.text(),
+        }
+
+        # 图像数量和文件夹相关，不保存
+        save_config({key: value for key, value in params.items() if key != 'count'})
+
+        return params
+    else:
+        return None
+
+def handle_click():
+    app = QApplication.instance()
+    if app is None:
+        app = QApplication(sys.argv)
+
+    # 选择包含图像序列的文件夹
+    folder = QFileDialog.getExistingDirectory(None, "Select the image sequence folder")
+
+    if folder:
+        print(f"Selected folder: {folder}")
+
+        params = show_sequence_dialog(folder)
+        if params and not params['scale'] > 0:
+            QMessageBox.warning(None, "Image Sequence", "The scale must be greater than 0%.")
+            return
+        if params:
+            files = select_sequence_files(folder, params['start'], params['step'], params['count'], params['name_filter'])
+            if not files:
+                QMessageBox.warning(None, "Image Sequence", "No images match the selected options.")
+                return
+
+            print(f"Opening {len(files)} images")
+            # 延迟加载图像，确保所有UI组件在正确的状态下被访问
+            QTimer.singleShot(0, lambda: create_and_show_image_sequence(files, params))
+
+if __name__ == "__main__":
+    handle_click()
@@ -1,8 +1,23 @@
-from TestOpenCV.testPYQTG import create_and_show_image_with_rect
+import sys
+from PyQt5.QtWidgets import QApplication, QFileDialog
+from PyQt5.QtCore import QTimer
+from ImageP.imgio.nifti_reader import open_nifti
+from TestOpenCV.testPYQTG import create_and_show_stack
 
 def handle_click():
-    create_and_show_image_with_rect()
+    app = QApplication.instance()
+    if app is None:
+        app = QApplication(sys.argv)
 
-# def main():
-#    create_and_show_image_with_rect()
-# main()
\ No newline at end of file
+    options = QFileDialog.Options()
+    file_path, _ = QFileDialog.getOpenFileName(None, "Select a NIfTI or Analyze file", "",
+                                               "NIfTI / Analyze (*.nii *.nii.gz *.hdr *.img *.img.gz);;All Files (*)",
+                                               options=options)
+
+    if file_path:
+        print(f"Selected file: {file_path}")
+        # 体素数据按需映射或解压，打开后也可以用 Image > Stacks > Orthogonal Views 查看
+        QTimer.singleShot(0, lambda: create_and_show_stack(file_path, lambda: open_nifti(file_path), open_nifti))
+
+if __name__ == "__main__":
+    handle_click()
@@ -92,8 +92,20 @@ def show_import_dialog():
     virtual_stack_checkbox.setChecked(config.get('virtual_stack', False))
     layout.addWidget(white_zero_checkbox)
     layout.addWidget(little_endian_checkbox)
+    # 第一次打开后转换为压缩的分块缓存，以后打开同一个文件时直接读缓存
+    chunked_cache_checkbox = QCheckBox("Convert to chunked cache")
+    chunked_cache_checkbox.setChecked(config.get('chunked_cache', False))
     layout.addWidget(open_all_files_checkbox)
     layout.addWidget(virtual_stack_checkbox)
+    layout.addWidget(chunked_cache_checkbox)
+
+    # Memory budget of the virtual stack slice cache
+    cache_mb_label = QLabel("Virtual stack cache (MB):")
+    cache_mb_input = QLineEdit()
+    cache_mb_input.setPlaceholderText("Enter cache size, default 1024")
+    cache_mb_input.setText(str(config.get('cache_mb', '')))
+    layout.addWidget(cache_mb_label)
+    layout.addWidget(cache_mb_input)
 
     # OK and Cancel buttons
     button_layout = QHBoxLayout()
@@ -124,7 +136,9 @@ def show_import_dialog():
             'white_zero': white_zero_checkbox.isChecked(),
             'little_endian': little_endian_checkbox.isChecked(),
             'open_all_files': open_all_files_checkbox.isChecked(),
-            'virtual_stack': virtual_stack_checkbox.isChecked()
+            'virtual_stack': virtual_stack_checkbox.isChecked(),
+            'chunked_cache': chunked_cache_checkbox.isChecked(),
+            'cache_mb': int(cache_mb_input.text()) if cache_mb_input.text().strip() != '' else 1024
         }
 
         # Save the configuration to file
@@ -139,9 +153,10 @@ def handle_click():
     if app is None:
         app = QApplication(sys.argv)
 
-    # 打开文件选择对话框，并限制文件类型为 .raw
+    # 打开文件选择对话框，并限制文件类型为 .raw（也可以是 .raw.gz / .raw.zst 压缩文件）
     options = QFileDialog.Options()
-    file_path, _ = QFileDialog.getOpenFileName(None, "Select a .raw file", "", "RAW Files (*.raw)", options=options)
+    file_path, _ = QFileDialog.getOpenFileName(None, "Select a .raw file", "",
+                                               "RAW Files (*.raw *.raw.gz *.raw.zst);;All Files (*)", options=options)
 
     if file_path:  # 如果选择了文件
         print(f"Selected file: {file_path}")
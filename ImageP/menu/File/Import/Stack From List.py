@@ -1,8 +1,27 @@
-from TestOpenCV.testPYQTG import create_and_show_image_with_rect
+import sys
+from PyQt5.QtWidgets import QApplication, QFileDialog, QMessageBox
+from PyQt5.QtCore import QTimer
+from TestOpenCV.testPYQTG import create_and_show_stack_from_list
+
+def open_stack_from_list(list_path):
+    try:
+        create_and_show_stack_from_list(list_path)
+    except (OSError, ValueError) as e:
+        QMessageBox.critical(None, "Error", f"Failed to open stack from list: {e}")
 
 def handle_click():
-    create_and_show_image_with_rect()
+    app = QApplication.instance()
+    if app is None:
+        app = QApplication(sys.argv)
+
+    options = QFileDialog.Options()
+    list_path, _ = QFileDialog.getOpenFileName(None, "Select a text file listing the images", "",
+                                               "Text Files (*.txt *.lst *.csv);;All Files (*)", options=options)
+
+    if list_path:
+        print(f"Selected list: {list_path}")
+        # 列表中的文件在线程池中并行读取，重复的文件只读一次
+        QTimer.singleShot(0, lambda: open_stack_from_list(list_path))
 
-# def main():
-#    create_and_show_image_with_rect()
-# main()
\ No newline at end of file
+if __name__ == "__main__":
+    handle_click()
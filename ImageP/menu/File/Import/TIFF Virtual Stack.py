@@ -0,0 +1,23 @@
+import sys
+from PyQt5.QtWidgets import QApplication, QFileDialog
+from PyQt5.QtCore import QTimer
+from ImageP.imgio.tiff_reader import open_tiff_stack
+from TestOpenCV.testPYQTG import create_and_show_stack
+
+def handle_click():
+    app = QApplication.instance()
+    if app is None:
+        app = QApplication(sys.argv)
+
+    options = QFileDialog.Options()
+    file_path, _ = QFileDialog.getOpenFileName(None, "Select a TIFF file", "",
+                                               "TIFF Files (*.tif *.tiff *.btf *.tf8);;All Files (*)", options=options)
+
+    if file_path:
+        print(f"Selected file: {file_path}")
+        # 只读取页表，切片在滑动到时才从文件中读取
+        open_file = lambda path: (open_tiff_stack(path), None)
+        QTimer.singleShot(0, lambda: create_and_show_stack(file_path, lambda: open_file(file_path), open_file))
+
+if __name__ == "__main__":
+    handle_click()
@@ -1,8 +1,44 @@
-from TestOpenCV.testPYQTG import create_and_show_image_with_rect
+import os
+import sys
+from PyQt5.QtWidgets import QApplication, QFileDialog, QPlainTextEdit
+from PyQt5.QtGui import QFontDatabase
+
+READ_SIZE = 16 * 1024 * 1024
+
+# 保持对打开的窗口的引用，避免被垃圾回收
+text_windows = []
+
+def read_text_file(file_path):
+    """Read a text file in large blocks and decode it once, instead of line by line."""
+    blocks = []
+    with open(file_path, 'rb') as f:
+        while True:
+            block = f.read(READ_SIZE)
+            if not block:
+                break
+            blocks.append(block)
+    return b''.join(blocks).decode('utf-8', errors='replace')
 
 def handle_click():
-    create_and_show_image_with_rect()
+    app = QApplication.instance()
+    if app is None:
+        app = QApplication(sys.argv)
+
+    options = QFileDialog.Options()
+    file_path, _ = QFileDialog.getOpenFileName(None, "Select a text file", "",
+                                               "Text Files (*.txt *.csv *.tsv *.log *.md);;All Files (*)", options=options)
+
+    if file_path:
+        print(f"Selected file: {file_path}")
+        window = QPlainTextEdit()
+        window.setWindowTitle(os.path.basename(file_path))
+        window.setReadOnly(True)
+        window.setLineWrapMode(QPlainTextEdit.NoWrap)
+        window.setFont(QFontDatabase.systemFont(QFontDatabase.FixedFont))
+        window.setPlainText(read_text_file(file_path))
+        window.resize(700, 500)
+        window.show()
+        text_windows.append(window)
 
-# def main():
-#    create_and_show_image_with_rect()
-# main()
\ No newline at end of file
+if __name__ == "__main__":
+    handle_click()
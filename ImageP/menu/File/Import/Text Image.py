@@ -0,0 +1,24 @@
+import sys
+import numpy as np
+from PyQt5.QtWidgets import QApplication, QFileDialog
+from PyQt5.QtCore import QTimer
+from ImageP.imgio.text_reader import read_text_image
+from TestOpenCV.testPYQTG import create_and_show_stack
+
+def handle_click():
+    app = QApplication.instance()
+    if app is None:
+        app = QApplication(sys.argv)
+
+    options = QFileDialog.Options()
+    file_path, _ = QFileDialog.getOpenFileName(None, "Select a text image", "",
+                                               "Text Images (*.txt *.csv *.tsv *.xls);;All Files (*)", options=options)
+
+    if file_path:
+        print(f"Selected file: {file_path}")
+        # 在后台线程中分块解析，结果作为单层的栈显示
+        open_file = lambda path: (read_text_image(path)[np.newaxis], None)
+        QTimer.singleShot(0, lambda: create_and_show_stack(file_path, lambda: open_file(file_path), open_file))
+
+if __name__ == "__main__":
+    handle_click()
@@ -1,8 +1,115 @@
-from TestOpenCV.testPYQTG import create_and_show_image_with_rect
+import sys
+import json
+import os
+from urllib.parse import urlparse
+from PyQt5.QtWidgets import QApplication, QDialog, QVBoxLayout, QLabel, QLineEdit, QPushButton, QHBoxLayout
+from PyQt5.QtCore import QTimer
+from ImageP.imgio.http_source import HttpByteSource
+from ImageP.imgio.index_cache import load_index, save_index
+from ImageP.imgio.tiff_reader import TiffVirtualStack, read_tiff_index
+from ImageP.imgio.virtual_stack import RawVirtualStack
+from ImageP.utils.slice_cache import SliceCache
+from ImageP.menu.File.Import.Raw import show_import_dialog
+from TestOpenCV.testPYQTG import create_and_show_stack
+
+CONFIG_FILE = "url_import_config.json"
+TIFF_EXTENSIONS = ('.tif', '.tiff', '.btf', '.tf8')
+
+def load_config():
+    if os.path.exists(CONFIG_FILE):
+        with open(CONFIG_FILE, 'r') as f:
+            return json.load(f)
+    return {}
+
+def save_config(config):
+    with open(CONFIG_FILE, 'w') as f:
+        json.dump(config, f, indent=4)
+
+def show_url_dialog():
+    dialog = QDialog()
+    dialog.setWindowTitle("Import > URL...")
+    dialog.setMinimumWidth(600)
+
+    config = load_config()
+
+    layout = QVBoxLayout()
+
+    url_label = QLabel("URL of a TIFF or raw file (http:// or https://):")
+    url_input = QLineEdit()
+    url_input.setPlaceholderText("http://server/path/volume.tif")
+    url_input.setText(config.get('url', ''))
+    layout.addWidget(url_label)
+    layout.addWidget(url_input)
+
+    # 从网络读取的切片的内存缓存，下载的数据块另外保存在磁盘上
+    cache_mb_label = QLabel("Slice cache (MB):")
+    cache_mb_input = QLineEdit()
+    cache_mb_input.setPlaceholderText("Enter cache size, default 512")
+    cache_mb_input.setText(str(config.get('cache_mb', '')))
+    layout.addWidget(cache_mb_label)
+    layout.addWidget(cache_mb_input)
+
+    button_layout = QHBoxLayout()
+    button_ok = QPushButton("OK")
+    button_cancel = QPushButton("Cancel")
+    button_ok.setFixedWidth(100)
+    button_cancel.setFixedWidth(100)
+    button_layout.addWidget(button_ok)
+    button_layout.addWidget(button_cancel)
+    layout.addLayout(button_layout)
+
+    dialog.setLayout(layout)
+
+    button_ok.clicked.connect(dialog.accept)
+    button_cancel.clicked.connect(dialog.reject)
+
+    if dialog.exec_() == QDialog.Accepted and url_input.text().strip():
+        params = {
+            'url': url_input.text().strip(),
+            'cache_mb': int(cache_mb_input.text()) if cache_mb_input.text().strip() != '' else 512
+        }
+        save_config(params)
+        return params
+    return None
+
+def open_url_stack(url, raw_params, cache):
+    """Open a TIFF or raw volume on a web server; only the bytes of the slices that are viewed are downloaded.
+
+    The TIFF page table is saved in the index cache under the source's URL, size and
+    version, so it is only read over the network the first time.
+    """
+    source = HttpByteSource(url)
+    if raw_params is None:
+        index = load_index(url, 'tiff', key=source.key)
+        if index is None:
+            index = read_tiff_index(source)
+            save_index(url, 'tiff', index, key=source.key)
+        return TiffVirtualStack(source, index, cache), None
+
+    shape = (raw_params['num_images'], raw_params['height'], raw_params['width'])
+    return RawVirtualStack(url, shape, raw_params['image_type'], raw_params['little_endian'],
+                           raw_params['offset'], raw_params['gap'], cache, reader=source), None
 
 def handle_click():
-    create_and_show_image_with_rect()
+    app = QApplication.instance()
+    if app is None:
+        app = QApplication(sys.argv)
+
+    params = show_url_dialog()
+    if not params:
+        return
+
+    url = params['url']
+    print(f"Selected URL: {url}")
+    raw_params = None
+    if not urlparse(url).path.lower().endswith(TIFF_EXTENSIONS):
+        # 不是 TIFF 时按原始数据读取，参数与 Import > Raw 相同
+        raw_params = show_import_dialog()
+        if not raw_params:
+            return
+
+    cache = SliceCache(params['cache_mb'] * 1024 * 1024)
+    QTimer.singleShot(0, lambda: create_and_show_stack(url, lambda: open_url_stack(url, raw_params, cache)))
 
-# def main():
-#    create_and_show_image_with_rect()
-# main()
\ No newline at end of file
+if __name__ == "__main__":
+    handle_click()
@@ -0,0 +1,10 @@
+from PyQt5.QtWidgets import QApplication, QMessageBox
+from PyQt5.QtCore import Qt
+from TestOpenCV.testPYQTG import open_next_image
+
+def handle_click():
+    # 与 ImageJ 相同：按住 Alt 时打开上一个文件
+    delta = -1 if QApplication.keyboardModifiers() & Qt.AltModifier else 1
+    if open_next_image(delta) is None:
+        QMessageBox.warning(None, "Open Next", "Open Next needs an image opened from a file "
+                                               "(Import > Raw, TIFF Virtual Stack, NIfTI-Analyze or Text Image)")
@@ -0,0 +1,12 @@
+from PyQt5.QtWidgets import QMessageBox
+from ImageP.utils.state_manager import state_manager
+
+def handle_click():
+    image_with_rect = state_manager.get_image_with_rect_instance()
+    if image_with_rect is None or image_with_rect.snapshot is None:
+        QMessageBox.warning(None, "Revert", "There is no image to revert")
+        return
+
+    # 不重新读取文件：只恢复被修改过的图层，内存映射的图像直接重新映射
+    print("Reverting to the image as it was opened")
+    image_with_rect.revert()
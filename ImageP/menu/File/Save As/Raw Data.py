@@ -0,0 +1,20 @@
+import os
+from PyQt5.QtWidgets import QFileDialog, QMessageBox
+from ImageP.imgio.stack_writer import write_raw
+from ImageP.utils.state_manager import state_manager
+
+def handle_click():
+    image_with_rect = state_manager.get_image_with_rect_instance()
+    if image_with_rect is None or getattr(image_with_rect, 'image_data', None) is None:
+        QMessageBox.warning(None, "Save As", "There is no image to save")
+        return
+
+    default_name = os.path.splitext(os.path.basename(image_with_rect.file_path or 'Untitled'))[0] + '.raw'
+    file_path, _ = QFileDialog.getSaveFileName(None, "Save as raw data", default_name,
+                                               "RAW Files (*.raw);;All Files (*)")
+    if not file_path:
+        return
+
+    # 不写文件头，按 little-endian 逐层写入；用 Import > Raw 打开时选择 Little-endian byte order
+    print(f"Saving as raw data (little-endian): {file_path}")
+    image_with_rect.save_stack_async(file_path, write_raw)
@@ -0,0 +1,23 @@
+import os
+from PyQt5.QtWidgets import QFileDialog, QMessageBox
+from ImageP.imgio.stack_writer import write_tiff
+from ImageP.utils.state_manager import state_manager
+
+def save_as_tiff(image_with_rect):
+    default_name = os.path.splitext(os.path.basename(image_with_rect.file_path or 'Untitled'))[0] + '.tif'
+    file_path, _ = QFileDialog.getSaveFileName(None, "Save as TIFF", default_name,
+                                               "TIFF Files (*.tif *.tiff);;All Files (*)")
+    if not file_path:
+        return
+
+    print(f"Saving as TIFF: {file_path}")
+    # 逐层写入，虚拟栈和内存映射的图像也不会整体读入内存
+    if image_with_rect.save_stack_async(file_path, write_tiff):
+        image_with_rect.saved_path = file_path
+
+def handle_click():
+    image_with_rect = state_manager.get_image_with_rect_instance()
+    if image_with_rect is None or getattr(image_with_rect, 'image_data', None) is None:
+        QMessageBox.warning(None, "Save As", "There is no image to save")
+        return
+    save_as_tiff(image_with_rect)
@@ -0,0 +1,30 @@
+import importlib
+import os
+from PyQt5.QtWidgets import QMessageBox
+from ImageP.imgio.stack_writer import write_tiff
+from ImageP.utils.state_manager import state_manager
+
+TIFF_EXTENSIONS = ('.tif', '.tiff')
+
+def handle_click():
+    image_with_rect = state_manager.get_image_with_rect_instance()
+    if image_with_rect is None or getattr(image_with_rect, 'image_data', None) is None:
+        QMessageBox.warning(None, "Save", "There is no image to save")
+        return
+
+    # 与 ImageJ 相同：TIFF 图像直接覆盖保存，其他图像先选择文件名另存为 TIFF
+    file_path = image_with_rect.saved_path
+    if file_path is None and (image_with_rect.file_path or '').lower().endswith(TIFF_EXTENSIONS) \
+            and os.path.isfile(image_with_rect.file_path):
+        file_path = image_with_rect.file_path
+    if file_path is not None and image_with_rect.reads_from(file_path):
+        # 按需读取的图像不能覆盖它正在读取的文件，改为另存为
+        file_path = None
+
+    if file_path is None:
+        importlib.import_module('ImageP.menu.File.Save As.Tiff').save_as_tiff(image_with_rect)
+        return
+
+    print(f"Saving: {file_path}")
+    if image_with_rect.save_stack_async(file_path, write_tiff):
+        image_with_rect.saved_path = file_path
@@ -0,0 +1,67 @@
+from PyQt5.QtWidgets import (
+    QDialog, QVBoxLayout, QLabel, QSpinBox, QCheckBox, QPushButton, QHBoxLayout, QMessageBox
+)
+from ImageP.utils.state_manager import state_manager
+
+def show_animation_dialog(image_with_rect):
+    playback = image_with_rect.playback
+    frame_count = image_with_rect.image_data.shape[0]
+
+    dialog = QDialog()
+    dialog.setWindowTitle("Animation Options")
+    layout = QVBoxLayout()
+
+    # Speed, first and last frame (1-based, as shown in the status label)
+    speed_input = QSpinBox()
+    speed_input.setRange(1, 240)
+    speed_input.setSuffix(" fps")
+    speed_input.setValue(int(playback.fps))
+    first_input = QSpinBox()
+    first_input.setRange(1, frame_count)
+    first_input.setValue(playback.first + 1)
+    last_input = QSpinBox()
+    last_input.setRange(1, frame_count)
+    last_input.setValue(playback.last + 1)
+    layout.addWidget(QLabel("Speed:"))
+    layout.addWidget(speed_input)
+    layout.addWidget(QLabel("First frame:"))
+    layout.addWidget(first_input)
+    layout.addWidget(QLabel("Last frame:"))
+    layout.addWidget(last_input)
+
+    ping_pong_checkbox = QCheckBox("Loop back and forth")
+    ping_pong_checkbox.setChecked(playback.ping_pong)
+    layout.addWidget(ping_pong_checkbox)
+
+    # OK and Cancel buttons
+    button_layout = QHBoxLayout()
+    button_ok = QPushButton("OK")
+    button_cancel = QPushButton("Cancel")
+    button_ok.setFixedWidth(100)
+    button_cancel.setFixedWidth(100)
+    button_layout.addWidget(button_ok)
+    button_layout.addWidget(button_cancel)
+    layout.addLayout(button_layout)
+
+    dialog.setLayout(layout)
+    button_ok.clicked.connect(dialog.accept)
+    button_cancel.clicked.connect(dialog.reject)
+
+    if dialog.exec_() != QDialog.Accepted:
+        return
+
+    playback.ping_pong = ping_pong_checkbox.isChecked()
+    playback.set_range(first_input.value() - 1, last_input.value() - 1)
+    # 滑块旁的帧率框同时更新播放引擎
+    image_with_rect.fps_spin.setValue(speed_input.value())
+    if image_with_rect.is_playing:
+        playback.start(image_with_rect.slider.value())
+        if image_with_rect.prefetcher:
+            image_with_rect.prefetcher.wrap = not playback.ping_pong
+
+def handle_click():
+    image_with_rect = state_manager.get_image_with_rect_instance()
+    if image_with_rect is None or not image_with_rect.is_3d or image_with_rect.slider is None:
+        QMessageBox.warning(None, "Animation Options", "This command requires a stack")
+        return
+    show_animation_dialog(image_with_rect)
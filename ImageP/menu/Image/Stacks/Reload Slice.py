@@ -0,0 +1,19 @@
+from PyQt5.QtWidgets import QMessageBox
+from ImageP.utils.state_manager import state_manager
+
+def handle_click():
+    image_with_rect = state_manager.get_image_with_rect_instance()
+    if image_with_rect is None or image_with_rect.source_paths is None or image_with_rect.slider is None:
+        QMessageBox.warning(None, "Reload Slice", "This command requires a stack opened with Import > Stack From List")
+        return
+    if image_with_rect.stack_loader is not None and image_with_rect.stack_loader.is_running():
+        QMessageBox.warning(None, "Reload Slice", "The stack is still being loaded")
+        return
+
+    # 只重新读取当前层对应的文件（例如文件在磁盘上被更新了），不重新打开整个列表
+    layer = image_with_rect.slider.value()
+    print(f"Reloading slice {layer + 1} from {image_with_rect.source_paths[layer]}")
+    try:
+        image_with_rect.reload_slice(layer)
+    except Exception as e:
+        QMessageBox.critical(None, "Error", f"Failed to reload slice {layer + 1}: {e}")
@@ -0,0 +1,57 @@
+from PyQt5.QtWidgets import (
+    QDialog, QVBoxLayout, QLabel, QComboBox, QCheckBox, QPushButton, QHBoxLayout, QMessageBox
+)
+from ImageP.imgproc.orientation import ROTATIONS
+from ImageP.utils.state_manager import state_manager
+
+def show_orientation_dialog(image_with_rect):
+    orientation = image_with_rect.orientation
+
+    dialog = QDialog()
+    dialog.setWindowTitle("Orientation")
+    layout = QVBoxLayout()
+
+    # 只改变显示方向，不改变像素数据
+    rotate_label = QLabel("Rotate (clockwise):")
+    rotate_combo = QComboBox()
+    rotate_combo.addItems([f"{angle}°" for angle in ROTATIONS])
+    rotate_combo.setCurrentIndex(ROTATIONS.index(orientation['rotate']))
+    layout.addWidget(rotate_label)
+    layout.addWidget(rotate_combo)
+
+    flip_horizontal_checkbox = QCheckBox("Flip horizontally")
+    flip_horizontal_checkbox.setChecked(orientation['flip_horizontal'])
+    flip_vertical_checkbox = QCheckBox("Flip vertically")
+    flip_vertical_checkbox.setChecked(orientation['flip_vertical'])
+    layout.addWidget(flip_horizontal_checkbox)
+    layout.addWidget(flip_vertical_checkbox)
+
+    # OK and Cancel buttons
+    button_layout = QHBoxLayout()
+    button_ok = QPushButton("OK")
+    button_cancel = QPushButton("Cancel")
+    button_ok.setFixedWidth(100)
+    button_cancel.setFixedWidth(100)
+    button_layout.addWidget(button_ok)
+    button_layout.addWidget(button_cancel)
+    layout.addLayout(button_layout)
+
+    dialog.setLayout(layout)
+    button_ok.clicked.connect(dialog.accept)
+    button_cancel.clicked.connect(dialog.reject)
+
+    if dialog.exec_() != QDialog.Accepted:
+        return
+
+    image_with_rect.set_orientation({
+        'rotate': ROTATIONS[rotate_combo.currentIndex()],
+        'flip_horizontal': flip_horizontal_checkbox.isChecked(),
+        'flip_vertical': flip_vertical_checkbox.isChecked(),
+    })
+
+def handle_click():
+    image_with_rect = state_manager.get_image_with_rect_instance()
+    if image_with_rect is None or image_with_rect.img is None:
+        QMessageBox.warning(None, "Orientation", "There is no image")
+        return
+    show_orientation_dialog(image_with_rect)
@@ -0,0 +1,11 @@
+from ImageP.utils.state_manager import state_manager
+
+
+def handle_click():
+    # 把字节序与本机不同的图像（例如大端的扫描数据）转换为本机字节序的内存副本
+    image_with_rect = state_manager.get_image_with_rect_instance()
+    if image_with_rect is None or state_manager.get_image_data() is None:
+        print("There are no images open")
+        return
+
+    image_with_rect.convert_to_native_byte_order()
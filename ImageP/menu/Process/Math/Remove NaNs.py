@@ -0,0 +1,12 @@
+from PyQt5.QtWidgets import QMessageBox
+from ImageP.utils.state_manager import state_manager
+
+def handle_click():
+    image_with_rect = state_manager.get_image_with_rect_instance()
+    if image_with_rect is None or image_with_rect.sanitizer is None:
+        QMessageBox.warning(None, "Remove NaNs", "This command requires a stack")
+        return
+
+    # 显示时本来就逐层替换无效值；这里把替换写入数据本身（NaN -> 0，+Inf -> 255，-Inf -> 0）
+    print("Removing NaN and Inf from the image data")
+    image_with_rect.clean_stack_in_place()
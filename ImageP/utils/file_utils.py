@@ -0,0 +1,24 @@
+import os
+import re
+
+
+def natural_sort_key(name):
+    """Sort key that orders embedded numbers by value, so 'img2' comes before 'img10'."""
+    return [int(part) if part.isdigit() else part.lower() for part in re.split(r'(\d+)', name)]
+
+
+def list_folder_files(folder, extensions=None):
+    """List the files of a folder in natural order, optionally only those with the given extensions."""
+    if extensions is not None:
+        extensions = tuple(ext.lower() for ext in extensions)
+
+    files = []
+    for name in os.listdir(folder):
+        path = os.path.join(folder, name)
+        if not os.path.isfile(path) or name.startswith('.'):
+            continue
+        if extensions is not None and not name.lower().endswith(extensions):
+            continue
+        files.append(path)
+
+    return sorted(files, key=lambda path: natural_sort_key(os.path.basename(path)))
@@ -253,31 +253,36 @@ def handle_menu_click(main_window, file_path):
                 if ret == QMessageBox.Yes:
                     # 用户选择Yes，处理所有图层
                     print("Processing all layers of the 3D image...")
+                    image_with_rect = state_manager.get_image_with_rect_instance()
                     for layer in range(image_data.shape[0]):
-                        current_layer_image = image_data[layer]
+                        current_layer_image = image_with_rect.get_image_layer(layer)  # 逐层转换字节序，替换 NaN 和无穷大
                         inverted_image_layer = await module_spec.process_image_async(current_layer_image)
+                        image_with_rect.preserve_slice(layer)  # 第一次修改前保留原始数据，用于 File > Revert
                         image_data[layer] = inverted_image_layer  # 更新每一层
 
                     state_manager.set_image_data(image_data)
                     image_with_rect = state_manager.get_image_with_rect_instance()
+                    image_with_rect.invalidate_slice_cache()
 
                     # 更新UI显示用户最初选择的图层，而不是跳到第一层
-                    image_with_rect.update_image_with_data(image_data[current_layer])
+                    image_with_rect.update_image_with_data(image_with_rect.get_image_layer(current_layer))
                     image_with_rect.slider.setValue(current_layer)  # 保持slider选中的图层
 
                 elif ret == QMessageBox.No:
                     # 用户选择No，只处理当前选中的图层
                     print(f"Processing current layer {current_layer} of the 3D image...")
-                    current_layer_image = image_data[current_layer]
+                    current_layer_image = state_manager.get_image_with_rect_instance().get_image_layer(current_layer)
                     inverted_image_layer = await module_spec.process_image_async(current_layer_image)
 
                     # 更新3D图像中的当前图层
+                    state_manager.get_image_with_rect_instance().preserve_slice(current_layer)
                     image_data[current_layer] = inverted_image_layer
 
                     # 更新UI，显示当前处理后的图层
                     state_manager.set_image_data(image_data)
                     image_with_rect = state_manager.get_image_with_rect_instance()
-                    image_with_rect.update_image_with_data(image_data[current_layer])
+                    image_with_rect.invalidate_slice_cache()
+                    image_with_rect.update_image_with_data(image_with_rect.get_image_layer(current_layer))
 
             elif len(image_data.shape) == 2:  # 2D图像
                 print("Processing 2D image")
@@ -0,0 +1,101 @@
+import time
+from collections import deque
+from PyQt5.QtCore import QObject, QTimer, Qt, pyqtSignal
+
+
+class PlaybackEngine(QObject):
+    """Play the frames of a stack at a target frame rate.
+
+    Which frame is due is computed from the time since playback started, not by
+    counting timer ticks, so when decoding or drawing a frame takes longer than a
+    frame interval the frames in between are dropped and playback stays in real
+    time. Plays `first`..`last` in a loop, or back and forth when `ping_pong` is set.
+    """
+
+    frame_changed = pyqtSignal(int)  # 应该显示的帧
+
+    def __init__(self, parent=None, fps=10):
+        super().__init__(parent)
+        self.fps = fps
+        self.frame_count = 1
+        self.first, self.last = 0, 0
+        self.ping_pong = False
+        self.direction = 1  # 来回播放时当前的方向
+        self.position = 0
+        self.measured_fps = 0.0  # 最近一秒实际显示的帧率
+        self.dropped = 0  # 本次播放跳过的帧数
+        self._shown = deque()  # 最近一秒内显示各帧的时间
+        self._start_time = 0.0
+        self._frames = 0
+        self._timer = QTimer(self)
+        self._timer.setTimerType(Qt.PreciseTimer)
+        self._timer.timeout.connect(self._tick)
+
+    def is_playing(self):
+        return self._timer.isActive()
+
+    def set_frame_count(self, frame_count):
+        """Set the number of frames of the stack; the loop range becomes the whole stack."""
+        self.frame_count = max(1, frame_count)
+        self.set_range(0, self.frame_count - 1)
+
+    def set_range(self, first, last):
+        self.first = min(max(0, first), self.frame_count - 1)
+        self.last = min(max(self.first, last), self.frame_count - 1)
+
+    def set_fps(self, fps):
+        self.fps = max(0.1, float(fps))
+        if self.is_playing():
+            self.start(self.position)
+
+    def start(self, position):
+        if not self.first <= position <= self.last:
+            position = self.first
+        self.position = position
+        self._start_time = time.monotonic()
+        self._frames = 0
+        self.dropped = 0
+        self._shown.clear()
+        # 以半帧间隔检查，计时器的抖动不会让某一帧晚一整个间隔
+        self._timer.start(max(1, int(500 / self.fps)))
+
+    def stop(self):
+        self._timer.stop()
+        self.measured_fps = 0.0
+
+    def step(self, position, steps):
+        """Return the frame `steps` frames after `position`, looping or going back and forth."""
+        length = self.last - self.first + 1
+        if length <= 1:
+            return self.first
+        if not self.ping_pong:
+            return self.first + (position - self.first + steps) % length
+
+        # 来回播放一次的周期是 2 * (length - 1) 帧，先把位置换算到周期中
+        period = 2 * (length - 1)
+        offset = position - self.first
+        phase = (offset if self.direction > 0 else period - offset) + steps
+        phase %= period
+        if phase < length - 1:
+            self.direction = 1
+            return self.first + phase
+        self.direction = -1
+        return self.first + period - phase
+
+    def _tick(self):
+        due = int((time.monotonic() - self._start_time) * self.fps)
+        steps = due - self._frames
+        if steps <= 0:
+            return
+        # 上一帧显示得太慢时，跳过已经过期的帧
+        self.dropped += steps - 1
+        self._frames = due
+        self.position = self.step(self.position, steps)
+        self.frame_changed.emit(self.position)
+
+        now = time.monotonic()
+        self._shown.append(now)
+        while now - self._shown[0] > 1.0:
+            self._shown.popleft()
+        span = now - self._shown[0]
+        self.measured_fps = (len(self._shown) - 1) / span if span > 0 else 0.0
@@ -0,0 +1,69 @@
+import threading
+from collections import OrderedDict
+
+
+class SliceCache:
+    """Thread-safe LRU cache for image slices, bounded by a total byte budget."""
+
+    def __init__(self, max_bytes=1024 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self.current_bytes = 0
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __contains__(self, key):
+        with self._lock:
+            return key in self._items
+
+    def __len__(self):
+        with self._lock:
+            return len(self._items)
+
+    def get(self, key):
+        """Return the cached slice and mark it as most recently used, or None."""
+        with self._lock:
+            value = self._items.get(key)
+            if value is not None:
+                self._items.move_to_end(key)
+            return value
+
+    def put(self, key, value):
+        """Store a slice, evicting the least recently used ones beyond the byte budget."""
+        nbytes = getattr(value, 'nbytes', 0)
+        with self._lock:
+            if key in self._items:
+                self.current_bytes -= getattr(self._items.pop(key), 'nbytes', 0)
+
+            # 单个切片超过预算时不缓存
+            if nbytes > self.max_bytes:
+                return
+
+            self._items[key] = value
+            self.current_bytes += nbytes
+            self._evict()
+
+    def discard(self, key):
+        with self._lock:
+            if key in self._items:
+                self.current_bytes -= getattr(self._items.pop(key), 'nbytes', 0)
+
+    def discard_if(self, predicate):
+        """Drop every entry whose key matches `predicate(key)`."""
+        with self._lock:
+            for key in [key for key in self._items if predicate(key)]:
+                self.current_bytes -= getattr(self._items.pop(key), 'nbytes', 0)
+
+    def clear(self):
+        with self._lock:
+            self._items.clear()
+            self.current_bytes = 0
+
+    def set_max_bytes(self, max_bytes):
+        with self._lock:
+            self.max_bytes = max_bytes
+            self._evict()
+
+    def _evict(self):
+        while self.current_bytes > self.max_bytes and self._items:
+            _, evicted = self._items.popitem(last=False)
+            self.current_bytes -= getattr(evicted, 'nbytes', 0)
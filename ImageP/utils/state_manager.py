@@ -6,6 +6,8 @@ class StateManager:
     image_data = None
     clear_previous_lines = None
     image_with_rect_instance = None
+    main_window = None
+    folder_navigator = None
 
     def __new__(cls):
         if cls._instance is None:
@@ -42,6 +44,20 @@ class StateManager:
     def get_image_with_rect_instance(self):
         return self.image_with_rect_instance
 
+    # 主窗口（用于在状态栏显示进度）
+    def set_main_window(self, main_window):
+        self.main_window = main_window
+
+    def get_main_window(self):
+        return self.main_window
+
+    # File > Open Next：当前文件夹中的文件顺序和打开参数
+    def set_folder_navigator(self, navigator):
+        self.folder_navigator = navigator
+
+    def get_folder_navigator(self):
+        return self.folder_navigator
+
 
 # 方便的导出单例实例
 state_manager = StateManager()
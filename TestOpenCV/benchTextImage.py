@@ -0,0 +1,54 @@
+import os
+import sys
+import time
+import tempfile
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from ImageP.imgio.text_reader import read_text_image
+
+# Benchmark of Import > Text Image on a 4096x4096 tab separated export, against
+# a line-by-line Python parser, np.loadtxt and a single np.fromstring over the file.
+
+
+def naive_read(file_path):
+    with open(file_path, 'r') as f:
+        return np.array([[float(value) for value in line.split()] for line in f], np.float32)
+
+
+def timed(name, read, file_path, repeat=3):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        image = read(file_path)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    print(f"  {name:<22} {best:6.2f} s  {image.shape} {image.dtype}")
+    return best, image
+
+
+def benchmark(file_path, size):
+    print(f"{os.path.basename(file_path)} ({os.path.getsize(file_path) / 1e6:.0f} MB)")
+    naive, expected = timed("line by line (Python)", naive_read, file_path, repeat=1)
+    timed("np.loadtxt", lambda path: np.loadtxt(path, dtype=np.float32), file_path, repeat=1)
+    timed("np.fromstring", lambda path: np.fromstring(open(path, 'rb').read(), sep=' ').reshape(size, size),
+          file_path, repeat=1)
+    fast, image = timed("read_text_image", read_text_image, file_path)
+    assert np.array_equal(image.astype(np.float32), expected)
+    print(f"  speedup over line by line: {naive / fast:.1f}x")
+
+
+def main(size=4096):
+    rng = np.random.default_rng(0)
+    with tempfile.TemporaryDirectory() as folder:
+        integers = os.path.join(folder, 'integers.txt')
+        np.savetxt(integers, rng.integers(0, 65536, (size, size)), fmt='%d', delimiter='\t')
+        benchmark(integers, size)
+
+        reals = os.path.join(folder, 'reals.txt')
+        np.savetxt(reals, rng.random((size, size)) * 1000, fmt='%.4f', delimiter='\t')
+        benchmark(reals, size)
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 4096)
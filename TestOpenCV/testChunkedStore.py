@@ -0,0 +1,54 @@
+import os
+import sys
+import tempfile
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from ImageP.imgio.chunked_store import ChunkedStack, has_chunked_store, write_chunked_store
+
+# write_chunked_store / ChunkedStack with chunks that do not divide the stack evenly.
+
+CHUNK_SHAPE = (4, 16, 32)
+
+
+def make_store(directory, stack):
+    store_path = os.path.join(directory, 'store')
+    write_chunked_store(stack, store_path, CHUNK_SHAPE, workers=2)
+    assert has_chunked_store(store_path)
+    return ChunkedStack(store_path)
+
+
+def test_slices_and_orthogonal_views():
+    stack = np.random.default_rng(0).integers(0, 60000, (10, 40, 70)).astype('>u2')
+    with tempfile.TemporaryDirectory() as directory:
+        chunked = make_store(directory, stack)
+        # 保存为本机字节序
+        assert chunked.shape == stack.shape and chunked.dtype == np.dtype(np.uint16)
+        for layer in (0, 3, 4, 9, -1):
+            assert np.array_equal(chunked[layer], stack[layer])
+        assert np.array_equal(chunked[:, 17, :], stack[:, 17, :])
+        assert np.array_equal(chunked[:, :, 65], stack[:, :, 65])
+        assert np.array_equal(chunked[2:9, 10:35, 30:66], stack[2:9, 10:35, 30:66])
+        assert np.array_equal(chunked[::3], stack[::3])
+        assert np.array_equal(chunked.read_region((3, 5), (15, 17), (31, 33)), stack[3:5, 15:17, 31:33])
+
+
+def test_color_and_modified_slices():
+    stack = np.random.default_rng(1).integers(0, 256, (6, 20, 40, 3)).astype(np.uint8)
+    with tempfile.TemporaryDirectory() as directory:
+        chunked = make_store(directory, stack)
+        assert np.array_equal(chunked[5], stack[5])
+        assert np.array_equal(chunked[:, 3, :], stack[:, 3, :])
+
+        # 修改过的层优先于块中的数据
+        chunked[2] = 7
+        expected = stack.copy()
+        expected[2] = 7
+        assert np.array_equal(chunked[2], expected[2])
+        assert np.array_equal(chunked[:, 3, :], expected[:, 3, :])
+
+
+if __name__ == "__main__":
+    test_slices_and_orthogonal_views()
+    test_color_and_modified_slices()
+    print("Chunked store tests passed")
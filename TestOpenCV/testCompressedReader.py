@@ -0,0 +1,145 @@
+import gzip
+import os
+import sys
+import tempfile
+import numpy as np
+import zstandard
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+import ImageP.imgio.compressed as compressed
+import ImageP.imgio.index_cache as index_cache
+from ImageP.imgio.compressed import CompressedReader
+
+# CompressedReader against .gz files written by the gzip module.
+
+
+def make_data(size=1024 * 1024 + 77):
+    return np.random.default_rng(0).integers(0, 16, size, dtype=np.uint8).tobytes()
+
+
+def scanned_reader(file_path):
+    reader = CompressedReader(file_path)
+    for _ in reader.scan():
+        pass
+    return reader
+
+
+def test_recompress_single_stream():
+    data = make_data()
+    block_size = compressed.BLOCK_SIZE
+    compressed.BLOCK_SIZE = 100 * 1000
+    try:
+        with tempfile.TemporaryDirectory() as directory:
+            index_cache.CACHE_ROOT = os.path.join(directory, 'cache')
+            path = os.path.join(directory, 'data.raw.gz')
+            with open(path, 'wb') as f:
+                f.write(gzip.compress(data))
+
+            reader = scanned_reader(path)
+            assert reader.units == [(0, 0), (len(data), os.path.getsize(path))] and reader.slow_seeks
+            reader.recompress()
+            assert not reader.slow_seeks
+            assert [u_pos for u_pos, _ in reader.units] == list(range(0, len(data), compressed.BLOCK_SIZE)) + [len(data)]
+            assert bytes(reader.read_at(500 * 1000 + 3, 10)) == data[500 * 1000 + 3:500 * 1000 + 13]
+
+            # 仍是普通的 gzip 文件；下次打开时直接使用保存的单元
+            with gzip.open(path, 'rb') as f:
+                assert f.read() == data
+            reader = CompressedReader(path)
+            assert reader.complete and len(reader.units) == 12
+            assert bytes(reader.read_at(len(data) - 20, 100)) == data[-20:]
+    finally:
+        compressed.BLOCK_SIZE = block_size
+
+
+def check_random_reads(reader, data, count=40):
+    rng = np.random.default_rng(1)
+    for offset in rng.integers(0, len(data) + 100, count):
+        size = int(rng.integers(1, 50000))
+        assert bytes(reader.read_at(int(offset), size)) == data[offset:offset + size]
+
+
+def test_multi_member_gzip():
+    data = make_data()
+    with tempfile.TemporaryDirectory() as directory:
+        index_cache.CACHE_ROOT = os.path.join(directory, 'cache')
+        path = os.path.join(directory, 'members.raw.gz')
+        step = 300 * 1000
+        with open(path, 'wb') as f:
+            for start in range(0, len(data), step):
+                f.write(gzip.compress(data[start:start + step]))
+
+        reader = scanned_reader(path)
+        assert [u_pos for u_pos, _ in reader.units] == [0, step, 2 * step, 3 * step, len(data)]
+        assert reader.size == len(data) and not reader.slow_seeks
+        check_random_reads(reader, data)
+        reader.close()
+
+        # 下次打开时直接使用保存的索引
+        reader = CompressedReader(path)
+        assert reader.complete and len(reader.units) == 5
+        check_random_reads(reader, data)
+
+
+def test_single_member_checkpoints():
+    data = make_data()
+    spacing = compressed.CHECKPOINT_SPACING
+    compressed.CHECKPOINT_SPACING = 100 * 1000
+    try:
+        with tempfile.TemporaryDirectory() as directory:
+            index_cache.CACHE_ROOT = os.path.join(directory, 'cache')
+            path = os.path.join(directory, 'single.raw.gz')
+            with open(path, 'wb') as f:
+                f.write(gzip.compress(data))
+
+            reader = scanned_reader(path)
+            assert len(reader._checkpoints) >= 5
+            check_random_reads(reader, data)
+            # 顺序读取从上一次结束的位置继续
+            parts = [bytes(reader.read_at(offset, 4096)) for offset in range(0, len(data), 4096)]
+            assert b''.join(parts) == data
+    finally:
+        compressed.CHECKPOINT_SPACING = spacing
+
+
+def test_zstd_frames():
+    data = make_data()
+    with tempfile.TemporaryDirectory() as directory:
+        index_cache.CACHE_ROOT = os.path.join(directory, 'cache')
+        path = os.path.join(directory, 'frames.raw.zst')
+        compressor = zstandard.ZstdCompressor()
+        with open(path, 'wb') as f:
+            for start in range(0, len(data), 250 * 1000):
+                f.write(compressor.compress(data[start:start + 250 * 1000]))
+
+        reader = CompressedReader(path)
+        # 没有扫描过时从文件开头顺序解压到需要的位置
+        assert bytes(reader.read_at(900 * 1000, 100)) == data[900 * 1000:900 * 1000 + 100]
+        assert not reader.complete
+        for _ in reader.scan():
+            pass
+        assert len(reader.units) == 6
+        check_random_reads(reader, data)
+
+
+def test_truncated_file():
+    data = make_data()
+    with tempfile.TemporaryDirectory() as directory:
+        index_cache.CACHE_ROOT = os.path.join(directory, 'cache')
+        path = os.path.join(directory, 'truncated.raw.gz')
+        compressed_data = gzip.compress(data)
+        with open(path, 'wb') as f:
+            f.write(compressed_data[:len(compressed_data) // 2])
+
+        reader = scanned_reader(path)
+        assert 0 < reader.size < len(data)
+        assert bytes(reader.read_at(0, len(data))) == data[:reader.size]
+
+
+if __name__ == "__main__":
+    test_multi_member_gzip()
+    test_single_member_checkpoints()
+    test_zstd_frames()
+    test_truncated_file()
+    test_recompress_single_stream()
+    print("CompressedReader tests passed")
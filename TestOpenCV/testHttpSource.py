@@ -0,0 +1,138 @@
+import os
+import re
+import sys
+import tempfile
+import threading
+from functools import partial
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+import ImageP.imgio.index_cache as index_cache
+from ImageP.imgio.http_source import HttpByteSource
+
+# HttpByteSource against two local http.server instances: one that answers Range
+# requests with 206 Partial Content, and the stock SimpleHTTPRequestHandler, which
+# ignores Range and always sends the whole file.
+
+BLOCK_SIZE = 64 * 1024
+
+
+class PlainHandler(SimpleHTTPRequestHandler):
+    requests = []  # 每个 GET 请求的 Range 头（没有时为 None）
+
+    def do_GET(self):
+        self.requests.append(self.headers.get('Range'))
+        super().do_GET()
+
+    def log_message(self, *args):
+        pass
+
+
+class RangeHandler(PlainHandler):
+    requests = []
+
+    def do_GET(self):
+        match = re.match(r'bytes=(\d+)-(\d+)$', self.headers.get('Range') or '')
+        if match is None:
+            return super().do_GET()
+        self.requests.append(self.headers['Range'])
+        with open(self.translate_path(self.path), 'rb') as f:
+            data = f.read()
+        start, end = int(match.group(1)), min(int(match.group(2)), len(data) - 1)
+        self.send_response(206)
+        self.send_header('Content-Range', f"bytes {start}-{end}/{len(data)}")
+        self.send_header('Content-Length', str(end - start + 1))
+        self.end_headers()
+        self.wfile.write(data[start:end + 1])
+
+
+def serve(handler, directory):
+    server = ThreadingHTTPServer(('127.0.0.1', 0), partial(handler, directory=directory))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_port}/data.bin"
+
+
+def make_data(directory, size=10 * BLOCK_SIZE + 123):
+    data = np.random.default_rng(0).integers(0, 256, size, dtype=np.uint8).tobytes()
+    with open(os.path.join(directory, 'data.bin'), 'wb') as f:
+        f.write(data)
+    return data
+
+
+RANGES = [(BLOCK_SIZE + 10, 100), (3 * BLOCK_SIZE - 5, 2 * BLOCK_SIZE + 10)]  # 第 1 块，第 2 到第 5 块
+
+
+def check_reads(source, data):
+    for offset, size in RANGES:
+        assert bytes(source.read_at(offset, size)) == data[offset:offset + size]
+
+
+def test_range_server():
+    with tempfile.TemporaryDirectory() as directory:
+        index_cache.CACHE_ROOT = os.path.join(directory, 'cache')
+        data = make_data(directory)
+        server, url = serve(RangeHandler, directory)
+        try:
+            source = HttpByteSource(url, block_size=BLOCK_SIZE)
+            check_reads(source, data)
+            assert source.supports_range
+            # 只请求了用到的块，没有下载整个文件
+            assert RangeHandler.requests == [f"bytes={BLOCK_SIZE}-{2 * BLOCK_SIZE - 1}",
+                                             f"bytes={2 * BLOCK_SIZE}-{6 * BLOCK_SIZE - 1}"]
+            assert bytes(source.read_at(len(data) - 50, 100)) == data[-50:]
+
+            # 再次打开时从缓存读取
+            count = len(RangeHandler.requests)
+            check_reads(HttpByteSource(url, block_size=BLOCK_SIZE), data)
+            assert len(RangeHandler.requests) == count
+        finally:
+            server.shutdown()
+
+
+def test_server_without_range():
+    with tempfile.TemporaryDirectory() as directory:
+        index_cache.CACHE_ROOT = os.path.join(directory, 'cache')
+        data = make_data(directory)
+        server, url = serve(PlainHandler, directory)
+        try:
+            source = HttpByteSource(url, block_size=BLOCK_SIZE)
+            # 服务器返回整个文件：同一次读取中的其他段不再发请求
+            blocks = source.fetch_blocks([1, 3, 4, 7])
+            assert PlainHandler.requests == [f"bytes={BLOCK_SIZE}-{2 * BLOCK_SIZE - 1}"]
+            assert sorted(blocks) == [1, 3, 4, 7]
+            assert blocks[7] == data[7 * BLOCK_SIZE:8 * BLOCK_SIZE]
+            assert source.supports_range is False
+
+            # 整个文件都已逐块写入缓存
+            for block in range(source.block_count):
+                with open(source.block_path(block), 'rb') as f:
+                    assert f.read() == data[block * BLOCK_SIZE:(block + 1) * BLOCK_SIZE]
+            check_reads(source, data)
+            assert len(PlainHandler.requests) == 1
+        finally:
+            server.shutdown()
+
+
+def test_small_reads_from_last_block():
+    with tempfile.TemporaryDirectory() as directory:
+        index_cache.CACHE_ROOT = os.path.join(directory, 'cache')
+        data = make_data(directory)
+        server, url = serve(RangeHandler, directory)
+        try:
+            source = HttpByteSource(url, block_size=BLOCK_SIZE)
+            assert bytes(source.read_at(3 * BLOCK_SIZE + 8, 16)) == data[3 * BLOCK_SIZE + 8:3 * BLOCK_SIZE + 24]
+            # 同一块中的后续读取直接使用内存中的块，不再读取块文件
+            os.remove(source.block_path(3))
+            for offset in range(3 * BLOCK_SIZE, 4 * BLOCK_SIZE, 4096):
+                assert bytes(source.read_at(offset, 12)) == data[offset:offset + 12]
+            assert not os.path.exists(source.block_path(3))
+        finally:
+            server.shutdown()
+
+
+if __name__ == "__main__":
+    test_range_server()
+    test_server_without_range()
+    test_small_reads_from_last_block()
+    print("HttpByteSource tests passed")
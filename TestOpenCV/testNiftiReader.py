@@ -0,0 +1,107 @@
+import gzip
+import os
+import sys
+import tempfile
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+import ImageP.imgio.index_cache as index_cache
+from ImageP.imgio.nifti_reader import NiftiStack, open_nifti
+
+# open_nifti against NIfTI-1 files written here field by field.
+
+NIFTI_DATATYPES = {'u1': 2, 'i2': 4, 'f4': 16}
+
+
+def nifti_bytes(volume, slope=0.0, inter=0.0, byte_order='<', magic=b'n+1'):
+    """A NIfTI-1 file (or header only, for magic 'ni1') holding a (z, y, x) volume."""
+    header = bytearray(348)
+    dtype = np.dtype(volume.dtype).newbyteorder(byte_order)
+
+    def put(offset, type_code, values):
+        values = np.asarray(values, np.dtype(type_code).newbyteorder(byte_order)).tobytes()
+        header[offset:offset + len(values)] = values
+
+    put(0, 'i4', 348)
+    z, y, x = volume.shape
+    put(40, 'i2', [3, x, y, z, 1, 1, 1, 1])
+    put(70, 'i2', [NIFTI_DATATYPES[dtype.str[1:]], dtype.itemsize * 8])
+    put(76, 'f4', [1] * 8)
+    put(108, 'f4', 352 if magic == b'n+1' else 0)
+    put(112, 'f4', [slope, inter])
+    header[344:348] = magic + b'\0'
+    if magic != b'n+1':
+        return bytes(header)
+    return bytes(header) + b'\0' * 4 + volume.astype(dtype).tobytes()
+
+
+def write(path, data):
+    with open(path, 'wb') as f:
+        f.write(data)
+    return path
+
+
+def read_all(path):
+    stack, fill = open_nifti(path)
+    for _ in fill or ():
+        pass
+    try:
+        return stack, np.stack([stack[i] for i in range(stack.shape[0])])
+    finally:
+        if isinstance(stack, NiftiStack):
+            stack.close()
+
+
+def make_volume(dtype=np.int16):
+    return np.random.default_rng(0).integers(-100 if dtype != np.uint8 else 0, 100, (6, 20, 30)).astype(dtype)
+
+
+def test_unscaled_memory_mapped():
+    volume = make_volume()
+    with tempfile.TemporaryDirectory() as directory:
+        index_cache.CACHE_ROOT = os.path.join(directory, 'cache')
+        # scl_slope 为 0 和 1 都表示不缩放，y 轴上下翻转
+        for slope in (0.0, 1.0):
+            path = write(os.path.join(directory, f"slope{slope}.nii"), nifti_bytes(volume, slope))
+            stack, image = read_all(path)
+            assert isinstance(stack, np.memmap) and stack.dtype == np.int16
+            assert np.array_equal(image, volume[:, ::-1])
+
+
+def test_scaled():
+    volume = make_volume()
+    expected = (volume * np.float32(2.5) - np.float32(10))[:, ::-1]
+    with tempfile.TemporaryDirectory() as directory:
+        index_cache.CACHE_ROOT = os.path.join(directory, 'cache')
+        for byte_order in ('<', '>'):
+            path = write(os.path.join(directory, f"scaled{byte_order == '>'}.nii"),
+                         nifti_bytes(volume, 2.5, -10.0, byte_order))
+            stack, image = read_all(path)
+            assert isinstance(stack, NiftiStack) and image.dtype == np.float32
+            assert np.allclose(image, expected)
+
+        # .nii.gz 逐层解压后再缩放
+        path = write(os.path.join(directory, 'scaled.nii.gz'), gzip.compress(nifti_bytes(volume, 2.5, -10.0)))
+        stack, image = read_all(path)
+        assert np.allclose(image, expected)
+        stack, image = read_all(path)
+        assert np.allclose(image, expected)
+
+
+def test_header_and_image_pair():
+    volume = make_volume(np.uint8)
+    with tempfile.TemporaryDirectory() as directory:
+        index_cache.CACHE_ROOT = os.path.join(directory, 'cache')
+        write(os.path.join(directory, 'pair.hdr'), nifti_bytes(volume, 0.5, 1.0, magic=b'ni1'))
+        write(os.path.join(directory, 'pair.img'), volume.tobytes())
+        # 选择 .hdr 或 .img 都可以打开
+        for name in ('pair.hdr', 'pair.img'):
+            stack, image = read_all(os.path.join(directory, name))
+            assert np.allclose(image, (volume * np.float32(0.5) + 1)[:, ::-1])
+
+
+if __name__ == "__main__":
+    test_unscaled_memory_mapped()
+    test_scaled()
+    test_header_and_image_pair()
+    print("NIfTI reader tests passed")
@@ -1,13 +1,37 @@
 import sys
-from PyQt5.QtWidgets import QApplication, QVBoxLayout, QLabel, QWidget, QSlider, QPushButton, QHBoxLayout
+from PyQt5.QtWidgets import QApplication, QVBoxLayout, QLabel, QWidget, QSlider, QPushButton, QHBoxLayout, QMessageBox, QSpinBox
 from PyQt5.QtCore import Qt, QTimer
 from pyqtgraph.Qt import QtCore, QtGui, QtWidgets
 import pyqtgraph as pg
 import numpy as np
 import os  # Import os to work with file paths
 from ImageP.utils.state_manager import state_manager
+from ImageP.imgio.raw_reader import open_raw_progressive, open_compressed_raw, read_raw_into
+from ImageP.imgio.compressed import CompressedReader, compression_kind
+from ImageP.imgio.chunked_store import ChunkedStack, chunked_store_path, has_chunked_store, convert_after_fill
+from ImageP.imgio.image_sequence import first_sequence_image, read_sequence_into, read_stack_list
+from ImageP.imgio.pixel_formats import decoded_dtype, decoded_shape, to_native_byte_order, native_copy
+from ImageP.imgio.virtual_stack import VirtualStack, RawVirtualStack, is_disk_backed
+from ImageP.imgio.prefetch import SlicePrefetcher
+from ImageP.imgio.video_reader import VideoStack
+from ImageP.imgio.stack_loader import ParallelStackLoader, StackLoaderThread
+from ImageP.imgio.stack_writer import RecompressThread, StackSaverThread
+from ImageP.imgio.snapshot import StackSnapshot
+from ImageP.imgio.folder_navigator import FolderNavigator, file_extension
+from ImageP.utils.file_utils import list_folder_files
+from ImageP.utils.slice_cache import SliceCache
+from ImageP.utils.playback import PlaybackEngine
+from ImageP.imgproc.pyramid import ImagePyramid, needs_pyramid, level_for_zoom
+from ImageP.imgproc.display import display_levels, render_8bit
+from ImageP.imgproc.orientation import default_orientation, orientation_transform
+from ImageP.imgproc.sanitize import SliceSanitizer
+from ImageP.imgproc.histogram import StackHistogramThread, histogram_cache, histogram_of
+from ImageP.imgio.index_cache import source_key
+from concurrent.futures import CancelledError, ThreadPoolExecutor
 import subprocess
 
+declined_recompress = set()  # 本次会话中不再询问是否重新压缩的文件
+
 
 class CustomEllipseItem(QtWidgets.QGraphicsEllipseItem):
     def __init__(self, *args, **kwargs):
@@ -569,14 +593,15 @@ class CustomViewBox(pg.ViewBox):
             return
 
         if self.shape_type == "polygon":
-            polygon = self.shape_item.polygon()
-            bounding_rect = polygon.boundingRect()
-            x1, y1 = int(bounding_rect.left()), int(bounding_rect.top())
-            x2, y2 = int(bounding_rect.right()), int(bounding_rect.bottom())
+            rect = self.shape_item.polygon().boundingRect()
         else:
             rect = self.shape_item.rect()
-            x1, y1 = int(rect.left()), int(rect.top())
-            x2, y2 = int(rect.right()), int(rect.bottom())
+
+        # 形状在视图坐标中，经过图像项的变换（方向和金字塔的缩放）换算为像素的行和列
+        rect = self.image_item.mapRectFromParent(rect)
+        scale = self.image_data.shape[0] / self.image_item.image.shape[0]
+        y1, y2 = int(rect.left() * scale), int(rect.right() * scale)
+        x1, x2 = int(rect.top() * scale), int(rect.bottom() * scale)
 
         x1, x2 = max(0, x1), min(self.image_data.shape[1], x2)
         y1, y2 = max(0, y1), min(self.image_data.shape[0], y2)
@@ -609,10 +634,15 @@ class CustomViewBox(pg.ViewBox):
         if self.image_data is not None:
             inverted_image = 255 - self.image_data  # 简单地取反处理，假设是灰度图像
             self.image_data = inverted_image
+            # 显示的是完整分辨率的图像：去掉变换中金字塔的缩放，保留方向
+            scale = self.image_data.shape[0] / self.image_item.image.shape[0]
+            self.image_item.setTransform(QtGui.QTransform.fromScale(1 / scale, 1 / scale) * self.image_item.transform())
             self.image_item.setImage(inverted_image)
 
 
 class ImageWithRect(QWidget):
+    pyramid_ready = QtCore.pyqtSignal(object)  # key of the slice whose pyramid was built
+
     def __init__(self, file_path, is_3d = False):
         super().__init__()
 
@@ -640,8 +670,45 @@ class ImageWithRect(QWidget):
         self.slider = None
         self.is_3d = is_3d
         self.is_playing = False  # Track the play/pause state
-        self.timer = QTimer(self)
-        self.timer.timeout.connect(self.play_next_layer)
+        # 按目标帧率播放，显示跟不上时跳帧（帧率在滑块旁设置，范围和来回播放在 Animation Options 中设置）
+        self.playback = PlaybackEngine(self)
+        self.playback.frame_changed.connect(self.play_next_layer)
+
+        self.slice_cache = None  # 磁盘图像的切片缓存，与预取线程共享
+        self.prefetcher = None
+        self.prefetch_depth = 8  # Number of slices loaded ahead while scrubbing or playing
+        self.stack_loader = None  # 后台并行读取文件夹中的文件
+        self.loader_thread = None  # 在后台线程中打开图像
+        self.source_paths = None  # 每层来自的文件（Stack From List）
+        self.saver_thread = None  # 在后台线程中保存图像
+        self.recompress_thread = None  # 在后台线程中重新压缩 .gz / .zst 文件
+        self.saved_path = None  # 上次保存的 TIFF 文件，File > Save 直接覆盖它
+        self.snapshot = None  # 打开时的图像，File > Revert 恢复到它
+        self.open_file = None  # 用相同的参数打开同一文件夹中的其他文件（File > Open Next）
+        self.sanitizer = None  # 显示和处理时逐层替换 NaN 和无穷大，记录每层是否含有它们
+
+        # 大图像的多分辨率金字塔：缩小显示时使用降采样的一级，在后台线程中建立
+        self.pyramid_cache = SliceCache(512 * 1024 * 1024)
+        self.pyramid_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='pyramid')
+        self.pyramid_pending = set()
+        self.display_image = None  # 当前层完整分辨率的显示图像
+        self.displayed_image = None  # 实际交给 ImageItem 的图像（某一级金字塔）
+        self.display_key = None
+        self.display_level = 0
+        self.pyramid_ready.connect(self.on_pyramid_ready)
+
+        # 显示方向（旋转和翻转）作为图像项的变换，不旋转像素数据
+        self.orientation = default_orientation()
+
+        # 转换为 8 位的显示图像的缓存，滑动浏览时不再每次重新计算显示范围和转换
+        self.display_levels = None
+        self.levels_pending = False  # 显示范围按还没读入的第一层计算，第一层读入后重新计算
+        self.render_cache = SliceCache(256 * 1024 * 1024)
+
+        # 整个栈的直方图在后台线程中逐步统计，浏览各层时直方图面板保持不变
+        self.histogram_thread = None
+        self.histogram_range = None  # 浮点图像统计直方图的范围
+        self.view.sigRangeChanged.connect(self.update_display_level)
 
         if self.is_3d:
             self.setup_ui()
@@ -655,6 +722,21 @@ class ImageWithRect(QWidget):
         # 调用 state_manager 将图像设置为 None
         state_manager.set_image_data(None)
 
+        if self.prefetcher:
+            self.prefetcher.shutdown()
+        if self.stack_loader:
+            self.stack_loader.cancel()
+        self.cancel_loading()
+        self.stop_stack_histogram()
+        if self.recompress_thread is not None and self.recompress_thread.isRunning():
+            self.recompress_thread.requestInterruption()
+            self.recompress_thread.wait()
+        self.playback.stop()
+        self.pyramid_executor.shutdown(wait=False, cancel_futures=True)
+        # 关闭虚拟栈读取的文件和视频解码器
+        if isinstance(getattr(self, 'image_data', None), VirtualStack):
+            self.image_data.close()
+
         # 调用父类的 closeEvent 来确保窗口正常关闭
         super().closeEvent(event)
 
@@ -687,6 +769,14 @@ class ImageWithRect(QWidget):
         hbox.addWidget(self.slider)
         hbox.addWidget(self.next_button)
 
+        # Target frame rate of playback
+        self.fps_spin = QSpinBox()
+        self.fps_spin.setRange(1, 240)
+        self.fps_spin.setSuffix(" fps")
+        self.fps_spin.setValue(int(self.playback.fps))
+        self.fps_spin.valueChanged.connect(self.playback.set_fps)
+        hbox.addWidget(self.fps_spin)
+
         # Add to the main layout
         self.layout.addLayout(hbox)
 
@@ -699,24 +789,8 @@ class ImageWithRect(QWidget):
         hbox.addWidget(self.render_button)
 
     def get_numpy_dtype(self, image_type):
-        dtype_map = {
-            "8-bit": np.uint8,
-            "16-bit Signed": np.int16,
-            "16-bit Unsigned": np.uint16,
-            "32-bit Signed": np.int32,
-            "32-bit Unsigned": np.uint32,
-            "32-bit Real": np.float32,
-            "64-bit Real": np.float64,
-            "24-bit RGB": np.uint8,  # 通常RGB是每个通道8位，所以返回np.uint8
-            "24-bit RGB Planar": np.uint8,  # 和24-bit RGB类似
-            "24-bit BGR": np.uint8,  # 和RGB相似，只是通道顺序不同
-            "24-bit Integer": np.int32,
-            "32-bit ARGB": np.uint8,  # ARGB通常每个通道8位
-            "32-bit ABGR": np.uint8,  # ABGR和ARGB类似
-            "1-bit Bitmap": np.bool_  # 1位图像可以用布尔值表示
-        }
-
-        return dtype_map.get(image_type, None)  # 如果没有匹配，返回None
+        """Return the dtype of the decoded image, e.g. np.uint8 for the channels of RGB types."""
+        return decoded_dtype(image_type).newbyteorder('=').type
 
     def display_2d_image(self, file_path, shape, params):
 
@@ -729,20 +803,19 @@ class ImageWithRect(QWidget):
 
         """Dynamically load and display a 2D image."""
         image = self.load_2d_image(file_path, shape)
-        image = np.rot90(image, k=3)
         state_manager.set_image_data(image)
+        self.snapshot = StackSnapshot(image)
 
-        self.img = pg.ImageItem(image)
+        self.img = pg.ImageItem()
         self.view.setImageData(image, self.img)
 
         self.plot_item.addItem(self.img)
+        self.display_levels = display_levels(image)
+        self.show_image(image, 0)
         self.setWindowTitle(os.path.basename(file_path))  # Set window title to file name
 
         # Add histogram LUT item for the right-side panel
-        if self.histogram_lut is None:
-            self.histogram_lut = pg.HistogramLUTItem()
-            self.histogram_lut.setImageItem(self.img)
-            self.graphics_widget.addItem(self.histogram_lut)
+        self.setup_histogram_lut(image)
 
         # Save the image data to state_manager
         state_manager.set_image_data(image)
@@ -778,36 +851,121 @@ class ImageWithRect(QWidget):
         for key, value in params.items():
             print(f"  {key}: {value}")
 
-        self.image_data = self.load_3d_image(file_path, shape, params)
+        image_data = self.load_3d_image(file_path, shape, params)
+        self.display_stack(image_data, os.path.basename(file_path))
+
+    def load_folder_stack(self, files, shape, params):
+        """Load every file in parallel into one preallocated stack, showing the slices as they arrive."""
+        layers, height, width = shape
+        image_type = params['image_type']
+        dtype = decoded_dtype(image_type).newbyteorder('=')
+        stack = np.zeros((len(files) * layers,) + decoded_shape(image_type, height, width), dtype=dtype)
+
+        def load_file(file_path, out):
+            # 无效值在显示时逐层替换，读取时不再清理
+            read_raw_into(file_path, out, image_type, params['little_endian'], params.get('offset', 0), params.get('gap', 0))
+
+        self.load_stack_parallel(stack, files, load_file, layers)
+
+    def load_image_sequence(self, files, params):
+        """Decode an image sequence on a thread pool straight into one preallocated (z, y, x) stack."""
+        scale = params.get('scale', 100) / 100
+        first = first_sequence_image(files[0], scale)
+        stack = np.zeros((len(files),) + first.shape, dtype=first.dtype)
+
+        self.load_stack_parallel(stack, files, reuse_first_image(files[0], first, scale))
+
+    def load_stack_from_list(self, list_path, files):
+        """Load the images listed in a text file into one stack, remembering the file of every slice."""
+        first = first_sequence_image(files[0])
+        stack = np.zeros((len(files),) + first.shape, dtype=first.dtype)
+
+        # 每层对应的文件，重新读取单层时不需要再解析列表
+        self.source_paths = files
+        self.load_stack_parallel(stack, files, reuse_first_image(files[0], first), name=os.path.basename(list_path))
+
+    def reload_slice(self, layer):
+        """Read one slice again from its source file, e.g. after the file changed on disk (Image > Stacks > Reload Slice).
+
+        Other slices listed with the same file are updated too.
+        """
+        if self.source_paths is None:
+            return
+        read_sequence_into(self.source_paths[layer], self.image_data[layer:layer + 1])
+        self.invalidate_slice_cache()
+        for other, path in enumerate(self.source_paths):
+            if path == self.source_paths[layer]:
+                if other != layer:
+                    self.image_data[other] = self.image_data[layer]
+                self.on_slices_loaded(other, 1)
+
+    def load_stack_parallel(self, stack, files, load_file, slices_per_file=1, name=None):
+        """Show a preallocated stack right away and fill it from `files` on a thread pool."""
+        name = name or os.path.basename(os.path.dirname(files[0]))
+        self.stack_loader = ParallelStackLoader(stack, files, load_file, slices_per_file)
+        self.display_stack(stack, f"{name} ({len(files)} files)")
+
+        self.stack_loader.slices_loaded.connect(self.on_slices_loaded)
+        self.stack_loader.progress.connect(
+            lambda loaded, total: show_status_message(f"Loading {name}: {loaded}/{total} files"))
+        self.stack_loader.finished.connect(
+            lambda: show_status_message(f"Loaded {len(files)} files from {name}"))
+        self.stack_loader.finished.connect(self.start_stack_histogram)
+        self.stack_loader.start()
+
+    def on_slices_loaded(self, first, count):
+        """Refresh the display when the slice currently shown has just been loaded."""
+        # 这些层之前显示的是还没读入的数据
+        self.sanitizer.invalidate(first, count)
+        self.pyramid_cache.discard_if(lambda key: first <= key[0] < first + count)
+        self.render_cache.discard_if(lambda key: first <= key[0][0] < first + count)
+        if self.levels_pending and first == 0:
+            self.update_levels_from_first_slice()
+        current = self.slider.value() if self.slider else 0
+        if first <= current < first + count:
+            if self.is_3d:
+                self.update_image_layer(current)
+            else:
+                self.show_image(self.get_image_layer(0), 0)
+
+    def display_stack(self, image_data, title, first_layer=None):
+        """Display a (z, y, x) stack that is already loaded, mapped or still being filled in."""
+        self.image_data = image_data
 
         if self.image_data.shape[0] > 1:
             self.is_3d = True
+            if self.slider is None:
+                # 打开之前不知道层数的图像（TIFF 等），在这里才创建滑块
+                self.setup_ui()
 
-        # 清理 3D 图像数据，确保没有无效值
-        self.image_data = self.clean_image_data(self.image_data)
+        # NaN 和无穷大不再对整个栈清理（一次完整的拷贝），而是在显示和处理某一层时才替换
+        self.sanitizer = SliceSanitizer(self.image_data)
+        self.setup_prefetch()
+        self.snapshot = StackSnapshot(self.image_data)
 
         # Save the 3D image data to state_manager
         state_manager.set_image_data(self.image_data)  # 这里将3D图像保存到state_manager
 
         # Initialize the image layer
-        image_layer = self.image_data[0, :, :]
-        image_layer = np.rot90(image_layer, k=3)
+        image_layer = first_layer if first_layer is not None else self.get_image_layer(0)
 
         # If img is None, initialize it
         if self.img is None:
-            self.img = pg.ImageItem(image_layer)
+            self.img = pg.ImageItem()
             self.view.setImageData(image_layer, self.img)
             self.plot_item.addItem(self.img)
-        else:
-            self.img.setImage(image_layer)
+        self.pyramid_cache.clear()
+        self.render_cache.clear()
+        # 显示范围对整个栈只计算一次（与 ImageJ 相同，按第一层），之后跟随直方图面板的设置
+        self.display_levels = display_levels(image_layer)
+        # 边读边显示时第一层可能还全是 0
+        self.levels_pending = self.is_loading()
+        self.show_image(image_layer, 0)
 
-        self.setWindowTitle(os.path.basename(file_path))  # Set window title to file name
+        self.setWindowTitle(title)  # Set window title to file name
 
         # Add histogram LUT item for the right-side panel
-        if self.histogram_lut is None:
-            self.histogram_lut = pg.HistogramLUTItem()
-            self.histogram_lut.setImageItem(self.img)
-            self.graphics_widget.addItem(self.histogram_lut)
+        self.setup_histogram_lut(image_layer)
 
         def adjust_page_step(slider_min, slider_max):
             # 计算滑块的范围
@@ -825,59 +983,480 @@ class ImageWithRect(QWidget):
             else:
                 return 50  # 对于更大的范围，设定一个较大的步长
 
+        self.playback.set_frame_count(self.image_data.shape[0])
+
         # Set slider range
         if self.slider:
-            self.slider.setRange(0, shape[0] - 1)
-            page_step = adjust_page_step(0, shape[0] - 1)
+            self.slider.setRange(0, self.image_data.shape[0] - 1)
+            page_step = adjust_page_step(0, self.image_data.shape[0] - 1)
             self.slider.setSingleStep(1)
             self.slider.setPageStep(page_step)
 
         # Update label with initial layer
         self.update_label_text(0)
 
-    def load_3d_image(self, file_path, shape, params, dtype=np.float32):
+    def load_3d_image(self, file_path, shape, params):
+        """Open the raw stack memory-mapped, honoring offset, gap, byte order and pixel format."""
+        image_data, fill = self.open_3d_image(file_path, shape, params)
+        for _ in fill or ():
+            pass
+        return image_data
+
+    def open_3d_image(self, file_path, shape, params):
+        """Open the raw stack for progressive loading, or its chunked cache when it was converted before."""
         image_type = params['image_type']
-        type = self.get_numpy_dtype(image_type)
-        image = np.fromfile(file_path, dtype=type)
+        little_endian = params['little_endian']
+        offset = params.get('offset', 0)
+        gap = params.get('gap', 0)
+
+        # 转换过的文件直接打开分块缓存，只解压用到的块
+        store_path = chunked_store_path(file_path, {'shape': list(shape), 'image_type': image_type,
+                                                    'little_endian': little_endian, 'offset': offset, 'gap': gap})
+        if has_chunked_store(store_path):
+            print(f"Opening cached version {store_path}")
+            return ChunkedStack(store_path, SliceCache(params.get('cache_mb', 1024) * 1024 * 1024)), None
+
+        stack, fill = self.open_raw_source(file_path, shape, params)
+        if params.get('chunked_cache'):
+            # 读取完成后在同一个后台线程中写入分块缓存
+            fill = convert_after_fill(stack, fill, store_path)
+        return stack, fill
+
+    def open_raw_source(self, file_path, shape, params):
+        """Open the raw file itself: compressed, virtual, memory-mapped or read progressively."""
+        image_type = params['image_type']
+        little_endian = params['little_endian']
+        offset = params.get('offset', 0)
+        gap = params.get('gap', 0)
 
-        if params['little_endian'] is True:
-            image = image.byteswap().newbyteorder()  # Handle little-endian data
-        expected_size = np.prod(shape)
+        if compression_kind(file_path):
+            # .raw.gz / .raw.zst: always virtual, slices are decompressed on demand through the seek index
+            cache = SliceCache(params.get('cache_mb', 1024) * 1024 * 1024)
+            return open_compressed_raw(file_path, shape, image_type, little_endian, offset, gap, cache)
 
-        if image.size < expected_size:
-            # 如果数据太少，不足以填充整个形状，则填充0值
-            print(
-                f"Warning: Data size ({image.size}) is smaller than expected shape {shape} ({expected_size}). Padding with zeros.")
-            padding_size = expected_size - image.size
-            image = np.pad(image, (0, padding_size), mode='constant', constant_values=0)
-        elif image.size > expected_size:
-            # 如果数据太多，裁剪数据到目标大小
-            print(
-                f"Warning: Data size ({image.size}) is larger than expected shape {shape} ({expected_size}). Cropping data.")
-            image = image[:expected_size]
+        if params.get('virtual_stack'):
+            # Virtual stack: slices are read on demand and kept in a bounded LRU cache
+            cache = SliceCache(params.get('cache_mb', 1024) * 1024 * 1024)
+            return RawVirtualStack(file_path, shape, image_type, little_endian, offset, gap, cache), None
+
+        # Byte order is carried by the dtype, no byteswap pass over the data is needed
+        return open_raw_progressive(file_path, shape, image_type, little_endian, offset, gap)
+
+    def open_image_async(self, file_path, shape, params):
+        """Open the image on a worker thread; the window shows up with the first slice and fills in the rest."""
+        print("File path:", file_path)
+        print("Shape:", shape)
+
+        self.open_file = lambda path: self.open_3d_image(path, shape, params)
+        self.open_stack_async(lambda: self.open_file(file_path), os.path.basename(file_path))
+
+    def open_stack_async(self, open_stack, title):
+        """Run `open_stack()`, which returns (stack, fill), on a worker thread and show the stack when it is open."""
+        self.loader_thread = StackLoaderThread(open_stack)
+        self.loader_thread.stack_opened.connect(
+            lambda image_data, first_layer: self.on_stack_opened(image_data, first_layer, title))
+        self.loader_thread.slices_loaded.connect(self.on_slices_loaded)
+        self.loader_thread.progress.connect(
+            lambda loaded, total: show_status_message(f"Loading {title}: {loaded}/{total} images"))
+        self.loader_thread.load_failed.connect(self.on_load_failed)
+        self.loader_thread.finished.connect(self.start_stack_histogram)
+        self.loader_thread.finished.connect(self.offer_recompress)
+        self.loader_thread.start()
+
+    def on_stack_opened(self, image_data, first_layer, title):
+        self.display_stack(image_data, title, first_layer=first_layer)
+        self.show()
+        if self.open_file is not None:
+            self.prefetch_folder()
+
+    def prefetch_folder(self):
+        """Open the next and previous file of the folder in the background, for File > Open Next."""
+        navigator = state_manager.get_folder_navigator()
+        if navigator is None or navigator.current_path != os.path.abspath(self.file_path):
+            # 从对话框打开的新文件：记住它的文件夹、顺序和打开参数
+            if navigator is not None:
+                navigator.shutdown()
+            navigator = FolderNavigator(self.file_path, self.open_file)
+            state_manager.set_folder_navigator(navigator)
+        navigator.prefetch_neighbours()
+
+    def on_load_failed(self, message):
+        QMessageBox.critical(None, "Error", f"Failed to open image: {message}")
+        self.close()
+
+    def cancel_loading(self):
+        """Stop filling in the image in the background."""
+        if self.loader_thread is not None and self.loader_thread.isRunning():
+            self.loader_thread.requestInterruption()
+            show_status_message("Loading cancelled")
+
+    def preserve_slice(self, layer):
+        """Keep the original of a slice before it is modified in place, so that it can be reverted."""
+        if self.snapshot is not None:
+            self.snapshot.preserve(layer, self.image_data)
+
+    def revert(self):
+        """Go back to the image as it was opened, restoring only the slices that were modified."""
+        if self.snapshot is None:
+            return
+        image_data = self.snapshot.revert()
+        state_manager.set_image_data(image_data)
+
+        if image_data.ndim == 2:
+            # 2D 图像处理后被替换为新的数组，快照中保存的就是原来的数组
+            self.view.setImageData(image_data, self.img)
+            self.invalidate_slice_cache()
+            self.show_image(image_data, 0)
+            return
+
+        self.image_data = image_data
+        self.sanitizer.stack = image_data  # 重新映射的文件
+        self.invalidate_slice_cache()
+        self.setup_prefetch()
+        if self.is_3d:
+            self.update_image_layer(self.slider.value())
+        else:
+            self.show_image(self.get_image_layer(0), 0)
+
+    def reads_from(self, file_path):
+        """Check whether the stack reads its data lazily from `file_path` (memory-mapped or virtual)."""
+        if not is_disk_backed(self.image_data):
+            return False
+        sources = [self.file_path] + list(self.source_paths or [])
+        target = os.path.normcase(os.path.abspath(file_path))
+        return any(isinstance(source, str) and os.path.normcase(os.path.abspath(source)) == target
+                   for source in sources)
+
+    def save_stack_async(self, file_path, write_stack):
+        """Save the stack with `write_stack(stack, path, progress)` on a worker thread, one slice at a time.
+
+        Returns False when saving did not start.
+        """
+        if self.saver_thread is not None and self.saver_thread.isRunning():
+            QMessageBox.warning(None, "Save", "The image is still being saved")
+            return False
+        if self.reads_from(file_path):
+            # 保存时还要从这个文件读取数据；替换后映射和文件句柄仍指向旧文件（Windows 上无法替换）
+            QMessageBox.warning(None, "Save", f"{os.path.basename(file_path)} is read from disk while it is open "
+                                              f"and cannot be overwritten. Save it under another name.")
+            return False
+
+        name = os.path.basename(file_path)
+        self.saver_thread = StackSaverThread(self.image_data, file_path, write_stack)
+        self.saver_thread.progress.connect(
+            lambda saved, total: show_status_message(f"Saving {name}: {saved}/{total} slices"))
+        self.saver_thread.saved.connect(lambda path: show_status_message(f"Saved {path}"))
+        self.saver_thread.save_failed.connect(
+            lambda message: QMessageBox.critical(None, "Error", f"Failed to save {name}: {message}"))
+        self.saver_thread.start()
+        return True
+
+    def offer_recompress(self):
+        """Offer to recompress a .gz / .zst stack that is compressed as one long stream (see CompressedReader)."""
+        reader = getattr(self.image_data, 'reader', None) or getattr(self.image_data, 'source', None)
+        if not isinstance(reader, CompressedReader) or not reader.slow_seeks or reader.file_path in declined_recompress:
+            return
+        name = os.path.basename(reader.file_path)
+        answer = QMessageBox.question(
+            None, "Compressed Stack",
+            f"{name} is compressed as one long stream: jumping to a slice decompresses the file from "
+            f"its start, in this session and every later one.\n\nRecompress it in blocks so that any slice "
+            f"can be read directly? The file keeps the same content and format.")
+        if answer != QMessageBox.Yes:
+            declined_recompress.add(reader.file_path)
+            show_status_message(f"Random access to {name} stays slow")
+            return
+
+        self.recompress_thread = RecompressThread(reader)
+        self.recompress_thread.progress.connect(
+            lambda done, total: show_status_message(f"Recompressing {name}: {done * 100 // total}%"))
+        self.recompress_thread.saved.connect(lambda path: show_status_message(f"Recompressed {path}"))
+        self.recompress_thread.save_failed.connect(
+            lambda message: QMessageBox.critical(None, "Error", f"Failed to recompress {name}: {message}"))
+        self.recompress_thread.start()
 
-        # 重塑数据到目标形状
-        image = image.reshape(shape)
-        return image
     def update_image_with_data(self, image_data):
         """Update the currently displayed image with new data."""
         if self.img is not None:
-            self.img.setImage(image_data)
+            layer = self.slider.value() if self.slider else 0
+            # 新数据与旧数据的形状和步长可能相同，丢弃该层之前的金字塔和显示图像
+            self.pyramid_cache.discard_if(lambda key: key[0] == layer)
+            self.render_cache.discard_if(lambda key: key[0][0] == layer)
+            self.show_image(image_data, layer)
+            if not self.is_3d:
+                self.plot_histogram(*histogram_of(image_data, self.histogram_range).plot_data())
             # Update the display
             self.view.update()
             print("Image updated successfully")
         else:
             print("Image item not initialized")
 
-    def clean_image_data(self, image):
-        # 将所有 NaN 值替换为 0，正无穷替换为 255，负无穷替换为 0
-        image = np.nan_to_num(image, nan=0.0, posinf=255, neginf=0.0)
-        return image
+    def clean_stack_in_place(self):
+        """Replace NaN and Inf in the stack data itself, chunk by chunk; see Process > Math > Remove NaNs."""
+        if not self.sanitizer.can_clean_in_place():
+            QMessageBox.warning(None, "Remove NaNs", "The image is opened read-only and cannot be changed")
+            return
+
+        total = self.image_data.shape[0]
+        for done in self.sanitizer.clean_in_place(before_write=self.preserve_slice):
+            show_status_message(f"Removing NaNs: {done}/{total} slices")
+        self.invalidate_slice_cache()
+        self.sanitizer.mark_clean()
+        self.update_image_layer(self.slider.value() if self.slider else 0)
+
+    def setup_prefetch(self):
+        """Prefetch the neighbouring slices of disk-backed stacks on worker threads."""
+        if self.prefetcher:
+            self.prefetcher.shutdown()
+        self.prefetcher = None
+        self.slice_cache = None
+
+        if not is_disk_backed(self.image_data):
+            return
+
+        if isinstance(self.image_data, VirtualStack):
+            self.slice_cache = self.image_data.cache
+        else:
+            self.slice_cache = SliceCache(256 * 1024 * 1024)
+
+        if self.is_3d:
+            # 视频只有一个解码器，多个线程只会轮流等待它并来回定位
+            workers = 1 if isinstance(self.image_data, VideoStack) else 2
+            self.prefetcher = SlicePrefetcher(self.read_image_layer, self.slice_cache,
+                                              self.image_data.shape[0], self.prefetch_depth, workers)
+
+    def read_image_layer(self, layer):
+        """Read one raw slice through the slice cache, also called from the prefetch threads."""
+        if isinstance(self.image_data, VirtualStack):
+            return self.image_data.get_slice(layer)
+
+        image_layer = self.slice_cache.get(layer) if self.slice_cache is not None else None
+        if image_layer is None:
+            image_layer = np.array(self.image_data[layer, :, :])
+            if self.slice_cache is not None:
+                self.slice_cache.put(layer, image_layer)
+        return image_layer
+
+    def invalidate_slice_cache(self):
+        """Drop cached slices after the image data was modified in place."""
+        if self.slice_cache is not None and not isinstance(self.image_data, VirtualStack):
+            self.slice_cache.clear()
+        if self.sanitizer is not None:
+            self.sanitizer.invalidate()
+        self.pyramid_cache.clear()
+        self.render_cache.clear()
+        self.start_stack_histogram(refresh=True)
+
+    def show_image(self, image, layer=0):
+        """Show a slice (in display orientation), downsampled to the pyramid level that matches the zoom."""
+        self.display_image = image
+        # 旋转后的视图与原始切片的形状或步长不同，各自有自己的金字塔
+        self.display_key = (layer, image.shape, image.strides)
+        self.set_display_level(self.get_pyramid(), auto_levels=True)
+
+    def get_pyramid(self):
+        """Return the pyramid of the slice on display, or None while it is built or not needed."""
+        if not needs_pyramid(self.display_image):
+            return None
+        key = self.display_key
+        pyramid = self.pyramid_cache.get(key)
+        if pyramid is None and key not in self.pyramid_pending:
+            self.pyramid_pending.add(key)
+            self.pyramid_executor.submit(self.build_pyramid, key, self.display_image)
+        return pyramid
+
+    def build_pyramid(self, key, image):
+        try:
+            self.pyramid_cache.put(key, ImagePyramid(image))
+        finally:
+            self.pyramid_pending.discard(key)
+        self.pyramid_ready.emit(key)
+
+    def on_pyramid_ready(self, key):
+        if key == self.display_key:
+            self.update_display_level()
+
+    def update_display_level(self):
+        """Switch to the pyramid level matching the zoom after zooming, or once the pyramid is built."""
+        if self.img is None or self.display_image is None or self.img.image is not self.displayed_image:
+            # 其他地方直接设置了图像（例如反色），不再替换它
+            return
+        pyramid = self.pyramid_cache.get(self.display_key) if needs_pyramid(self.display_image) else None
+        if pyramid is not None and self.zoom_level(pyramid) != self.display_level:
+            self.set_display_level(pyramid, auto_levels=False)
+
+    def zoom_level(self, pyramid):
+        pixel_size = self.view.viewPixelSize()
+        return level_for_zoom(max(pixel_size), len(pyramid))
+
+    def set_display_level(self, pyramid, auto_levels):
+        level = self.zoom_level(pyramid) if pyramid is not None else 0
+        image = pyramid.level(self.display_image, level) if pyramid is not None else self.display_image
+        self.display_level = level
+        if self.display_levels is None:
+            self.img.setImage(image, autoLevels=auto_levels)
+        else:
+            self.img.setImage(self.render_display_image(image, level), autoLevels=False, levels=(0, 255))
+        self.displayed_image = self.img.image  # ImageItem 保存的是图像的视图
+        self._apply_item_transform(2 ** level)
+
+    def render_display_image(self, image, level):
+        """Return the 8-bit display image of a pyramid level of the current slice, from the cache if possible."""
+        key = (self.display_key, level)
+        rendered = self.render_cache.get(key)
+        if rendered is None:
+            rendered = render_8bit(image, self.display_levels)
+            self.render_cache.put(key, rendered)
+        return rendered
+
+    def setup_histogram_lut(self, image):
+        """Show the histogram panel; it sets the display levels and LUT instead of the image item's autolevels."""
+        if self.histogram_lut is None:
+            # 直方图面板不直接连接图像项：图像项显示的是已经转换为 8 位的图像
+            self.histogram_lut = pg.HistogramLUTItem()
+            self.histogram_lut.sigLevelsChanged.connect(self.on_levels_changed)
+            self.histogram_lut.sigLookupTableChanged.connect(self.on_lookup_table_changed)
+            self.graphics_widget.addItem(self.histogram_lut)
+
+        self.histogram_range = self.display_levels
+        # 先显示这一层的直方图，栈的直方图在后台统计后替换它
+        self.plot_histogram(*histogram_of(image, self.histogram_range).plot_data())
+        self.histogram_lut.setLevels(*self.display_levels)
+        self.start_stack_histogram()
+
+    def plot_histogram(self, x, counts):
+        self.histogram_lut.plot.setData(x, counts)
+
+    def histogram_key(self):
+        path = self.file_path if isinstance(self.file_path, str) else None
+        source = source_key(path) if path and os.path.isfile(path) else path or id(self.image_data)
+        return source, self.image_data.shape, self.image_data.dtype.str, self.histogram_range
+
+    def is_loading(self):
+        if self.loader_thread is not None and self.loader_thread.isRunning():
+            return True
+        return self.stack_loader is not None and self.stack_loader.is_running()
+
+    def start_stack_histogram(self, refresh=False):
+        """Show the histogram of the whole stack, from the cache or computed on a worker thread.
+
+        Nothing is scanned while the stack is still being loaded; this is called again
+        when loading has finished. `refresh` recomputes it after the stack was modified.
+        Remote, compressed and video stacks only count the slices already loaded.
+        """
+        if not self.is_3d or self.histogram_lut is None:
+            return
+        key = self.histogram_key()
+        if refresh:
+            histogram_cache.discard(key)
+        elif self.histogram_thread is not None and self.histogram_thread.key == key \
+                and self.histogram_thread.stack is self.image_data and self.histogram_thread.isRunning():
+            return
+
+        self.stop_stack_histogram()
+        histogram = histogram_cache.get(key)
+        if histogram is not None:
+            self.plot_histogram(*histogram.plot_data())
+            return
+        if self.is_loading():
+            return
+
+        self.histogram_thread = StackHistogramThread(self.image_data, key, self.histogram_range)
+        self.histogram_thread.updated.connect(self.on_stack_histogram_updated)
+        self.histogram_thread.start()
+
+    def stop_stack_histogram(self):
+        if self.histogram_thread is not None and self.histogram_thread.isRunning():
+            self.histogram_thread.requestInterruption()
+            self.histogram_thread.wait()  # 最多等待统计完正在处理的一层
+
+    def on_stack_histogram_updated(self, x, counts, scanned, total):
+        if self.sender() is not self.histogram_thread:
+            return
+        self.plot_histogram(x, counts)
+        if scanned == total:
+            if self.histogram_thread.cached_only:
+                show_status_message(f"Histogram of the slices loaded so far ({total} of {self.image_data.shape[0]})")
+            else:
+                show_status_message(f"Histogram of {total} slices")
+
+    def on_levels_changed(self):
+        levels = tuple(float(level) for level in self.histogram_lut.getLevels())
+        if self.display_levels is None or levels == self.display_levels:
+            return
+        self.levels_pending = False  # 用户调整过的显示范围不再被替换
+        self.display_levels = levels
+        self.render_cache.clear()
+        if self.display_image is not None:
+            self.set_display_level(self.get_pyramid(), auto_levels=False)
+
+    def update_levels_from_first_slice(self):
+        """Compute the display levels and histogram range again once the first slice has been loaded."""
+        self.levels_pending = False
+        image = self.get_image_layer(0)
+        levels = display_levels(image)
+        if levels == self.display_levels:
+            return
+        self.display_levels = levels
+        self.histogram_range = levels
+        self.render_cache.clear()
+        if self.histogram_lut is not None:
+            self.plot_histogram(*histogram_of(image, self.histogram_range).plot_data())
+            self.histogram_lut.setLevels(*levels)
+        if self.display_image is not None:
+            self.set_display_level(self.get_pyramid(), auto_levels=False)
+
+    def on_lookup_table_changed(self):
+        if self.img is not None:
+            self.img.setLookupTable(self.histogram_lut.getLookupTable(n=256))
+
+    def _apply_item_transform(self, scale):
+        """Orient the image item, scaled so that every pyramid level covers the same area as the full image."""
+        self.img.setTransform(orientation_transform(self.display_image.shape, self.orientation, scale))
+
+    def set_orientation(self, orientation):
+        """Rotate or flip the display of this image; the pixel data is not changed."""
+        self.orientation = dict(orientation)
+        if self.img is None or self.display_image is None:
+            return
+        scale = 2 ** self.display_level if self.img.image is self.displayed_image else 1
+        self._apply_item_transform(scale)
+        self.view.autoRange()
+
+    def pixel_at(self, pos):
+        """Return the (row, column) of the image pixel under a scene position, as floats."""
+        item_pos = self.img.mapFromScene(pos)
+        # 图像项显示的可能是金字塔的一级
+        scale = 2 ** self.display_level if self.img.image is self.displayed_image else 1
+        return item_pos.x() * scale, item_pos.y() * scale
+
+    def get_image_layer(self, layer):
+        """Return one slice of the stack ready for display or processing: native byte order, no NaN or Inf."""
+        if not is_disk_backed(self.image_data):
+            image_layer = to_native_byte_order(self.image_data[layer, :, :])
+        else:
+            image_layer = to_native_byte_order(self.read_image_layer(layer))
+        return self.sanitizer.clean_slice(layer, image_layer)
+
+    def convert_to_native_byte_order(self):
+        """Replace a byte-swapped stack by a native copy in memory, converted chunk by chunk."""
+        if self.image_data.dtype.isnative:
+            print("Image is already in native byte order")
+            return
+
+        self.image_data = native_copy(self.image_data)
+        self.sanitizer.stack = self.image_data
+        self.setup_prefetch()
+        state_manager.set_image_data(self.image_data)
+        self.update_image_layer(self.slider.value() if self.slider else 0)
 
     def update_image_layer(self, value):
         if self.is_3d:
-            image_layer = self.image_data[value, :, :]
-            self.img.setImage(image_layer)
+            image_layer = self.get_image_layer(value)
+            self.show_image(image_layer, value)
+            if self.prefetcher:
+                # 播放时总是向前预取，拖动滑块时根据移动方向预取
+                self.prefetcher.update(value, direction=self.playback.direction if self.is_playing else None)
             self.update_label_text(value)
 
     def update_label_text(self, layer):
@@ -886,16 +1465,22 @@ class ImageWithRect(QWidget):
             total_layers = self.image_data.shape[0]
             i, j = 0, 0  # assuming the top-left pixel for this example
             val = self.image_data[layer, i, j]
+            source = f"  ({os.path.basename(self.source_paths[layer])})" if self.source_paths else ""
+            playing = ""
+            if self.is_playing:
+                playing = f"  {self.playback.measured_fps:.1f}/{self.playback.fps:g} fps  dropped: {self.playback.dropped}"
             self.label.setText(
-                f"pos: ({j:.1f}, {i:.1f})  pixel: ({i}, {j})  layer: {layer + 1}/{total_layers}  value: {val:.4f}")
+                f"pos: ({j:.1f}, {i:.1f})  pixel: ({i}, {j})  layer: {layer + 1}/{total_layers}{source}  value: {format_pixel_value(val)}{playing}")
 
     def on_mouse_move(self, pos):
         self.view.on_mouse_move(pos)
         self.update_label(pos)
 
     def update_label(self, pos):
-        pos = self.view.mapSceneToView(pos)
-        i, j = int(pos.y()), int(pos.x())
+        if self.img is None:
+            return
+        y, x = self.pixel_at(pos)
+        i, j = int(np.floor(y)), int(np.floor(x))
         if self.is_3d and self.slider:
             layer = self.slider.value()
             i = np.clip(i, 0, self.image_data.shape[1] - 1)
@@ -903,12 +1488,12 @@ class ImageWithRect(QWidget):
             val = self.image_data[layer, i, j]
             total_layers = self.image_data.shape[0]
             self.label.setText(
-                f"pos: ({pos.x():.1f}, {pos.y():.1f})  pixel: ({i}, {j})  layer: {layer + 1}/{total_layers}  value: {val:.4f}")
+                f"pos: ({x:.1f}, {y:.1f})  pixel: ({i}, {j})  layer: {layer + 1}/{total_layers}  value: {format_pixel_value(val)}")
         else:
             i = np.clip(i, 0, self.view.image_data.shape[0] - 1)
             j = np.clip(j, 0, self.view.image_data.shape[1] - 1)
             val = self.view.image_data[i, j]
-            self.label.setText(f"pos: ({pos.x():.1f}, {pos.y():.1f})  pixel: ({i}, {j})  value: {val:.4f}")
+            self.label.setText(f"pos: ({x:.1f}, {y:.1f})  pixel: ({i}, {j})  value: {format_pixel_value(val)}")
 
     def wheelEvent(self, event):
         if self.is_3d and self.slider:
@@ -934,30 +1519,52 @@ class ImageWithRect(QWidget):
 
     def toggle_play_pause(self):
         if self.is_playing:
-            self.timer.stop()
+            self.playback.stop()
             self.play_button.setText("⯈")  # Change to play icon
         else:
-            self.timer.start(100)  # Adjust the interval as needed
+            self.playback.start(self.slider.value())
             self.play_button.setText("⏸")  # Change to pause icon
         self.is_playing = not self.is_playing
-
-    def play_next_layer(self):
-        if self.slider.value() < self.slider.maximum():
-            self.slider.setValue(self.slider.value() + 1)
-        # Note, else branch, not tested.
+        if self.prefetcher:
+            # 循环播放时预取越过最后一层回到第一层
+            self.prefetcher.wrap = self.is_playing and not self.playback.ping_pong
+        self.update_label_text(self.slider.value())
+
+    def play_next_layer(self, layer=None):
+        """Show the frame the playback engine says is due (frames that are late were skipped), or the next one."""
+        if layer is None:
+            layer = self.playback.step(self.slider.value(), 1)
+        self.slider.setValue(layer)
+
+
+def format_pixel_value(val):
+    """Format a grayscale value, or the channels of a color pixel, for the status label."""
+    if np.ndim(val) > 0:
+        return "(" + ", ".join(str(v) for v in np.ravel(val)) + ")"
+    return f"{val:.4f}"
+
+
+def reuse_first_image(first_path, first, scale=1.0):
+    """Return a load_file for ParallelStackLoader that copies the already decoded first image instead of decoding it again."""
+    def load_file(file_path, out):
+        if file_path == first_path:
+            out[0] = first
         else:
-            self.slider.setValue(0)  # Loop back to the first layer
+            read_sequence_into(file_path, out, scale)
+    return load_file
 
 
-def create_and_show_image_with_rect(file_path, params):
-    app = QApplication.instance()
-    if app is None:
-        app = QApplication(sys.argv)
-        created_app = True
+def show_status_message(message):
+    """Show a message in the status bar of the main window, if there is one."""
+    main_window = state_manager.get_main_window()
+    if main_window is not None:
+        main_window.ui.statusbar.showMessage(message)
     else:
-        created_app = False
+        print(message)
+
 
-    is_3d_image = params['num_images'] > 1
+def create_image_window(file_path, is_3d_image):
+    """Create an image window using the current shape tool, connected to the main window toolbar."""
     if is_3d_image:
         image_with_rect = ImageWithRect(file_path, is_3d_image)
     else:
@@ -974,24 +1581,99 @@ def create_and_show_image_with_rect(file_path, params):
 
     image_with_rect.file_path = file_path
 
+    # Connect to main window signal if main window is present
+    main_window = state_manager.get_main_window() or QtWidgets.QApplication.instance().activeWindow()
+    if main_window and hasattr(main_window, 'icon_clicked'):
+        main_window.icon_clicked.connect(lambda index: on_icon_clicked(index, image_with_rect.view))
+
+    return image_with_rect
+
+
+def create_and_show_image_with_rect(file_path, params):
+    app = QApplication.instance()
+    if app is None:
+        app = QApplication(sys.argv)
+        created_app = True
+    else:
+        created_app = False
+
     layers = params['num_images']
     width = params['width']
     height = params['height']
 
-    # Unified 2D and 3D image handling: all images now processed through 3D functions
-    image_with_rect.display_3d_image(file_path, (layers, height, width), params)
-
-    # Connect to main window signal if main window is present
-    main_window = QtWidgets.QApplication.instance().activeWindow()
-    if main_window:
-        main_window.icon_clicked.connect(lambda index: on_icon_clicked(index, image_with_rect.view))
+    if params.get('open_all_files'):
+        # 打开文件夹中所有扩展名相同的文件（.raw.gz 按完整的后缀），并行读入同一个栈
+        files = list_folder_files(os.path.dirname(os.path.abspath(file_path)), [file_extension(file_path)])
+        image_with_rect = create_image_window(file_path, len(files) * layers > 1)
+        image_with_rect.load_folder_stack(files, (layers, height, width), params)
+        image_with_rect.show()
+    else:
+        image_with_rect = create_image_window(file_path, layers > 1)
 
-    image_with_rect.show()
+        # Unified 2D and 3D image handling: all images now processed through 3D functions
+        # 图像在后台线程中读取，第一层解码完成后窗口才显示
+        image_with_rect.open_image_async(file_path, (layers, height, width), params)
 
     if created_app:
         sys.exit(app.exec_())
 
 
+def create_and_show_stack(file_path, open_stack, open_file=None):
+    """Open a stack that is not raw data (TIFF, ...) on a worker thread; the window shows up with its first slice.
+
+    `open_file(path)`, if given, opens other files of the folder the same way for File > Open Next.
+    """
+    image_with_rect = create_image_window(file_path, False)
+    image_with_rect.open_file = open_file
+    image_with_rect.open_stack_async(open_stack, os.path.basename(file_path))
+    return image_with_rect
+
+
+def open_next_image(delta=1):
+    """Replace the current image by the next (or previous) file of its folder, see File > Open Next."""
+    current = state_manager.get_image_with_rect_instance()
+    navigator = state_manager.get_folder_navigator()
+    if current is None or current.open_file is None or navigator is None:
+        return None
+
+    file_path, future = navigator.step(delta)
+    print(f"Opening next: {file_path}")
+    open_file = current.open_file
+
+    def open_stack():
+        # 预取的文件通常已经读取完成，否则在后台线程中等待它
+        try:
+            stack = future.result()
+        except CancelledError:
+            stack = None
+        if stack is None:
+            # 预取被取消、导航器正在关闭，或者文件太大只预热了页缓存：直接打开，边读边显示
+            return open_file(file_path)
+        return stack, None
+
+    image_with_rect = create_and_show_stack(file_path, open_stack, open_file)
+    image_with_rect.orientation = dict(current.orientation)  # 同一文件夹中的图像使用相同的显示方向
+    current.close()
+    return image_with_rect
+
+
+def create_and_show_image_sequence(files, params):
+    """Open the files of an image sequence as one stack, see Import > Image Sequence."""
+    image_with_rect = create_image_window(os.path.dirname(files[0]), len(files) > 1)
+    image_with_rect.load_image_sequence(files, params)
+    image_with_rect.show()
+    return image_with_rect
+
+
+def create_and_show_stack_from_list(list_path):
+    """Open the images listed in a text file as one stack, see Import > Stack From List."""
+    files = read_stack_list(list_path)
+    image_with_rect = create_image_window(list_path, len(files) > 1)
+    image_with_rect.load_stack_from_list(list_path, files)
+    image_with_rect.show()
+    return image_with_rect
+
+
 def on_icon_clicked(index, view):
     shape_types = ["rectangle", "ellipse", "polygon", "dynamic_polygon", "dynamic_line", "dynamic_line"]
     if 0 <= index < len(shape_types):
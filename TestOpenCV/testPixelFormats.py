@@ -0,0 +1,85 @@
+import os
+import sys
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from ImageP.imgio.pixel_formats import COMPUTED_FORMATS, PIXEL_FORMATS, decode_slice, decode_stack_view, \
+    decoded_dtype, decoded_shape, slice_nbytes
+
+# The Import > Raw pixel formats, decoded from bytes built here for each layout.
+
+HEIGHT, WIDTH = 3, 5
+
+
+def random_bytes(size, seed=0):
+    return np.random.default_rng(seed).integers(0, 256, size, dtype=np.uint8)
+
+
+def test_gray_formats():
+    for image_type in ("8-bit", "16-bit Signed", "16-bit Unsigned", "32-bit Signed", "32-bit Unsigned"):
+        for little_endian in (False, True):
+            dtype = np.dtype(PIXEL_FORMATS[image_type][0]).newbyteorder('<' if little_endian else '>')
+            expected = random_bytes(HEIGHT * WIDTH * dtype.itemsize).view(dtype).reshape(HEIGHT, WIDTH)
+            image = decode_slice(expected.view(np.uint8).ravel(), image_type, WIDTH, HEIGHT, little_endian)
+            assert np.array_equal(image, expected) and image.dtype == decoded_dtype(image_type, little_endian)
+
+    for image_type, dtype in (("32-bit Real", '>f4'), ("64-bit Real", '>f8')):
+        expected = np.linspace(-2, 2, HEIGHT * WIDTH).astype(dtype).reshape(HEIGHT, WIDTH)
+        assert np.array_equal(decode_slice(expected.view(np.uint8).ravel(), image_type, WIDTH, HEIGHT), expected)
+
+
+def test_color_formats():
+    rgb = random_bytes(HEIGHT * WIDTH * 3).reshape(HEIGHT, WIDTH, 3)
+    alpha = random_bytes(HEIGHT * WIDTH, seed=1).reshape(HEIGHT, WIDTH, 1)
+    r, g, b, a = rgb[..., :1], rgb[..., 1:2], rgb[..., 2:], alpha
+    stored = {
+        ("24-bit RGB", False): rgb,
+        ("24-bit RGB Planar", False): np.moveaxis(rgb, -1, 0),
+        ("24-bit BGR", False): rgb[..., ::-1],
+        # 32 位颜色按整数存储，小端时字节顺序相反
+        ("32-bit ARGB", False): np.concatenate([a, r, g, b], axis=-1),
+        ("32-bit ARGB", True): np.concatenate([b, g, r, a], axis=-1),
+        ("32-bit ABGR", False): np.concatenate([a, b, g, r], axis=-1),
+        ("32-bit ABGR", True): np.concatenate([r, g, b, a], axis=-1),
+    }
+    for (image_type, little_endian), data in stored.items():
+        image = decode_slice(np.ascontiguousarray(data).ravel(), image_type, WIDTH, HEIGHT, little_endian)
+        assert image.shape == decoded_shape(image_type, HEIGHT, WIDTH)
+        assert np.array_equal(image, rgb), (image_type, little_endian)
+
+
+def test_computed_formats():
+    values = np.random.default_rng(2).integers(0, 2 ** 24, (HEIGHT, WIDTH)).astype(np.uint32)
+    big = values.astype('>u4').view(np.uint8).reshape(HEIGHT, WIDTH, 4)[..., 1:]
+    little = values.astype('<u4').view(np.uint8).reshape(HEIGHT, WIDTH, 4)[..., :3]
+    assert np.array_equal(decode_slice(big.ravel(), "24-bit Integer", WIDTH, HEIGHT), values)
+    assert np.array_equal(decode_slice(little.ravel(), "24-bit Integer", WIDTH, HEIGHT, True), values)
+
+    # 每行按字节对齐，宽度不是8的倍数
+    bits = np.random.default_rng(3).integers(0, 2, (HEIGHT, 11), dtype=np.uint8)
+    packed = np.packbits(bits, axis=1)
+    assert packed.size == slice_nbytes("1-bit Bitmap", 11, HEIGHT)
+    assert np.array_equal(decode_slice(packed.ravel(), "1-bit Bitmap", 11, HEIGHT), bits * 255)
+
+
+def test_stack_view_matches_slices():
+    for image_type in PIXEL_FORMATS:
+        if image_type in COMPUTED_FORMATS:
+            assert decode_stack_view(np.zeros((2, 8), np.uint8), image_type, WIDTH, HEIGHT) is None
+            continue
+        nbytes = slice_nbytes(image_type, WIDTH, HEIGHT)
+        raw = random_bytes(4 * nbytes, seed=4).reshape(4, nbytes)
+        for little_endian in (False, True):
+            view = decode_stack_view(raw, image_type, WIDTH, HEIGHT, little_endian)
+            assert np.shares_memory(view, raw)
+            for layer in range(4):
+                assert np.array_equal(view[layer], decode_slice(raw[layer], image_type, WIDTH, HEIGHT, little_endian),
+                                      equal_nan=True)
+
+
+if __name__ == "__main__":
+    test_gray_formats()
+    test_color_formats()
+    test_computed_formats()
+    test_stack_view_matches_slices()
+    print("Pixel format tests passed")
@@ -0,0 +1,66 @@
+import os
+import sys
+import tempfile
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from ImageP.imgio.snapshot import StackSnapshot, find_memmap, remap
+from ImageP.imgio.virtual_stack import RawVirtualStack
+
+# StackSnapshot (File > Revert) for in-memory, copy-on-write mapped and virtual stacks.
+
+
+def make_stack():
+    return np.arange(4 * 6 * 5, dtype=np.uint16).reshape(4, 6, 5)
+
+
+def test_in_memory_stack():
+    stack = make_stack()
+    snapshot = StackSnapshot(stack)
+    snapshot.preserve(1)
+    stack[1] = 0
+    snapshot.preserve(1)  # 第二次修改不覆盖保存的原始数据
+    stack[1] = 9
+    assert np.array_equal(snapshot.revert(), make_stack())
+    assert snapshot.originals == {}
+
+
+def test_remap_flipped_view():
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'stack.raw')
+        make_stack().tofile(path)
+        mapping = np.memmap(path, dtype=np.uint8, mode='c', offset=0, shape=(4 * 6 * 5 * 2,))
+        # 上下翻转的视图（负的步长），如 NIfTI
+        view = mapping.view(np.uint16).reshape(4, 6, 5)[:, ::-1]
+        assert find_memmap(view) is mapping
+
+        snapshot = StackSnapshot(view)
+        assert snapshot.copy_on_write
+        view[2] = 1
+        reverted = snapshot.revert()
+        assert reverted is not view and reverted.strides == view.strides
+        assert np.array_equal(reverted, make_stack()[:, ::-1])
+        # 文件本身没有被修改
+        assert np.array_equal(np.fromfile(path, np.uint16).reshape(4, 6, 5), make_stack())
+
+        again = remap(reverted[1:3, 2:], 'r')
+        assert np.array_equal(again, make_stack()[:, ::-1][1:3, 2:])
+
+
+def test_virtual_stack():
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'stack.raw')
+        make_stack().astype('>u2').tofile(path)
+        stack = RawVirtualStack(path, (4, 6, 5), "16-bit Unsigned")
+        snapshot = StackSnapshot(stack)
+        stack[3] = 0
+        assert not stack[3].any()
+        assert snapshot.revert() is stack
+        assert np.array_equal(stack[:], make_stack())
+
+
+if __name__ == "__main__":
+    test_in_memory_stack()
+    test_remap_flipped_view()
+    test_virtual_stack()
+    print("Snapshot tests passed")
@@ -0,0 +1,99 @@
+import os
+import sys
+import tempfile
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from ImageP.imgio.text_reader import read_text_image
+
+# read_text_image against small text exports; a tiny chunk size splits them into many chunks.
+
+CHUNK_SIZE = 64
+
+
+def write_text(directory, name, text):
+    path = os.path.join(directory, name)
+    with open(path, 'w', newline='') as f:
+        f.write(text)
+    return path
+
+
+def matrix_text(matrix, separator='\t', fmt='{}', newline='\n'):
+    return newline.join(separator.join(fmt.format(value) for value in row) for row in matrix) + newline
+
+
+def test_integer_types():
+    rng = np.random.default_rng(0)
+    with tempfile.TemporaryDirectory() as directory:
+        for low, high, dtype in ((0, 256, np.uint8), (0, 65536, np.uint16), (-300, 300, np.int16),
+                                 (-70000, 70000, np.int32)):
+            matrix = rng.integers(low, high, (40, 9))
+            path = write_text(directory, f"{np.dtype(dtype).name}.txt", matrix_text(matrix))
+            image = read_text_image(path, chunk_size=CHUNK_SIZE)
+            assert image.dtype == dtype and np.array_equal(image, matrix), dtype
+
+        # 后面的块需要更宽的类型时，前面已写入的数据一起转换
+        matrix = rng.integers(0, 200, (40, 9))
+        matrix[-1, -1] = -5
+        matrix[-2, 0] = 100000
+        image = read_text_image(write_text(directory, 'widened.txt', matrix_text(matrix)), chunk_size=CHUNK_SIZE)
+        assert image.dtype == np.int32 and np.array_equal(image, matrix)
+
+        matrix[-1, -1] = 2 ** 40
+        image = read_text_image(write_text(directory, 'huge.txt', matrix_text(matrix)), chunk_size=CHUNK_SIZE)
+        assert image.dtype == np.float32 and np.array_equal(image, matrix.astype(np.float32))
+
+
+def test_floats():
+    matrix = np.random.default_rng(1).random((30, 7)) * 1000
+    with tempfile.TemporaryDirectory() as directory:
+        # 固定小数位数（按整数解析）、科学计数法，以及后面才出现小数的整数数据
+        for name, fmt in (('fixed.txt', '{:.4f}'), ('exponent.txt', '{:.6e}')):
+            image = read_text_image(write_text(directory, name, matrix_text(matrix, fmt=fmt)), chunk_size=CHUNK_SIZE)
+            assert image.dtype == np.float32 and np.allclose(image, matrix, rtol=1e-5), name
+
+        integers = np.round(matrix).astype(int)
+        text = matrix_text(integers[:-1]) + '1.5\t' + matrix_text(integers[-1:, 1:])
+        image = read_text_image(write_text(directory, 'late_float.txt', text), chunk_size=CHUNK_SIZE)
+        assert image.dtype == np.float32 and image[-1, 0] == 1.5 and np.array_equal(image[:-1], integers[:-1])
+
+        image = read_text_image(write_text(directory, 'nan.txt', "1 nan 3\n-inf 5 6\n"))
+        assert np.isnan(image[0, 1]) and image[1, 0] == -np.inf
+
+
+def test_separators_header_and_blank_lines():
+    matrix = np.arange(60).reshape(12, 5)
+    with tempfile.TemporaryDirectory() as directory:
+        for separator, newline in ((',', '\n'), (';', '\r\n'), (' ', '\n')):
+            text = 'x,y,z,u,v\n\n' + matrix_text(matrix, separator, newline=newline) + '\n\n'
+            image = read_text_image(write_text(directory, 'table.txt', text), chunk_size=CHUNK_SIZE)
+            assert np.array_equal(image, matrix), repr(separator)
+
+
+def test_rows_of_different_lengths():
+    with tempfile.TemporaryDirectory() as directory:
+        # 总数是列数的整数倍，但各行长度不同
+        for text in ("1 2 3\n4 5\n6 7 8 9\n1 2 3\n", "1 2 3\n4 5 6\n7 8\n"):
+            path = write_text(directory, 'uneven.txt', text)
+            try:
+                read_text_image(path, chunk_size=CHUNK_SIZE)
+            except ValueError as e:
+                assert 'different lengths' in str(e)
+            else:
+                raise AssertionError(f"no error for {text!r}")
+
+        path = write_text(directory, 'words.txt', "1 2 3\n4 five 6\n")
+        try:
+            read_text_image(path)
+        except ValueError:
+            pass
+        else:
+            raise AssertionError("no error for a value that is not a number")
+
+
+if __name__ == "__main__":
+    test_integer_types()
+    test_floats()
+    test_separators_header_and_blank_lines()
+    test_rows_of_different_lengths()
+    print("Text reader tests passed")
@@ -0,0 +1,124 @@
+import os
+import sys
+import tempfile
+import cv2
+import numpy as np
+import tifffile
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+import ImageP.imgio.index_cache as index_cache
+from ImageP.imgio.tiff_reader import open_tiff_stack
+
+# open_tiff_stack against files written by tifffile and OpenCV.
+
+
+def read_back(file_path):
+    stack = open_tiff_stack(file_path)
+    try:
+        return np.stack([stack[i] for i in range(stack.shape[0])])
+    finally:
+        stack.close()
+
+
+def test_single_page_without_description():
+    image = np.arange(40 * 50, dtype=np.uint16).reshape(40, 50)
+    with tempfile.TemporaryDirectory() as directory:
+        index_cache.CACHE_ROOT = os.path.join(directory, 'cache')
+        # 没有 ImageDescription 标签的单页 TIFF
+        path = os.path.join(directory, 'plain.tif')
+        tifffile.imwrite(path, image, metadata=None)
+        assert np.array_equal(read_back(path), image[np.newaxis])
+
+        path = os.path.join(directory, 'opencv.tif')
+        cv2.imwrite(path, image)
+        assert np.array_equal(read_back(path), image[np.newaxis])
+
+
+def make_stack(dtype=np.uint16, shape=(5, 40, 50)):
+    stack = np.random.default_rng(0).integers(0, 200, shape).astype(dtype)
+    return stack if dtype != np.float32 else stack / np.float32(7)
+
+
+def test_compression_and_predictor():
+    with tempfile.TemporaryDirectory() as directory:
+        index_cache.CACHE_ROOT = os.path.join(directory, 'cache')
+        cases = [('zlib', None, np.uint16), ('lzw', None, np.uint16), ('packbits', None, np.uint8),
+                 ('zlib', 'horizontal', np.uint16), ('lzw', 'horizontal', np.uint8),
+                 ('zlib', 'floatingpoint', np.float32)]
+        for compression, predictor, dtype in cases:
+            stack = make_stack(dtype)
+            path = os.path.join(directory, f"{compression}_{predictor}_{np.dtype(dtype).name}.tif")
+            # 每个条带只有几行，一页由多个条带组成
+            tifffile.imwrite(path, stack, compression=compression, predictor=predictor, rowsperstrip=7)
+            assert np.array_equal(read_back(path), stack), path
+
+
+def test_color_and_byte_order():
+    with tempfile.TemporaryDirectory() as directory:
+        index_cache.CACHE_ROOT = os.path.join(directory, 'cache')
+        rgb = make_stack(np.uint8, (3, 40, 50, 3))
+        path = os.path.join(directory, 'rgb.tif')
+        tifffile.imwrite(path, rgb, photometric='rgb', compression='zlib')
+        assert np.array_equal(read_back(path), rgb)
+
+        path = os.path.join(directory, 'planar.tif')
+        tifffile.imwrite(path, np.moveaxis(rgb, -1, 1), photometric='rgb', planarconfig='separate')
+        assert np.array_equal(read_back(path), rgb)
+
+        stack = make_stack(np.uint16)
+        path = os.path.join(directory, 'big_endian.tif')
+        tifffile.imwrite(path, stack, byteorder='>')
+        assert np.array_equal(read_back(path), stack)
+
+
+def test_tiled():
+    with tempfile.TemporaryDirectory() as directory:
+        index_cache.CACHE_ROOT = os.path.join(directory, 'cache')
+        # 图像尺寸不是块大小的整数倍，右边和下边的块不完整
+        stack = make_stack(np.uint16, (3, 40, 50))
+        for compression in (None, 'zlib'):
+            path = os.path.join(directory, f"tiled_{compression}.tif")
+            tifffile.imwrite(path, stack, photometric='minisblack', tile=(16, 32), compression=compression)
+            assert np.array_equal(read_back(path), stack), path
+
+
+def test_bigtiff():
+    with tempfile.TemporaryDirectory() as directory:
+        index_cache.CACHE_ROOT = os.path.join(directory, 'cache')
+        stack = make_stack(np.float32)
+        path = os.path.join(directory, 'big.tif')
+        tifffile.imwrite(path, stack, bigtiff=True)
+        assert np.array_equal(read_back(path), stack)
+
+        # 第二次打开时使用保存的页表
+        assert index_cache.load_index(path, 'tiff') is not None
+        assert np.array_equal(read_back(path), stack)
+
+
+def test_imagej():
+    with tempfile.TemporaryDirectory() as directory:
+        index_cache.CACHE_ROOT = os.path.join(directory, 'cache')
+        stack = make_stack(np.uint16)
+        path = os.path.join(directory, 'imagej.tif')
+        tifffile.imwrite(path, stack, imagej=True)
+        assert np.array_equal(read_back(path), stack)
+
+        # 大于 4 GB 的 ImageJ 栈只有第一页的 IFD，其余图像紧接着第一页存储
+        path = os.path.join(directory, 'imagej_one_ifd.tif')
+        tifffile.imwrite(path, stack[0], description=f"ImageJ=1.54f\nimages={len(stack)}\n", metadata=None)
+        with tifffile.TiffFile(path) as tif:
+            page = tif.pages[0]
+            assert page.dataoffsets[-1] + page.databytecounts[-1] == os.path.getsize(path)
+        with open(path, 'ab') as f:
+            f.write(stack[1:].tobytes())
+        assert np.array_equal(read_back(path), stack)
+
+
+if __name__ == "__main__":
+    test_single_page_without_description()
+    test_compression_and_predictor()
+    test_color_and_byte_order()
+    test_tiled()
+    test_bigtiff()
+    test_imagej()
+    print("TIFF reader tests passed")
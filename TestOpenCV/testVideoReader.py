@@ -0,0 +1,104 @@
+import os
+import struct
+import sys
+import tempfile
+import cv2
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+import ImageP.imgio.index_cache as index_cache
+from ImageP.imgio.video_reader import open_video_stack, read_avi_keyframes
+
+# The AVI index parser against AVI skeletons built here chunk by chunk (headers and
+# indexes only, no frames), and VideoStack against an MJPG file written by OpenCV.
+
+KEYFRAMES = [0, 4, 8, 9, 15]
+FRAMES = 18
+
+
+def chunk(fourcc, data):
+    return fourcc + struct.pack('<I', len(data)) + data + b'\0' * (len(data) & 1)
+
+
+def list_chunk(list_type, *chunks):
+    return chunk(b'LIST', list_type + b''.join(chunks))
+
+
+def stream_list(kind, index=b''):
+    return list_chunk(b'strl', chunk(b'strh', kind + b'\0' * 52), index)
+
+
+def write_avi(path, hdrl, movi, idx1=b''):
+    with open(path, 'wb') as f:
+        f.write(chunk(b'RIFF', b'AVI ' + list_chunk(b'hdrl', *hdrl) + list_chunk(b'movi', *movi) + idx1))
+
+
+def test_idx1_index():
+    # 音频流在前，视频是第 1 个流（'01dc'），音频块要被过滤掉
+    entries = []
+    for frame in range(FRAMES):
+        entries.append(struct.pack('<4sIII', b'00wb', 0, 0, 0))
+        entries.append(struct.pack('<4sIII', b'01dc', 0x10 if frame in KEYFRAMES else 0, 0, 0))
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'idx1.avi')
+        write_avi(path, [stream_list(b'auds'), stream_list(b'vids')], [], chunk(b'idx1', b''.join(entries)))
+        assert read_avi_keyframes(path) == (FRAMES, KEYFRAMES)
+
+
+def test_opendml_index():
+    # 两个标准索引块，每个记录一半的帧；大小的最高位为 1 表示不是关键帧
+    halves = [range(0, 10), range(10, FRAMES)]
+
+    def standard_index(frames):
+        sizes = [100 if frame in KEYFRAMES else 100 | 0x80000000 for frame in frames]
+        header = struct.pack('<HBBI4sQI', 2, 0, 1, len(sizes), b'00dc', 0, 0)
+        return chunk(b'ix00', header + b''.join(struct.pack('<II', 0, size) for size in sizes))
+
+    def super_index(offsets):
+        header = struct.pack('<HBBI4s3I', 4, 0, 0, len(offsets), b'00dc', 0, 0, 0)
+        return chunk(b'indx', header + b''.join(struct.pack('<QII', offset, 0, 0) for offset in offsets))
+
+    movi = [standard_index(frames) for frames in halves]
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'odml.avi')
+        # 先确定各块在文件中的位置，再写入指向它们的超级索引
+        hdrl = [stream_list(b'vids', super_index([0, 0]))]
+        first = 12 + len(list_chunk(b'hdrl', *hdrl)) + 12
+        hdrl = [stream_list(b'vids', super_index([first, first + len(movi[0])]))]
+        write_avi(path, hdrl, movi)
+        assert read_avi_keyframes(path) == (FRAMES, KEYFRAMES)
+
+
+def test_not_an_avi():
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'other.avi')
+        with open(path, 'wb') as f:
+            f.write(chunk(b'RIFF', b'WAVE' + chunk(b'fmt ', b'\0' * 16)))
+        assert read_avi_keyframes(path) is None
+
+
+def test_random_access():
+    with tempfile.TemporaryDirectory() as directory:
+        index_cache.CACHE_ROOT = os.path.join(directory, 'cache')
+        path = os.path.join(directory, 'frames.avi')
+        writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*'MJPG'), 10, (64, 48))
+        for frame in range(20):
+            writer.write(np.full((48, 64, 3), frame * 10, np.uint8))
+        writer.release()
+
+        stack = open_video_stack(path, first_frame=2, last_frame=16, grayscale=True)
+        try:
+            assert stack.shape == (15, 48, 64)
+            # 向后跳、向前跳和顺序读取得到的都是对应的帧
+            for layer in (10, 3, 4, 14, 0):
+                assert abs(float(stack[layer].mean()) - (layer + 2) * 10) < 3, layer
+        finally:
+            stack.close()
+
+
+if __name__ == "__main__":
+    test_idx1_index()
+    test_opendml_index()
+    test_not_an_avi()
+    test_random_access()
+    print("Video reader tests passed")